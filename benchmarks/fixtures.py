@@ -0,0 +1,306 @@
+
+"""
+Geração offline dos arquivos usados pelos benchmarks.
+
+Nada é baixado: os vídeos são gerados pelo ffmpeg (fonte lavfi 'testsrc2'), as fotos
+são JPEGs com um bloco EXIF montado à mão (não depende do piexif nem do Pillow), os
+PDFs são escritos diretamente e as árvores de diretórios são arquivos vazios.
+
+Sem o ffmpeg, os clipes e as fotos não são gerados e os casos que dependem deles são
+pulados; os demais fixtures não dependem dele.
+
+Os arquivos ficam em um diretório reaproveitado entre execuções: um manifesto
+(fixtures.json) guarda os parâmetros usados (e se o ffmpeg estava disponível), e tudo
+só é gerado de novo quando eles mudam.
+"""
+
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+DEFAULT_FIXTURES_DIR = os.path.join(tempfile.gettempdir(), 'utilitarios_benchmarks')
+MANIFEST_NAME = 'fixtures.json'
+
+# Muda quando o formato dos fixtures muda, para forçar a geração de novo
+FIXTURES_VERSION = 1
+
+# (nome, encoder, duração em segundos) de cada clipe de teste
+CLIPS = [
+    ('h264_5s', 'libx264', 5),
+    ('h264_30s', 'libx264', 30),
+    ('hevc_5s', 'libx265', 5),
+    ('mpeg4_5s', 'mpeg4', 5),
+]
+CLIP_SIZE = '1280x720'
+CLIP_FPS = 30
+CLIP_GOP = 2 * CLIP_FPS
+
+PHOTO_SIZE = '1920x1080'
+PHOTO_FOLDER = '2024-05-01 Viagem Praia'
+# Imagens distintas geradas pelo ffmpeg; as demais fotos repetem estas com outro EXIF
+PHOTO_SOURCES = 20
+
+TREE_FILE_EXTENSIONS = ('.mp4', '.jpg', '.txt', '.mov')
+TREE_FILES_PER_DIR = 100
+
+DEFAULT_PARAMS = {
+    'photos': 500,
+    'tree_entries': 200000,
+    'flat_entries': 50000,
+    'pdf_pages': 200,
+}
+
+def run_ffmpeg(args):
+    """Roda o ffmpeg sem saída no terminal; retorna True se deu certo."""
+    try:
+        result = subprocess.run(['ffmpeg', '-v', 'error', '-y', *args], stdin=subprocess.DEVNULL,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    except FileNotFoundError:
+        print("  AVISO: O comando 'ffmpeg' não foi encontrado no PATH.", file=sys.stderr)
+        return False
+    if result.returncode != 0:
+        print(f"  AVISO: ffmpeg falhou: {result.stderr.strip()[-300:]}", file=sys.stderr)
+    return result.returncode == 0
+
+def generate_clips(target_dir):
+    """Gera os clipes de teste; encoders indisponíveis nesta build do ffmpeg são pulados."""
+    os.makedirs(target_dir, exist_ok=True)
+    clips = {}
+    for name, encoder, duration in CLIPS:
+        path = os.path.join(target_dir, f'{name}.mp4')
+        print(f"  Clipe {name} ({encoder}, {duration}s)...")
+        ok = run_ffmpeg([
+            '-f', 'lavfi', '-i', f'testsrc2=size={CLIP_SIZE}:rate={CLIP_FPS}:duration={duration}',
+            '-f', 'lavfi', '-i', f'sine=frequency=440:sample_rate=48000:duration={duration}',
+            '-c:v', encoder, '-g', str(CLIP_GOP), '-pix_fmt', 'yuv420p',
+            '-c:a', 'aac', '-shortest', path,
+        ])
+        if not ok:
+            if os.path.exists(path):
+                os.remove(path)
+            continue
+        clips[name] = {
+            'path': path,
+            'encoder': encoder,
+            'duration': duration,
+            'frames': duration * CLIP_FPS,
+            'bytes': os.path.getsize(path),
+        }
+    return clips
+
+def build_exif_segment(datetime_str, make, model):
+    """
+    Monta um segmento APP1 com um bloco EXIF mínimo (TIFF little-endian): Make, Model e
+    DateTime no IFD0; DateTimeOriginal e DateTimeDigitized no IFD Exif.
+    """
+    def ascii_value(text):
+        return text.encode('ascii') + b'\x00'
+
+    ifd0_entries = [(271, ascii_value(make)), (272, ascii_value(model)), (306, ascii_value(datetime_str))]
+    exif_entries = [(36867, ascii_value(datetime_str)), (36868, ascii_value(datetime_str))]
+
+    # Layout: cabeçalho (8) + IFD0 + IFD Exif + área de dados com os textos
+    ifd0_size = 2 + 12 * (len(ifd0_entries) + 1) + 4
+    exif_ifd_offset = 8 + ifd0_size
+    exif_ifd_size = 2 + 12 * len(exif_entries) + 4
+    data_offset = exif_ifd_offset + exif_ifd_size
+    data = b''
+
+    def pack_ifd(entries, extra=()):
+        nonlocal data
+        packed = struct.pack('<H', len(entries) + len(extra))
+        for tag, value in sorted(list(entries) + list(extra), key=lambda item: item[0]):
+            if isinstance(value, int):
+                packed += struct.pack('<HHII', tag, 4, 1, value)  # LONG (ponteiro do IFD Exif)
+            elif len(value) <= 4:
+                packed += struct.pack('<HHI', tag, 2, len(value)) + value.ljust(4, b'\x00')
+            else:
+                packed += struct.pack('<HHII', tag, 2, len(value), data_offset + len(data))
+                data += value
+        return packed + struct.pack('<I', 0)
+
+    tiff = b'II*\x00' + struct.pack('<I', 8)
+    tiff += pack_ifd(ifd0_entries, [(34665, exif_ifd_offset)])
+    tiff += pack_ifd(exif_entries)
+    tiff += data
+
+    payload = b'Exif\x00\x00' + tiff
+    return b'\xff\xe1' + struct.pack('>H', len(payload) + 2) + payload
+
+def insert_exif(jpeg_bytes, exif_segment):
+    """Insere o segmento APP1 logo após o marcador SOI, descartando um APP1 existente."""
+    if jpeg_bytes[:2] != b'\xff\xd8':
+        raise ValueError("Arquivo não é um JPEG.")
+    rest = jpeg_bytes[2:]
+    if rest[:2] == b'\xff\xe1':
+        length = struct.unpack('>H', rest[2:4])[0]
+        rest = rest[2 + length:]
+    return b'\xff\xd8' + exif_segment + rest
+
+def generate_photos(target_dir, count):
+    """Gera 'count' fotos .JPG com EXIF, com datas a cada 10 segundos. Retorna None se o ffmpeg falhar."""
+    os.makedirs(target_dir, exist_ok=True)
+    sources_dir = os.path.join(target_dir, '.sources')
+    os.makedirs(sources_dir, exist_ok=True)
+    sources_count = min(count, PHOTO_SOURCES)
+    print(f"  {count} fotos ({PHOTO_SIZE})...")
+    if not run_ffmpeg([
+        '-f', 'lavfi', '-i', f'testsrc2=size={PHOTO_SIZE}:rate=1',
+        '-frames:v', str(sources_count), '-q:v', '3',
+        os.path.join(sources_dir, 'src_%03d.jpg'),
+    ]):
+        shutil.rmtree(target_dir, ignore_errors=True)
+        return None
+
+    sources = []
+    for i in range(sources_count):
+        with open(os.path.join(sources_dir, f'src_{i + 1:03d}.jpg'), 'rb') as f:
+            sources.append(f.read())
+    shutil.rmtree(sources_dir)
+
+    start = time.mktime((2024, 5, 1, 8, 0, 0, 0, 0, -1))
+    total_bytes = 0
+    for i in range(count):
+        timestamp = time.strftime('%Y:%m:%d %H:%M:%S', time.localtime(start + 10 * i))
+        segment = build_exif_segment(timestamp, 'Canon', 'EOS R6')
+        content = insert_exif(sources[i % sources_count], segment)
+        with open(os.path.join(target_dir, f'IMG_{i + 1:04d}.JPG'), 'wb') as f:
+            f.write(content)
+        total_bytes += len(content)
+    return {'path': target_dir, 'files': count, 'bytes': total_bytes}
+
+def generate_tree(target_dir, entries):
+    """
+    Gera uma árvore com cerca de 'entries' entradas (arquivos vazios e pastas), em dois
+    níveis de subpastas com TREE_FILES_PER_DIR arquivos cada.
+    """
+    print(f"  Árvore com {entries} entradas...")
+    leaf_dirs = max(1, entries // (TREE_FILES_PER_DIR + 1))
+    fan_out = max(1, int(leaf_dirs ** 0.5))
+    created_files = created_dirs = 0
+    for leaf in range(leaf_dirs):
+        leaf_dir = os.path.join(target_dir, f'pasta_{leaf // fan_out:03d}', f'sub_{leaf % fan_out:03d}')
+        if leaf % fan_out == 0:
+            created_dirs += 1
+        os.makedirs(leaf_dir)
+        created_dirs += 1
+        for i in range(TREE_FILES_PER_DIR):
+            ext = TREE_FILE_EXTENSIONS[i % len(TREE_FILE_EXTENSIONS)]
+            open(os.path.join(leaf_dir, f'arquivo_{i:03d}{ext}'), 'wb').close()
+        created_files += TREE_FILES_PER_DIR
+    return {'path': target_dir, 'files': created_files, 'dirs': created_dirs}
+
+def generate_flat_dir(target_dir, entries):
+    """Gera uma única pasta com 'entries' arquivos vazios (o listar_arquivos não é recursivo)."""
+    print(f"  Pasta com {entries} arquivos...")
+    os.makedirs(target_dir)
+    for i in range(entries):
+        ext = TREE_FILE_EXTENSIONS[i % len(TREE_FILE_EXTENSIONS)]
+        open(os.path.join(target_dir, f'arquivo_{i:06d}{ext}'), 'wb').close()
+    matching = sum(1 for i in range(entries) if TREE_FILE_EXTENSIONS[i % len(TREE_FILE_EXTENSIONS)] == '.mp4')
+    return {'path': target_dir, 'files': entries, 'matching_mp4': matching}
+
+def write_pdf(path, pages):
+    """
+    Escreve um PDF com 'pages' páginas A4, cada uma com texto e alguns desenhos, uma
+    fonte compartilhada e uma imagem (logotipo) comprimida repetida em todas as páginas.
+    """
+    objects = {}
+    font_num, image_num, pages_num, catalog_num = 1, 2, 3, 4
+    objects[font_num] = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+
+    logo = bytes((x * 4 + y * 2) % 256 for y in range(64) for x in range(64) for _ in range(3))
+    logo = zlib.compress(logo)
+    objects[image_num] = (b'<< /Type /XObject /Subtype /Image /Width 64 /Height 64 /ColorSpace /DeviceRGB '
+                          b'/BitsPerComponent 8 /Filter /FlateDecode /Length %d >>\nstream\n' % len(logo)
+                          + logo + b'\nendstream')
+
+    kids = []
+    next_num = catalog_num + 1
+    for page in range(pages):
+        lines = [b'q 60 0 0 60 480 740 cm /Logo Do Q', b'BT /F1 18 Tf 50 780 Td (Pagina %d) Tj ET' % (page + 1)]
+        for row in range(30):
+            lines.append(b'BT /F1 10 Tf 50 %d Td (Questao %d.%d - texto de exemplo para o benchmark) Tj ET'
+                         % (740 - row * 22, page + 1, row + 1))
+            lines.append(b'50 %d m 545 %d l S' % (735 - row * 22, 735 - row * 22))
+        content = b'\n'.join(lines)
+        content_num, page_num = next_num, next_num + 1
+        next_num += 2
+        objects[content_num] = b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream'
+        objects[page_num] = (b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 595 842] /Contents %d 0 R '
+                             b'/Resources << /Font << /F1 %d 0 R >> /XObject << /Logo %d 0 R >> >> >>'
+                             % (pages_num, content_num, font_num, image_num))
+        kids.append(page_num)
+
+    objects[pages_num] = (b'<< /Type /Pages /Count %d /Kids [%s] >>'
+                          % (pages, b' '.join(b'%d 0 R' % kid for kid in kids)))
+    objects[catalog_num] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages_num
+
+    with open(path, 'wb') as f:
+        f.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        offsets = {}
+        for num in sorted(objects):
+            offsets[num] = f.tell()
+            f.write(b'%d 0 obj\n' % num + objects[num] + b'\nendobj\n')
+        xref_offset = f.tell()
+        f.write(b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+        for num in sorted(objects):
+            f.write(b'%010d 00000 n \n' % offsets[num])
+        f.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n'
+                % (len(objects) + 1, catalog_num, xref_offset))
+
+def generate_pdfs(target_dir, pages):
+    """Gera um PDF grande e três menores (para o caminho de leitura em paralelo)."""
+    os.makedirs(target_dir, exist_ok=True)
+    print(f"  PDFs ({pages} páginas e 3 x {max(1, pages // 10)} páginas)...")
+    documents = {}
+    for name, count in [('grande', pages), ('pequeno_1', max(1, pages // 10)),
+                        ('pequeno_2', max(1, pages // 10)), ('pequeno_3', max(1, pages // 10))]:
+        path = os.path.join(target_dir, f'{name}.pdf')
+        write_pdf(path, count)
+        documents[name] = {'path': path, 'pages': count, 'bytes': os.path.getsize(path)}
+    return documents
+
+def load_manifest(fixtures_dir):
+    try:
+        with open(os.path.join(fixtures_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+def ensure_fixtures(fixtures_dir=DEFAULT_FIXTURES_DIR, params=None, force=False):
+    """
+    Retorna o manifesto dos fixtures em 'fixtures_dir', gerando-os se ainda não existirem
+    ou se foram gerados com outros parâmetros.
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    has_ffmpeg = shutil.which('ffmpeg') is not None
+    manifest = load_manifest(fixtures_dir)
+    if (not force and manifest and manifest.get('version') == FIXTURES_VERSION
+            and manifest.get('params') == params and manifest.get('ffmpeg') == has_ffmpeg):
+        return manifest
+
+    print(f"Gerando fixtures em '{fixtures_dir}'...")
+    start = time.perf_counter()
+    data_dir = os.path.join(fixtures_dir, 'data')
+    shutil.rmtree(data_dir, ignore_errors=True)
+    manifest = {
+        'version': FIXTURES_VERSION,
+        'params': params,
+        'ffmpeg': has_ffmpeg,
+        'clips': generate_clips(os.path.join(data_dir, 'clips')),
+        'photos': generate_photos(os.path.join(data_dir, 'photos', PHOTO_FOLDER), params['photos']),
+        'tree': generate_tree(os.path.join(data_dir, 'tree'), params['tree_entries']),
+        'flat': generate_flat_dir(os.path.join(data_dir, 'flat'), params['flat_entries']),
+        'pdfs': generate_pdfs(os.path.join(data_dir, 'pdfs'), params['pdf_pages']),
+    }
+    with open(os.path.join(fixtures_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    print(f"Fixtures gerados em {time.perf_counter() - start:.1f}s.")
+    return manifest
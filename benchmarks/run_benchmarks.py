@@ -0,0 +1,332 @@
+
+"""
+Benchmarks das ferramentas do repositório.
+
+Cada ferramenta é executada como na linha de comando (um subprocesso com o script),
+sobre fixtures gerados offline (veja fixtures.py). O tempo medido inclui a
+inicialização do Python, como acontece no uso real. Cada caso roda em uma pasta de
+trabalho nova, com cópias dos arquivos que o script altera e um cache vazio
+(UTILITARIOS_CACHE), para que as repetições sejam comparáveis.
+
+O resultado é um JSON com o melhor tempo de cada caso e a vazão correspondente
+(arquivos/s, frames/s, páginas/s, MB/s). Com --baseline, os tempos são comparados
+com um resultado salvo anteriormente (--save-baseline) e o script termina com erro
+se algum caso ficou mais lento que a tolerância.
+"""
+
+import argparse
+import fnmatch
+import glob
+import json
+import os
+import platform
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from fixtures import DEFAULT_FIXTURES_DIR, DEFAULT_PARAMS, ensure_fixtures
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+MB = 1024 * 1024
+
+class Case:
+    """
+    Um caso de benchmark: o script, os argumentos, o que precisa ser copiado para a
+    pasta de trabalho e as quantidades processadas (para calcular a vazão).
+    Em 'args', '{work}' é substituído pela pasta de trabalho. 'missing' é a dependência
+    que faltou para gerar os fixtures do caso, que então é pulado.
+    """
+
+    def __init__(self, name, script, args, totals, copies=(), outputs=(), cleanup=(), missing=None):
+        self.name = name
+        self.script = script
+        self.args = args
+        self.totals = totals
+        self.copies = copies
+        self.outputs = outputs
+        self.cleanup = cleanup
+        self.missing = missing
+
+def build_cases(manifest):
+    """Monta a lista de casos a partir do manifesto dos fixtures."""
+    photos = manifest['photos']
+    tree = manifest['tree']
+    flat = manifest['flat']
+
+    if photos is None:
+        # As fotos são geradas pelo ffmpeg
+        cases = [Case(name, script, [], {}, missing='ffmpeg')
+                 for name, script in [('rename_media', 'fotos/rename_media.py'),
+                                      ('data_exif', 'fotos/data_exif.py'),
+                                      ('create_timelapse', 'videos/create_timelapse.py')]]
+    else:
+        photo_folder = os.path.basename(photos['path'])
+        photo_totals = {'files': photos['files'], 'MB': photos['bytes'] / MB}
+        cases = [
+            Case('rename_media', 'fotos/rename_media.py', ['{work}/' + photo_folder], photo_totals,
+                 copies=[(photos['path'], photo_folder)]),
+            Case('data_exif', 'fotos/data_exif.py',
+                 ['--folder', '{work}/' + photo_folder, '--datetime', '2024-06-01 10:00:00'], photo_totals,
+                 copies=[(photos['path'], photo_folder)]),
+            Case('create_timelapse', 'videos/create_timelapse.py', ['--folder', photos['path']],
+                 {'files': photos['files'], 'frames': photos['files'], 'MB': photos['bytes'] / MB},
+                 outputs=['*.mp4']),
+        ]
+
+    cases += [
+        Case('listar_subpastas', 'fotos/listar_subpastas.py', [tree['path']],
+             {'files': tree['files'] + tree['dirs']},
+             cleanup=[os.path.join(tree['path'], 'subpastas.txt')]),
+        Case('listar_arquivos', 'videos/listar_arquivos.py', ['-p', flat['path'], '-e', 'mp4'],
+             {'files': flat['files']},
+             cleanup=[os.path.join(flat['path'], 'listar_mp4.txt')]),
+    ]
+
+    for name, clip in sorted(manifest['clips'].items()):
+        clip_file = os.path.basename(clip['path'])
+        clip_totals = {'frames': clip['frames'], 'MB': clip['bytes'] / MB}
+        third = clip['duration'] / 3
+        cases += [
+            Case(f'extract_frames[{name}]', 'videos/extract_frames.py',
+                 ['-i', clip['path'], '-n', '10', '-o', '{work}'], clip_totals,
+                 outputs=['*_frames/*.jpg']),
+            Case(f'split_video[{name}]', 'videos/split_video.py',
+                 ['-f', '{work}/' + clip_file, '-t', f'{third:.2f}', f'{2 * third:.2f}'], clip_totals,
+                 copies=[(clip['path'], clip_file)], outputs=['*_split_*.mp4']),
+            Case(f'trim_video[{name}]', 'videos/trim_video.py',
+                 ['-i', '{work}/' + clip_file, '-s', '1', '-e', '1'], clip_totals,
+                 copies=[(clip['path'], clip_file)], outputs=['*_cortado.mp4']),
+        ]
+
+    pdfs = manifest['pdfs']
+    large = pdfs['grande']
+    small = [pdfs[name] for name in sorted(pdfs) if name != 'grande']
+    copies = 5
+    for variant, flags in [('default', []), ('streaming', ['--streaming']), ('optimize', ['--optimize'])]:
+        cases.append(Case(
+            f'merge_pdfs[{variant}]', 'pdfs/juntar_arquivos_multiplas_copias.py',
+            [large['path'], str(copies), '-o', '{work}/saida.pdf', *flags],
+            {'pages': large['pages'] * copies, 'MB': large['bytes'] * copies / MB},
+            outputs=['saida.pdf'],
+        ))
+    cases.append(Case(
+        'merge_pdfs[many_sources]', 'pdfs/juntar_arquivos_multiplas_copias.py',
+        [arg for doc in small + [large] for arg in (doc['path'], '2')] + ['-o', '{work}/saida.pdf'],
+        {'files': len(small) + 1, 'pages': 2 * sum(doc['pages'] for doc in small + [large]),
+         'MB': 2 * sum(doc['bytes'] for doc in small + [large]) / MB},
+        outputs=['saida.pdf'],
+    ))
+    return cases
+
+def link_or_copy(source, target):
+    """Coloca uma cópia do fixture na pasta de trabalho (hard link para arquivos, quando possível)."""
+    if os.path.isdir(source):
+        shutil.copytree(source, target, copy_function=shutil.copy2)
+        return
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+def find_missing_dependency(output):
+    """Nome do módulo Python ou do comando (ffmpeg/ffprobe) que faltou para o script, se houver."""
+    match = (re.search(r"ModuleNotFoundError: No module named '([^']+)'", output)
+             or re.search(r"'(ffmpeg|ffprobe)' não foi encontrado", output)
+             or re.search(r"A biblioteca (\w+) não está instalada", output))
+    return match.group(1) if match else None
+
+def run_once(case, work_root, timeout):
+    """
+    Executa o caso uma vez em uma pasta de trabalho nova.
+    Retorna (segundos, None) ou (None, mensagem de erro).
+    """
+    work = tempfile.mkdtemp(prefix='run_', dir=work_root)
+    try:
+        for source, name in case.copies:
+            link_or_copy(source, os.path.join(work, name))
+        command = [sys.executable, os.path.join(REPO_DIR, case.script)]
+        command += [arg.replace('{work}', work) for arg in case.args]
+        env = dict(os.environ, UTILITARIOS_CACHE=os.path.join(work, '.cache'))
+
+        start = time.perf_counter()
+        try:
+            result = subprocess.run(command, cwd=work, env=env, stdin=subprocess.DEVNULL,
+                                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+        except subprocess.TimeoutExpired:
+            return None, f"Tempo limite de {timeout}s excedido."
+        elapsed = time.perf_counter() - start
+
+        output = result.stdout.decode('utf-8', errors='replace')
+        missing = find_missing_dependency(output)
+        if missing:
+            return None, f"Dependência ausente: {missing}"
+        if result.returncode != 0:
+            return None, f"Código de saída {result.returncode}: {output.strip()[-300:]}"
+        if case.outputs and not any(glob.glob(os.path.join(work, pattern)) for pattern in case.outputs):
+            # Vários scripts só imprimem o erro e terminam com código 0
+            return None, f"Nenhuma saída gerada: {output.strip()[-300:]}"
+        return elapsed, None
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+        for path in case.cleanup:
+            if os.path.exists(path):
+                os.remove(path)
+
+def run_case(case, work_root, repeat, timeout):
+    """Executa o caso 'repeat' vezes e monta o registro do resultado."""
+    if case.missing:
+        return {'script': case.script, 'status': 'skipped', 'error': f"Dependência ausente: {case.missing}"}
+    times = []
+    for _ in range(repeat):
+        elapsed, error = run_once(case, work_root, timeout)
+        if error is not None:
+            status = 'skipped' if error.startswith('Dependência ausente') else 'failed'
+            return {'script': case.script, 'status': status, 'error': error}
+        times.append(elapsed)
+
+    best = min(times)
+    return {
+        'script': case.script,
+        'status': 'ok',
+        'seconds': round(best, 4),
+        'median_seconds': round(statistics.median(times), 4),
+        'runs': [round(t, 4) for t in times],
+        'throughput': {f'{unit}/s': round(total / best, 3) for unit, total in case.totals.items()},
+    }
+
+def compare_with_baseline(results, baseline, tolerance):
+    """
+    Compara os melhores tempos com os do baseline. Um caso é uma regressão quando fica
+    mais de 'tolerance' (fração) mais lento. Retorna (comparação por caso, regressões).
+    """
+    comparison = {}
+    regressions = []
+    base_results = baseline.get('results', {})
+    for name, result in results.items():
+        base = base_results.get(name)
+        if result['status'] != 'ok' or not base or base.get('status') != 'ok':
+            continue
+        ratio = result['seconds'] / base['seconds'] if base['seconds'] else float('inf')
+        regression = ratio > 1 + tolerance
+        comparison[name] = {
+            'baseline_seconds': base['seconds'],
+            'seconds': result['seconds'],
+            'change': round(ratio - 1, 4),
+            'regression': regression,
+        }
+        if regression:
+            regressions.append(name)
+    return comparison, regressions
+
+def print_table(results, comparison):
+    print()
+    print(f"{'Caso':<34} {'Tempo':>9}  {'Vazão':<40} {'vs. baseline':>12}")
+    for name, result in results.items():
+        if result['status'] != 'ok':
+            label = 'PULADO' if result['status'] == 'skipped' else 'FALHOU'
+            print(f"{name:<34} {label:>9}  {' '.join(result['error'].split())[:80]}")
+            continue
+        rates = ', '.join(f"{value:,.1f} {unit}" for unit, value in result['throughput'].items())
+        change = ''
+        if name in comparison:
+            change = f"{comparison[name]['change'] * 100:+.1f}%"
+            if comparison[name]['regression']:
+                change += ' !'
+        print(f"{name:<34} {result['seconds']:>8.3f}s  {rates:<40} {change:>12}")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Mede o tempo e a vazão das ferramentas do repositório sobre fixtures gerados offline.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('-k', '--only', action='append', default=[],
+                        help="Roda só os casos cujo nome corresponde ao padrão (ex: 'merge_pdfs*').\nPode ser repetido.")
+    parser.add_argument('-r', '--repeat', type=int, default=3, help="Repetições de cada caso (vale o melhor tempo). Padrão: 3.")
+    parser.add_argument('--timeout', type=float, default=900, help="Tempo limite de cada execução, em segundos. Padrão: 900.")
+    parser.add_argument('--fixtures', default=DEFAULT_FIXTURES_DIR,
+                        help=f"Pasta dos fixtures (reaproveitados entre execuções).\nPadrão: {DEFAULT_FIXTURES_DIR}")
+    parser.add_argument('--regenerate', action='store_true', help="Gera os fixtures de novo, mesmo que já existam.")
+    parser.add_argument('--photos', type=int, default=DEFAULT_PARAMS['photos'],
+                        help=f"Quantidade de fotos com EXIF. Padrão: {DEFAULT_PARAMS['photos']}.")
+    parser.add_argument('--tree-entries', type=int, default=DEFAULT_PARAMS['tree_entries'],
+                        help=f"Entradas da árvore de diretórios. Padrão: {DEFAULT_PARAMS['tree_entries']}.")
+    parser.add_argument('--flat-entries', type=int, default=DEFAULT_PARAMS['flat_entries'],
+                        help=f"Arquivos da pasta única (listar_arquivos). Padrão: {DEFAULT_PARAMS['flat_entries']}.")
+    parser.add_argument('--pdf-pages', type=int, default=DEFAULT_PARAMS['pdf_pages'],
+                        help=f"Páginas do PDF grande. Padrão: {DEFAULT_PARAMS['pdf_pages']}.")
+    parser.add_argument('-o', '--output', default='benchmark_results.json', help="Arquivo JSON com os resultados. Padrão: benchmark_results.json")
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help=f"Compara com um resultado salvo. Sem valor: {DEFAULT_BASELINE}")
+    parser.add_argument('--save-baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help=f"Salva os resultados como baseline. Sem valor: {DEFAULT_BASELINE}")
+    parser.add_argument('--tolerance', type=float, default=0.10,
+                        help="Fração de aumento de tempo aceita antes de apontar regressão. Padrão: 0.10.")
+    args = parser.parse_args()
+
+    if args.repeat <= 0:
+        print("ERRO: --repeat deve ser maior que zero.", file=sys.stderr)
+        sys.exit(1)
+
+    params = {'photos': args.photos, 'tree_entries': args.tree_entries,
+              'flat_entries': args.flat_entries, 'pdf_pages': args.pdf_pages}
+    manifest = ensure_fixtures(args.fixtures, params, force=args.regenerate)
+
+    cases = [case for case in build_cases(manifest)
+             if not args.only or any(fnmatch.fnmatch(case.name, pattern) for pattern in args.only)]
+    if not cases:
+        print("Nenhum caso corresponde aos padrões informados.")
+        return
+
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError) as e:
+            print(f"ERRO: Não foi possível ler o baseline '{args.baseline}': {e}", file=sys.stderr)
+            sys.exit(1)
+
+    work_root = os.path.join(args.fixtures, 'work')
+    os.makedirs(work_root, exist_ok=True)
+    results = {}
+    for case in cases:
+        print(f"Rodando {case.name}...", flush=True)
+        results[case.name] = run_case(case, work_root, args.repeat, args.timeout)
+
+    comparison, regressions = compare_with_baseline(results, baseline, args.tolerance) if baseline else ({}, [])
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {
+            'platform': platform.platform(),
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+        },
+        'fixtures': manifest['params'],
+        'repeat': args.repeat,
+        'results': results,
+    }
+    if baseline:
+        report['baseline'] = {'file': args.baseline, 'created': baseline.get('created'),
+                              'tolerance': args.tolerance, 'comparison': comparison}
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline salvo em '{args.save_baseline}'.")
+
+    print_table(results, comparison)
+    print(f"\nResultados salvos em '{args.output}'.")
+    if regressions:
+        print(f"\nREGRESSÃO em {len(regressions)} caso(s): {', '.join(regressions)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
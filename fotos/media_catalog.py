@@ -0,0 +1,242 @@
+
+"""
+Catálogo SQLite dos arquivos de mídia, com a data, a câmera, a resolução, a duração e
+o evento de cada um (os mesmos dados que o rename_media usa para montar os nomes).
+
+O catálogo é preenchido pelo rename_media com --catalog, ou pelo subcomando 'index'
+(que lê os dados sem renomear nada), e permite escolher arquivos por consulta em vez
+de montar listas .txt à mão. Por exemplo, todos os vídeos 4K da câmera X em março:
+
+    python media_catalog.py query --kind video --camera "*X*" --min-height 2160 \
+        --since 2024-03-01 --until 2024-03-31 -o lista.txt
+
+A lista gerada pode ser passada direto às ferramentas de vídeo (--input lista.txt).
+O catálogo padrão fica em UTILITARIOS_CACHE/catalog/media.sqlite.
+"""
+
+import argparse
+import datetime
+import os
+import sqlite3
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'videos')))
+from media_cache import get_cache_dir
+
+# Registros gravados antes de cada commit, para não sincronizar o disco a cada arquivo
+COMMIT_EVERY = 500
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS media (
+        path TEXT PRIMARY KEY,
+        kind TEXT NOT NULL,
+        taken_at TEXT,
+        camera TEXT COLLATE NOCASE,
+        width INTEGER,
+        height INTEGER,
+        fps REAL,
+        duration REAL,
+        event TEXT COLLATE NOCASE,
+        size INTEGER,
+        indexed_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS media_taken_at ON media (taken_at);
+    CREATE INDEX IF NOT EXISTS media_camera ON media (camera, taken_at);
+    CREATE INDEX IF NOT EXISTS media_resolution ON media (height, width);
+    CREATE INDEX IF NOT EXISTS media_duration ON media (duration);
+    CREATE INDEX IF NOT EXISTS media_event ON media (event, taken_at);
+'''
+
+class MediaCatalog:
+    """Acesso ao catálogo: registro de arquivos e consultas por data, câmera, resolução etc."""
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir('catalog'), 'media.sqlite')
+        self._db = sqlite3.connect(self.path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._pending = 0
+
+    def record(self, path, kind, taken_at=None, camera=None, width=None, height=None, fps=None,
+               duration=None, event=None, previous_path=None):
+        """
+        Registra (ou atualiza) um arquivo. 'previous_path' é o caminho anterior de um
+        arquivo renomeado, cujo registro é removido.
+        """
+        path = os.path.abspath(path)
+        if previous_path and os.path.abspath(previous_path) != path:
+            self._db.execute('DELETE FROM media WHERE path = ?', (os.path.abspath(previous_path),))
+        try:
+            size = os.path.getsize(path)
+        except OSError:
+            size = None
+        self._db.execute(
+            'INSERT OR REPLACE INTO media (path, kind, taken_at, camera, width, height, fps, duration, '
+            'event, size, indexed_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (path, kind, taken_at.isoformat(sep=' ', timespec='seconds') if taken_at else None, camera or None,
+             width, height, round(fps, 3) if fps else None, round(duration, 3) if duration else None,
+             event or None, size, time.time()))
+        self._pending += 1
+        if self._pending >= COMMIT_EVERY:
+            self.commit()
+
+    def commit(self):
+        self._db.commit()
+        self._pending = 0
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+    def query(self, kind=None, camera=None, event=None, since=None, until=None, min_width=None,
+              min_height=None, resolution=None, min_duration=None, max_duration=None, fps=None):
+        """
+        Caminhos dos arquivos que atendem a todos os filtros, em ordem de data.
+        - camera e event: comparação sem diferenciar maiúsculas; '*' funciona como curinga;
+        - since e until: datas (datetime.date), incluindo o dia final;
+        - resolution: (largura, altura) exatas; min_width/min_height: mínimas;
+        - fps: framerate arredondado.
+        """
+        conditions, values = [], []
+
+        def add(condition, *args):
+            conditions.append(condition)
+            values.extend(args)
+
+        if kind:
+            add('kind = ?', kind)
+        for column, value in (('camera', camera), ('event', event)):
+            if value and '*' in value:
+                add(f'{column} LIKE ?', value.replace('*', '%'))
+            elif value:
+                add(f'{column} = ?', value)
+        if since:
+            add('taken_at >= ?', since.isoformat())
+        if until:
+            add('taken_at < ?', (until + datetime.timedelta(days=1)).isoformat())
+        if resolution:
+            add('width = ? AND height = ?', *resolution)
+        if min_width:
+            add('width >= ?', min_width)
+        if min_height:
+            add('height >= ?', min_height)
+        if min_duration is not None:
+            add('duration >= ?', min_duration)
+        if max_duration is not None:
+            add('duration <= ?', max_duration)
+        if fps:
+            add('ROUND(fps) = ?', round(fps))
+
+        sql = 'SELECT path FROM media'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY taken_at, path'
+        return [row[0] for row in self._db.execute(sql, values)]
+
+    def prune(self):
+        """Remove os registros de arquivos que não existem mais. Retorna quantos foram removidos."""
+        missing = [path for (path,) in self._db.execute('SELECT path FROM media') if not os.path.exists(path)]
+        self._db.executemany('DELETE FROM media WHERE path = ?', [(path,) for path in missing])
+        self.commit()
+        return len(missing)
+
+    def stats(self):
+        """Quantidade de arquivos por tipo e por câmera."""
+        by_kind = dict(self._db.execute('SELECT kind, COUNT(*) FROM media GROUP BY kind').fetchall())
+        by_camera = self._db.execute('SELECT camera, COUNT(*) FROM media GROUP BY camera '
+                                     'ORDER BY COUNT(*) DESC').fetchall()
+        return by_kind, by_camera
+
+def index_directory(catalog, root_path):
+    """Registra no catálogo os arquivos de mídia de uma pasta, sem renomear nada."""
+    # Importado aqui porque depende de bibliotecas opcionais (Pillow, tinytag, OpenCV)
+    from rename_media import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, collect_media_facts, sanitize_folder_name
+
+    count = 0
+    for dirpath, _, filenames in os.walk(root_path):
+        event_name = (sanitize_folder_name(os.path.basename(dirpath))
+                      or sanitize_folder_name(os.path.basename(os.path.abspath(root_path))))
+        for filename in filenames:
+            if os.path.splitext(filename)[1].lower() not in IMAGE_EXTENSIONS + VIDEO_EXTENSIONS:
+                continue
+            full_path = os.path.join(dirpath, filename)
+            catalog.record(full_path, event=event_name, **collect_media_facts(full_path, image_size=True))
+            count += 1
+    catalog.commit()
+    return count
+
+def parse_date(value):
+    try:
+        return datetime.date.fromisoformat(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"data inválida: '{value}' (use AAAA-MM-DD)")
+
+def parse_resolution(value):
+    try:
+        width, height = value.lower().split('x')
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"resolução inválida: '{value}' (use LxA, ex: 3840x2160)")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Consulta e mantém o catálogo SQLite dos arquivos de mídia.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('--db', metavar='ARQUIVO', help="Arquivo do catálogo. Padrão: no cache.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_index = subparsers.add_parser('index', help="Registra os arquivos de pastas no catálogo, sem renomear.")
+    parser_index.add_argument('folders', nargs='+', help="Pastas a registrar (com as subpastas).")
+
+    parser_query = subparsers.add_parser('query', help="Lista os arquivos que atendem aos filtros.")
+    parser_query.add_argument('--kind', choices=['image', 'video'], help="Só imagens ou só vídeos.")
+    parser_query.add_argument('--camera', help="Modelo da câmera ('*' como curinga, ex: \"*GoPro*\").")
+    parser_query.add_argument('--event', help="Nome do evento ('*' como curinga).")
+    parser_query.add_argument('--since', type=parse_date, metavar='AAAA-MM-DD', help="Data inicial.")
+    parser_query.add_argument('--until', type=parse_date, metavar='AAAA-MM-DD', help="Data final (inclusive).")
+    parser_query.add_argument('--resolution', type=parse_resolution, metavar='LxA', help="Resolução exata (ex: 3840x2160).")
+    parser_query.add_argument('--min-width', type=int, help="Largura mínima.")
+    parser_query.add_argument('--min-height', type=int, help="Altura mínima (ex: 2160 para 4K).")
+    parser_query.add_argument('--min-duration', type=float, metavar='S', help="Duração mínima (s).")
+    parser_query.add_argument('--max-duration', type=float, metavar='S', help="Duração máxima (s).")
+    parser_query.add_argument('--fps', type=float, help="Framerate (arredondado).")
+    parser_query.add_argument('-o', '--output', help="Grava a lista (um caminho por linha) neste arquivo .txt.")
+
+    subparsers.add_parser('prune', help="Remove do catálogo os arquivos que não existem mais.")
+    subparsers.add_parser('stats', help="Mostra quantos arquivos há por tipo e por câmera.")
+    args = parser.parse_args()
+
+    catalog = MediaCatalog(args.db)
+    try:
+        if args.command == 'index':
+            for folder in args.folders:
+                if not os.path.isdir(folder):
+                    print(f"[Aviso] Ignorando, pois não é um diretório: '{folder}'")
+                    continue
+                print(f"{index_directory(catalog, folder)} arquivo(s) registrado(s) de '{folder}'.")
+        elif args.command == 'query':
+            paths = catalog.query(args.kind, args.camera, args.event, args.since, args.until, args.min_width,
+                                  args.min_height, args.resolution, args.min_duration, args.max_duration, args.fps)
+            if args.output:
+                with open(args.output, 'w', encoding='utf-8') as f:
+                    f.writelines(f"{path}\n" for path in paths)
+                print(f"{len(paths)} arquivo(s) gravado(s) em '{args.output}'.")
+            else:
+                for path in paths:
+                    print(path)
+        elif args.command == 'prune':
+            print(f"{catalog.prune()} registro(s) removido(s).")
+        elif args.command == 'stats':
+            by_kind, by_camera = catalog.stats()
+            print(f"Catálogo: {catalog.path}")
+            print(f"Imagens: {by_kind.get('image', 0)} | Vídeos: {by_kind.get('video', 0)}")
+            for camera, count in by_camera:
+                print(f"  {camera or '(sem câmera)'}: {count}")
+    finally:
+        catalog.close()
+
+if __name__ == '__main__':
+    main()
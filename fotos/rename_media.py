@@ -2,6 +2,7 @@
 import os
 import datetime
 import re
+import sys
 import argparse
 from PIL import Image
 from PIL.ExifTags import TAGS
@@ -9,6 +10,12 @@ from tinytag import TinyTag
 
 import cv2
 
+# A instrumentação (métricas e perfil) é compartilhada com as ferramentas de vídeo
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'videos')))
+import instrumentation
+from instrumentation import metrics
+from media_catalog import MediaCatalog
+
 # --- Configurações ---
 IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.heic', '.tiff')
 VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.3gp')
@@ -41,10 +48,17 @@ def get_camera_model(file_path):
         pass
     return None
 
-def get_video_info(file_path):
-    """Extrai framerate, resolução e modelo da câmera de um arquivo de vídeo."""
-    video_info_str = None
-    camera_model = None
+def get_image_size(file_path):
+    """Retorna (largura, altura) de uma imagem, ou (None, None) se não for possível ler."""
+    try:
+        with Image.open(file_path) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+def probe_video(file_path):
+    """Extrai framerate, resolução, duração e modelo da câmera de um arquivo de vídeo."""
+    info = {'fps': None, 'width': None, 'height': None, 'duration': None, 'camera': None}
     try:
         # Usa OpenCV para info de vídeo
         cap = cv2.VideoCapture(file_path)
@@ -52,18 +66,29 @@ def get_video_info(file_path):
             fps = cap.get(cv2.CAP_PROP_FPS)
             width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            frames = cap.get(cv2.CAP_PROP_FRAME_COUNT)
             cap.release()
             if fps > 0 and width > 0 and height > 0:
-                video_info_str = f"{round(fps)}fps_{width}x{height}"
+                info.update(fps=fps, width=width, height=height)
+                if frames > 0:
+                    info['duration'] = frames / fps
 
         # Usa TinyTag para metadados adicionais (tentar obter a câmera)
         tag = TinyTag.get(file_path)
+        if tag and tag.duration and not info['duration']:
+            info['duration'] = tag.duration
         if tag and tag.artist:
-             camera_model = re.sub(r'[^\w_.-]', '_', tag.artist).replace('__', '_')
+             info['camera'] = re.sub(r'[^\w_.-]', '_', tag.artist).replace('__', '_')
 
     except Exception:
         pass
-    return video_info_str, camera_model
+    return info
+
+def format_video_info(info):
+    """Trecho '{fps}fps_{L}x{A}' usado no nome dos vídeos, ou None se faltar informação."""
+    if not info['fps']:
+        return None
+    return f"{round(info['fps'])}fps_{info['width']}x{info['height']}"
 
 def get_file_modification_datetime(file_path):
     """Obtém a data e hora da última modificação de um arquivo."""
@@ -81,12 +106,15 @@ def sanitize_folder_name(folder_name):
     sanitized = re.sub(r'[^\w_]', '', sanitized)
     return sanitized.strip('_')
 
-def process_directory(root_path):
-    """Vasculha um único diretório e renomeia os arquivos de mídia."""
+def process_directory(root_path, catalog=None):
+    """
+    Vasculha um único diretório e renomeia os arquivos de mídia. Com um catálogo
+    (media_catalog), os dados de cada arquivo também são registrados nele.
+    """
     print(f"--- Processando diretório: {root_path} ---")
     total_renamed_in_dir = 0
     
-    for dirpath, _, filenames in os.walk(root_path):
+    for dirpath, _, filenames in metrics.timed_iter(os.walk(root_path), 'scan'):
         if not filenames:
             continue
 
@@ -100,58 +128,104 @@ def process_directory(root_path):
 
         for filename in filenames:
             file_ext = os.path.splitext(filename)[1].lower()
-            full_path = os.path.join(dirpath, filename)
-            
-            timestamp = None
-            camera_model = None
-            video_info = None
-
-            if file_ext in IMAGE_EXTENSIONS:
-                timestamp = get_exif_datetime(full_path)
-                camera_model = get_camera_model(full_path)
-                if not timestamp:
-                    timestamp = get_file_modification_datetime(full_path)
-            elif file_ext in VIDEO_EXTENSIONS:
-                timestamp = get_file_modification_datetime(full_path)
-                video_info, camera_model = get_video_info(full_path)
-            else:
+            if file_ext not in IMAGE_EXTENSIONS and file_ext not in VIDEO_EXTENSIONS:
                 continue
-
-            if not timestamp:
-                print(f"  [Aviso] Não foi possível obter data para: {filename}. Pulando.")
-                continue
-
-            date_str = timestamp.strftime('%Y-%m-%d_%H-%M-%S')
-            
-            base_new_name = f"{date_str}_{event_name}"
-            if camera_model:
-                base_new_name += f"_{camera_model}"
-            if video_info:
-                base_new_name += f"_{video_info}"
-
-            counter = 0
-            while True:
-                new_filename = f"{base_new_name}_{counter:02d}{file_ext}"
-                new_full_path = os.path.join(dirpath, new_filename)
-                if not os.path.exists(new_full_path):
-                    break
-                counter += 1
-
-            if full_path == new_full_path:
-                continue
-            
-            try:
-                os.rename(full_path, new_full_path)
-                print(f"  -> Renomeado: {filename} >> {new_filename}")
+            full_path = os.path.join(dirpath, filename)
+            if rename_media_file(full_path, event_name, catalog):
                 total_renamed_in_dir += 1
-            except OSError as e:
-                print(f"  [Erro] Falha ao renomear {filename}: {e}")
     
     print(f"--- Concluído para {root_path}. {total_renamed_in_dir} arquivos renomeados. ---")
     print()
+    if catalog is not None:
+        catalog.commit()
+    metrics.report(f"Renomeação em {root_path}")
     return total_renamed_in_dir
 
-def process_from_file_list(file_list_path):
+def collect_media_facts(full_path, image_size=False):
+    """
+    Reúne a data, a câmera e, nos vídeos, o framerate, a resolução e a duração de um
+    arquivo de mídia. A resolução das imagens só é lida com image_size=True.
+    """
+    if os.path.splitext(full_path)[1].lower() in IMAGE_EXTENSIONS:
+        facts = {'kind': 'image'}
+        with metrics.phase('exif'):
+            facts['taken_at'] = get_exif_datetime(full_path)
+            facts['camera'] = get_camera_model(full_path)
+            if image_size:
+                facts['width'], facts['height'] = get_image_size(full_path)
+        if not facts['taken_at']:
+            with metrics.phase('stat'):
+                facts['taken_at'] = get_file_modification_datetime(full_path)
+    else:
+        facts = {'kind': 'video'}
+        with metrics.phase('stat'):
+            facts['taken_at'] = get_file_modification_datetime(full_path)
+        with metrics.phase('video_info'):
+            facts.update(probe_video(full_path))
+    return facts
+
+def rename_media_file(full_path, event_name, catalog=None):
+    """
+    Renomeia um arquivo de mídia para o padrão data_evento_câmera. Retorna o novo
+    caminho, ou None se o arquivo não foi renomeado. Com um catálogo, registra nele a
+    data, a câmera, a resolução, a duração e o evento do arquivo.
+    """
+    with metrics.item(full_path) as item:
+        facts = collect_media_facts(full_path, image_size=catalog is not None)
+        video_info = format_video_info(facts) if facts['kind'] == 'video' else None
+        new_full_path = apply_new_name(full_path, facts['taken_at'], event_name, facts['camera'], video_info, item)
+
+        if catalog is not None:
+            with metrics.phase('catalog'):
+                catalog.record(new_full_path or full_path, event=event_name, previous_path=full_path, **facts)
+        return new_full_path
+
+def apply_new_name(full_path, timestamp, event_name, camera_model, video_info, item):
+    """Renomeia o arquivo para data_evento_câmera[_info]_NN. Retorna o novo caminho ou None."""
+    dirpath, filename = os.path.split(full_path)
+    file_ext = os.path.splitext(filename)[1].lower()
+
+    if not timestamp:
+        print(f"  [Aviso] Não foi possível obter data para: {filename}. Pulando.")
+        item['status'] = 'no_date'
+        metrics.count('no_date')
+        return None
+
+    date_str = timestamp.strftime('%Y-%m-%d_%H-%M-%S')
+    
+    base_new_name = f"{date_str}_{event_name}"
+    if camera_model:
+        base_new_name += f"_{camera_model}"
+    if video_info:
+        base_new_name += f"_{video_info}"
+
+    with metrics.phase('rename'):
+        counter = 0
+        while True:
+            new_filename = f"{base_new_name}_{counter:02d}{file_ext}"
+            new_full_path = os.path.join(dirpath, new_filename)
+            if not os.path.exists(new_full_path):
+                break
+            counter += 1
+
+        if full_path == new_full_path:
+            item['status'] = 'unchanged'
+            metrics.count('unchanged')
+            return None
+        
+        try:
+            os.rename(full_path, new_full_path)
+            print(f"  -> Renomeado: {filename} >> {new_filename}")
+            item['status'] = 'renamed'
+            metrics.count('renamed')
+            return new_full_path
+        except OSError as e:
+            print(f"  [Erro] Falha ao renomear {filename}: {e}")
+            item['status'] = 'error'
+            metrics.count('errors')
+            return None
+
+def process_from_file_list(file_list_path, catalog=None):
     """Lê uma lista de diretórios de um arquivo de texto e processa cada um."""
     print(f"Modo de lista de arquivo detectado. Lendo: {file_list_path}")
     print()
@@ -174,7 +248,7 @@ def process_from_file_list(file_list_path):
 
     for path in paths_to_process:
         if os.path.isdir(path):
-            grand_total_renamed += process_directory(path)
+            grand_total_renamed += process_directory(path, catalog)
         else:
             print(f"--- [Aviso] Ignorando linha, pois não é um diretório válido: '{path}' ---")
             print()
@@ -191,16 +265,36 @@ if __name__ == '__main__':
         "input_path",
         help="O caminho para um único diretório a ser processado OU para um arquivo .txt contendo a lista de diretórios."
     )
+    parser.add_argument(
+        "--catalog",
+        action='store_true',
+        help="Registra data, câmera, resolução, duração e evento de cada arquivo no catálogo SQLite "
+             "(consultável com media_catalog.py)."
+    )
+    parser.add_argument(
+        "--catalog-db",
+        metavar='ARQUIVO',
+        help="Arquivo do catálogo (implica --catalog). Padrão: no cache."
+    )
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    instrumentation.configure(args)
 
     target_path = args.input_path
+    catalog = None
+    if args.catalog or args.catalog_db:
+        catalog = MediaCatalog(args.catalog_db)
+        print(f"Catálogo: {catalog.path}")
 
     if os.path.isdir(target_path):
         # O caminho é um diretório, processa-o diretamente.
         print("Modo de diretório único detectado.")
-        process_directory(target_path)
+        process_directory(target_path, catalog)
     elif os.path.isfile(target_path):
         # O caminho é um arquivo, processa como uma lista.
-        process_from_file_list(target_path)
+        process_from_file_list(target_path, catalog)
     else:
         print(f"[Erro] O caminho fornecido não é um diretório ou arquivo válido: {target_path}")
+
+    if catalog is not None:
+        catalog.close()
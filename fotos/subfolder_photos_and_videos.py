@@ -18,10 +18,8 @@ def organize_directory(directory_path):
     print(f"\nProcessando o diretório: {directory_path}")
 
     # Criar subpastas para fotos e vídeos se não existirem
-    photos_path = os.path.join(directory_path, 'fotos')
-    videos_path = os.path.join(directory_path, 'videos')
-    os.makedirs(photos_path, exist_ok=True)
-    os.makedirs(videos_path, exist_ok=True)
+    os.makedirs(os.path.join(directory_path, 'fotos'), exist_ok=True)
+    os.makedirs(os.path.join(directory_path, 'videos'), exist_ok=True)
 
     # Listar todos os arquivos no diretório
     for filename in os.listdir(directory_path):
@@ -31,24 +29,40 @@ def organize_directory(directory_path):
         if not os.path.isfile(source_path):
             continue
 
-        # Obter a extensão do arquivo em minúsculas
-        _, file_extension = os.path.splitext(filename)
-        file_extension = file_extension.lower()
+        organize_file(source_path)
 
-        # Mover o arquivo para a pasta correspondente
-        try:
-            if file_extension in IMAGE_EXTENSIONS:
-                destination_path = os.path.join(photos_path, filename)
-                shutil.move(source_path, destination_path)
-                print(f"  [FOTO]   '{filename}' movido para '{photos_path}'")
-            elif file_extension in VIDEO_EXTENSIONS:
-                destination_path = os.path.join(videos_path, filename)
-                shutil.move(source_path, destination_path)
-                print(f"  [VÍDEO]  '{filename}' movido para '{videos_path}'")
-        except shutil.Error as e:
-            print(f"  [ERRO]   Não foi possível mover '{filename}'. Motivo: {e}")
-        except Exception as e:
-            print(f"  [ERRO]   Ocorreu um erro inesperado com o arquivo '{filename}': {e}")
+def organize_file(source_path):
+    """
+    Move um arquivo para a subpasta 'fotos' ou 'videos' do diretório em que ele está.
+    Retorna o novo caminho, ou None se o arquivo não foi movido.
+    """
+    directory_path, filename = os.path.split(source_path)
+
+    # Obter a extensão do arquivo em minúsculas
+    _, file_extension = os.path.splitext(filename)
+    file_extension = file_extension.lower()
+
+    # Mover o arquivo para a pasta correspondente, criando-a se não existir
+    try:
+        if file_extension in IMAGE_EXTENSIONS:
+            photos_path = os.path.join(directory_path, 'fotos')
+            os.makedirs(photos_path, exist_ok=True)
+            destination_path = os.path.join(photos_path, filename)
+            shutil.move(source_path, destination_path)
+            print(f"  [FOTO]   '{filename}' movido para '{photos_path}'")
+            return destination_path
+        elif file_extension in VIDEO_EXTENSIONS:
+            videos_path = os.path.join(directory_path, 'videos')
+            os.makedirs(videos_path, exist_ok=True)
+            destination_path = os.path.join(videos_path, filename)
+            shutil.move(source_path, destination_path)
+            print(f"  [VÍDEO]  '{filename}' movido para '{videos_path}'")
+            return destination_path
+    except shutil.Error as e:
+        print(f"  [ERRO]   Não foi possível mover '{filename}'. Motivo: {e}")
+    except Exception as e:
+        print(f"  [ERRO]   Ocorreu um erro inesperado com o arquivo '{filename}': {e}")
+    return None
 
 def main():
     """
@@ -7,7 +7,12 @@ utilizando argumentos de linha de comando para especificar os arquivos e o núme
 """
 
 import argparse
+import io
+import os
+import re
 import sys
+import time
+from collections import namedtuple
 
 try:
     from pypdf import PdfWriter, PdfReader
@@ -17,18 +22,34 @@ except ImportError:
     print("pip install pypdf")
     sys.exit(1)
 
+from pdf_streaming import StreamingPdfWriter
+
+# A instrumentação (métricas e perfil) é compartilhada com as ferramentas de vídeo
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'videos')))
+import instrumentation
+from instrumentation import metrics
+
+# Um item da lista de junção: arquivo, número de cópias e páginas (índices a partir de 0, ou None para todas)
+PdfJob = namedtuple("PdfJob", ["filename", "copies", "pages"])
+
+# "arquivo.pdf:1-3,5" seleciona apenas algumas páginas do arquivo
+PAGE_RANGE_PATTERN = re.compile(r"^(?P<filename>.+?\.pdf):(?P<pages>[\d\s,-]+)$", re.IGNORECASE)
+
 def create_arg_parser():
     """Cria e configura o parser de argumentos da linha de comando."""
     parser = argparse.ArgumentParser(
         description="Junta vários arquivos PDF em um, com um número específico de cópias para cada um.",
         formatter_class=argparse.RawTextHelpFormatter,
-        epilog="Exemplo de uso:\n  python %(prog)s modelo_A.pdf 10 modelo_B.pdf 15 -o provas_finais.pdf"
+        epilog="Exemplo de uso:\n  python %(prog)s modelo_A.pdf 10 modelo_B.pdf 15 -o provas_finais.pdf\n"
+               "  python %(prog)s capa.pdf 1 modelo_A.pdf:2-4 10 capa.pdf 1 -o provas_finais.pdf"
     )
     parser.add_argument(
         "pdf_args",
-        metavar="<arquivo.pdf> <n_copias>",
+        metavar="<arquivo.pdf[:páginas]> <n_copias>",
         nargs="*",
-        help="Pares de nome de arquivo PDF seguido pelo número de cópias desejado."
+        help="Pares de nome de arquivo PDF seguido pelo número de cópias desejado.\n"
+             "Os pares são juntados na ordem informada, e um arquivo pode aparecer mais de uma vez.\n"
+             "Para usar só algumas páginas, acrescente-as ao nome (ex: modelo.pdf:1-3,5)."
     )
     parser.add_argument(
         "-o", "--output",
@@ -36,78 +57,235 @@ def create_arg_parser():
         default="provas_combinadas.pdf",
         help="Nome do arquivo PDF de saída. (Padrão: %(default)s)"
     )
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Grava as páginas no arquivo de saída à medida que são copiadas, em vez de\n"
+             "montar o PDF inteiro na memória. Use para junções muito grandes\n"
+             "(milhares de cópias). O conteúdo das cópias é sempre compartilhado."
+    )
+    parser.add_argument(
+        "--optimize",
+        action="store_true",
+        help="Gera um PDF menor (implica --streaming): fontes, imagens e logotipos idênticos\n"
+             "entre modelos diferentes são gravados uma única vez, e os objetos vão em\n"
+             "object streams comprimidos, com tabela de referências comprimida (PDF 1.5+)."
+    )
+    instrumentation.add_arguments(parser)
     return parser
 
+def parse_page_range(text):
+    """Converte '1-3,5' na lista de índices [0, 1, 2, 4]. Lança ValueError se for inválido."""
+    pages = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        start, _, end = part.partition("-")
+        start = int(start)
+        end = int(end) if end else start
+        if start < 1 or end < start:
+            raise ValueError(f"Intervalo de páginas inválido: '{part}'.")
+        pages.extend(range(start - 1, end))
+    if not pages:
+        raise ValueError("Nenhuma página informada.")
+    return pages
+
 def parse_pdf_input_args(args):
-    """Valida e processa os argumentos de entrada em um dicionário de arquivos e cópias."""
+    """Valida e processa os argumentos de entrada em uma lista ordenada de PdfJob."""
     if not args:
         return None
     if len(args) % 2 != 0:
         print(f"ERRO: Número ímpar de argumentos ({len(args)}). Os argumentos devem ser em pares: <arquivo.pdf> <n_copias>.")
         sys.exit(1)
 
-    pdf_files_to_merge = {}
+    jobs = []
     for i in range(0, len(args), 2):
         filename = args[i]
+        pages = None
+        match = PAGE_RANGE_PATTERN.match(filename)
+        if match and not os.path.exists(filename):
+            filename = match.group("filename")
+            try:
+                pages = parse_page_range(match.group("pages"))
+            except ValueError as e:
+                print(f"ERRO: Páginas inválidas para o arquivo '{filename}': {e}")
+                sys.exit(1)
         try:
             num_copies = int(args[i+1])
             if num_copies <= 0:
                 raise ValueError("O número de cópias deve ser positivo.")
-            pdf_files_to_merge[filename] = num_copies
+            jobs.append(PdfJob(filename, num_copies, pages))
         except ValueError:
             print(f"ERRO: O número de cópias '{args[i+1]}' para o arquivo '{filename}' é inválido. Deve ser um número inteiro maior que zero.")
             sys.exit(1)
-    return pdf_files_to_merge
+    return jobs
+
+def load_reader(filename):
+    """Lê o arquivo inteiro para a memória e abre um PdfReader sobre ele."""
+    with open(filename, "rb") as f:
+        return PdfReader(io.BytesIO(f.read()))
+
+def load_readers(filenames):
+    """
+    Analisa cada arquivo distinto uma única vez; os jobs que repetem um arquivo
+    reaproveitam o mesmo leitor. Retorna um dicionário {nome do arquivo: PdfReader}.
+    """
+    return {filename: load_reader(filename) for filename in filenames}
+
+def select_pages(reader, job):
+    """Páginas do leitor usadas pelo job, validando o intervalo pedido."""
+    if job.pages is None:
+        return list(reader.pages)
+    total = len(reader.pages)
+    invalid = [index + 1 for index in job.pages if index >= total]
+    if invalid:
+        raise ValueError(f"A página {invalid[0]} não existe em '{job.filename}' ({total} páginas).")
+    return [reader.pages[index] for index in job.pages]
+
+class ProgressReporter:
+    """Mostra o progresso em páginas por segundo, no máximo uma vez a cada 'interval' segundos."""
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self.pages = 0
+        self.start = time.monotonic()
+        self._last_report = self.start
+
+    def add_pages(self, count=1):
+        self.pages += count
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(f"  {self.pages} páginas ({self.pages / (now - self.start):.1f} pág/s)")
+
+    def finish(self):
+        elapsed = max(time.monotonic() - self.start, 1e-9)
+        print(f"  Total: {self.pages} páginas em {elapsed:.1f}s ({self.pages / elapsed:.1f} pág/s)")
+
+def merge_pdfs_streaming(jobs, output_filename, optimize=False):
+    """
+    Junta os PDFs gravando cada página no arquivo de saída assim que é copiada.
+    Cada arquivo de entrada só é lido quando o primeiro job que o usa começa e é
+    liberado após o último, então a memória fica limitada a um documento de origem
+    por vez (mais de um só quando jobs de arquivos diferentes se intercalam) e não
+    cresce com o número de cópias. Com optimize=True, elimina objetos repetidos entre
+    os documentos e comprime a estrutura do arquivo.
+    """
+    print(f"Iniciando a criação do PDF combinado (modo {'otimizado' if optimize else 'streaming'})...")
+    progress = ProgressReporter()
+    last_use = {job.filename: index for index, job in enumerate(jobs)}
+    readers = {}
+    try:
+        with open(output_filename, "wb") as f_out:
+            writer = StreamingPdfWriter(f_out, optimize=optimize)
+            for index, job in enumerate(jobs):
+                print(f"Processando: '{job.filename}' ({job.copies} cópia(s))...")
+                if job.filename not in readers:
+                    with metrics.phase('read'):
+                        readers[job.filename] = load_reader(job.filename)
+                reader = readers[job.filename]
+                with metrics.item(job.filename) as item, metrics.phase('copy'):
+                    pages = select_pages(reader, job)
+                    for _ in range(job.copies):
+                        writer.add_pages(pages)
+                        progress.add_pages(len(pages))
+                    item['pages'] = len(pages) * job.copies
+                    metrics.count('pages', item['pages'])
+                if last_use[job.filename] == index:
+                    writer.end_document(reader)
+                    del readers[job.filename]
+                del reader, pages
+            with metrics.phase('write'):
+                writer.close()
+    except FileNotFoundError as e:
+        print(f"\nERRO CRÍTICO: O arquivo de entrada '{e.filename}' não foi encontrado.")
+        print("Verifique o nome e o caminho do arquivo e tente novamente.")
+        return False
+    except Exception as e:
+        print(f"\nOcorreu um erro inesperado ao gerar '{output_filename}': {e}")
+        return False
+    progress.finish()
+    if optimize:
+        print(f"  {writer.deduplicated} objeto(s) repetido(s) entre os documentos foram reaproveitados.")
+    return True
+
+def merge_pdfs(jobs, output_filename, streaming=False, optimize=False):
+    """Lê, copia e junta os PDFs em um único arquivo de saída, na ordem dos jobs."""
+    if streaming or optimize:
+        if merge_pdfs_streaming(jobs, output_filename, optimize):
+            print_summary(jobs, output_filename)
+        return
+
+    # O PdfWriter guarda todas as páginas até o final, então os arquivos podem ser
+    # analisados todos de uma vez
+    filenames = list(dict.fromkeys(job.filename for job in jobs))
+    try:
+        with metrics.phase('read'):
+            readers = load_readers(filenames)
+    except FileNotFoundError as e:
+        print(f"\nERRO CRÍTICO: O arquivo de entrada '{e.filename}' não foi encontrado.")
+        print("Verifique o nome e o caminho do arquivo e tente novamente.")
+        return
+    except Exception as e:
+        print(f"\nOcorreu um erro inesperado ao ler os arquivos de entrada: {e}")
+        return
 
-def merge_pdfs(pdfs_to_merge, output_filename):
-    """Lê, copia e junta os PDFs em um único arquivo de saída."""
     merger = PdfWriter()
+    progress = ProgressReporter()
     print("Iniciando a criação do PDF combinado...")
 
-    for filename, num_copies in pdfs_to_merge.items():
+    for job in jobs:
         try:
-            print(f"Processando: '{filename}'...")
-            with open(filename, "rb") as f:
-                reader = PdfReader(f)
-                for i in range(num_copies):
-                    merger.append(reader)
-                    print(f"  - Cópia {i+1}/{num_copies} de '{filename}' adicionada.")
-            print(f"'{filename}' processado com sucesso.")
-        except FileNotFoundError:
-            print(f"\nERRO CRÍTICO: O arquivo de entrada '{filename}' não foi encontrado.")
-            print("Verifique o nome e o caminho do arquivo e tente novamente.")
-            return
+            print(f"Processando: '{job.filename}'...")
+            reader = readers[job.filename]
+            with metrics.item(job.filename) as item, metrics.phase('copy'):
+                pages = select_pages(reader, job)
+                # O pypdf reaproveita o conteúdo, os recursos e as anotações entre as cópias
+                for _ in range(job.copies):
+                    merger.append(reader, pages=job.pages)
+                    progress.add_pages(len(pages))
+                item['pages'] = len(pages) * job.copies
+                metrics.count('pages', item['pages'])
+            print(f"'{job.filename}' processado com sucesso.")
         except Exception as e:
-            print(f"\nOcorreu um erro inesperado ao processar '{filename}': {e}")
+            print(f"\nOcorreu um erro inesperado ao processar '{job.filename}': {e}")
             return
 
+    progress.finish()
+
     try:
         print(f"\nSalvando o arquivo final como '{output_filename}'...")
-        with open(output_filename, "wb") as f_out:
+        with open(output_filename, "wb") as f_out, metrics.phase('write'):
             merger.write(f_out)
-        
-        total_files = len(pdfs_to_merge)
-        total_copies = sum(pdfs_to_merge.values())
-        print("\n--------------------------------------------------")
-        print("  PROCESSO CONCLUÍDO COM SUCESSO!")
-        print(f"  O arquivo '{output_filename}' foi criado.")
-        print(f"  Contém {total_copies} provas de {total_files} modelo(s) diferente(s).")
-        print("--------------------------------------------------")
+        print_summary(jobs, output_filename)
     except Exception as e:
         print(f"\nOcorreu um erro ao salvar o arquivo final: {e}")
 
+def print_summary(jobs, output_filename):
+    """Mostra o resumo final da junção."""
+    total_files = len({job.filename for job in jobs})
+    total_copies = sum(job.copies for job in jobs)
+    print("\n--------------------------------------------------")
+    print("  PROCESSO CONCLUÍDO COM SUCESSO!")
+    print(f"  O arquivo '{output_filename}' foi criado.")
+    print(f"  Contém {total_copies} provas de {total_files} modelo(s) diferente(s).")
+    print("--------------------------------------------------")
+
 def main():
     """Função principal para orquestrar a execução do script."""
     arg_parser = create_arg_parser()
     cli_args = arg_parser.parse_args()
+    instrumentation.configure(cli_args)
 
-    pdfs_to_merge = parse_pdf_input_args(cli_args.pdf_args)
+    jobs = parse_pdf_input_args(cli_args.pdf_args)
 
-    if not pdfs_to_merge:
+    if not jobs:
         arg_parser.print_help()
         return
 
-    merge_pdfs(pdfs_to_merge, cli_args.output_filename)
+    merge_pdfs(jobs, cli_args.output_filename, cli_args.streaming, cli_args.optimize)
+    metrics.report(f"Junção de PDFs ({cli_args.output_filename})")
 
 if __name__ == "__main__":
     main()
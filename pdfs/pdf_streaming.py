@@ -0,0 +1,341 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+Escrita incremental de PDFs muito grandes.
+
+Ao contrário do PdfWriter do pypdf, que monta o documento inteiro em memória antes
+de salvar, o StreamingPdfWriter grava cada objeto no arquivo de saída assim que ele
+é copiado do documento de origem. Em memória ficam apenas a posição de cada objeto
+(para a tabela de referências cruzadas, escrita no final) e o mapeamento de objetos
+do documento de origem atual. O consumo de memória fica limitado, portanto, ao
+tamanho de um único documento de origem, e não ao do arquivo final.
+
+Com optimize=True o writer também:
+  - elimina objetos idênticos entre todos os documentos de origem (fontes, imagens,
+    logotipos e demais XObjects repetidos em modelos diferentes são gravados uma vez);
+  - comprime os streams que estão sem filtro;
+  - agrupa os objetos pequenos em object streams comprimidos e grava a tabela de
+    referências cruzadas como um xref stream comprimido (PDF 1.5+).
+O pypdf não grava object streams, por isso essa etapa é feita aqui.
+"""
+
+import hashlib
+import zlib
+from array import array
+from collections import OrderedDict
+from io import BytesIO
+
+from pypdf.generic import (
+    ArrayObject,
+    DictionaryObject,
+    EncodedStreamObject,
+    IndirectObject,
+    NameObject,
+    StreamObject,
+)
+
+# Números reservados: 1 = catálogo, 2 = raiz da árvore de páginas
+CATALOG_NUMBER = 1
+PAGES_NUMBER = 2
+
+# Objetos agrupados em cada object stream (modo otimizado)
+OBJECT_STREAM_SIZE = 200
+
+# Objetos lembrados para a eliminação de repetidos (modo otimizado); ao passar disso, os
+# usados há mais tempo são esquecidos, limitando a memória em junções muito longas
+DIGEST_CACHE_SIZE = 200000
+
+class StreamingPdfWriter:
+    """Grava páginas de vários documentos em um PDF, objeto por objeto."""
+
+    def __init__(self, stream, optimize=False):
+        self._stream = stream
+        self._optimize = optimize
+        # Para cada objeto: posição no arquivo ou, se estiver em um object stream,
+        # o índice dentro dele (e o número do object stream em _containers)
+        self._offsets = array('q', [0, 0, 0])
+        self._containers = array('q', [0, 0, 0])
+        self._kids = array('q')
+        # Mapeamento (número, geração) na origem -> número na saída, um por documento de origem
+        self._source_maps = {}
+        self._shared_map = {}
+        self._copy_map = {}
+        self._reserved = {}
+        self._in_progress = set()
+        self._digests = OrderedDict()
+        self._object_batch = []
+        self.deduplicated = 0
+        self._stream.write(b"%PDF-1.7\n%\xe2\xe3\xcf\xd3\n")
+
+    @property
+    def page_count(self):
+        return len(self._kids)
+
+    def _allocate(self):
+        self._offsets.append(0)
+        self._containers.append(0)
+        return len(self._offsets) - 1
+
+    def _lookup(self, key):
+        return self._copy_map.get(key) or self._shared_map.get(key) or self._reserved.get(key)
+
+    def _reference(self, ref):
+        """Referência no arquivo de saída para o objeto 'ref' da origem, copiando-o se necessário."""
+        key = (ref.idnum, ref.generation)
+        number = self._lookup(key)
+        if number is None:
+            if key in self._in_progress:
+                # Referência circular: o número é reservado antes de o objeto ser gravado
+                number = self._reserved[key] = self._allocate()
+            else:
+                number = self._copy_tree(ref)
+        return IndirectObject(number, 0, None)
+
+    @staticmethod
+    def _skipped_keys(obj):
+        # /Length dos streams é recalculado na gravação
+        return ("/Length",) if isinstance(obj, StreamObject) else ()
+
+    def _children(self, obj):
+        """Referências indiretas contidas diretamente em obj (dicionários e arrays são percorridos)."""
+        if isinstance(obj, IndirectObject):
+            yield obj
+        elif isinstance(obj, DictionaryObject):
+            skipped = self._skipped_keys(obj)
+            for key, value in obj.items():
+                if key not in skipped:
+                    yield from self._children(value)
+        elif isinstance(obj, ArrayObject):
+            for item in obj:
+                yield from self._children(item)
+
+    def _remap(self, obj, skip_keys=()):
+        """Cópia rasa de obj com as referências indiretas renumeradas para o arquivo de saída."""
+        if isinstance(obj, IndirectObject):
+            return self._reference(obj)
+        if isinstance(obj, StreamObject):
+            if self._optimize and "/Filter" not in obj:
+                new_obj = EncodedStreamObject()
+                new_obj._data = zlib.compress(obj._data)
+                new_obj[NameObject("/Filter")] = NameObject("/FlateDecode")
+            else:
+                new_obj = obj.__class__()
+                new_obj._data = obj._data
+            skip_keys = skip_keys + self._skipped_keys(obj)
+        elif isinstance(obj, DictionaryObject):
+            new_obj = DictionaryObject()
+        elif isinstance(obj, ArrayObject):
+            return ArrayObject(self._remap(item) for item in obj)
+        else:
+            return obj
+        for key, value in obj.items():
+            if key not in skip_keys:
+                new_obj[NameObject(key)] = self._remap(value)
+        return new_obj
+
+    @staticmethod
+    def _is_page(obj):
+        return isinstance(obj, DictionaryObject) and obj.get("/Type") == "/Page"
+
+    def _copy_tree(self, root):
+        """
+        Copia o objeto 'root' da origem e tudo o que ele referencia, em pós-ordem (os
+        objetos referenciados são gravados antes de quem os referencia). Assim, ao gravar
+        um objeto, o conteúdo dele já aponta para os números finais e objetos idênticos
+        de documentos diferentes geram exatamente os mesmos bytes.
+        Retorna o número de root no arquivo de saída.
+        """
+        stack = [root]
+        while stack:
+            ref = stack[-1]
+            key = (ref.idnum, ref.generation)
+            if key in self._shared_map or key in self._copy_map:
+                stack.pop()
+                continue
+            obj = ref.get_object()
+            if key not in self._in_progress:
+                self._in_progress.add(key)
+                if not self._is_page(obj):
+                    for child in reversed(list(self._children(obj))):
+                        child_key = (child.idnum, child.generation)
+                        if self._lookup(child_key) is None and child_key not in self._in_progress:
+                            stack.append(child)
+                continue
+            stack.pop()
+            self._shared_map[key] = self._emit(key, obj)
+            self._in_progress.discard(key)
+        return self._shared_map[(root.idnum, root.generation)]
+
+    def _emit(self, key, obj):
+        """Grava um objeto já com os filhos copiados e retorna seu número na saída."""
+        number = self._reserved.pop(key, None)
+        if obj is None or self._is_page(obj):
+            # Página que não faz parte da seleção (ex: destino de um link): não é copiada
+            obj = None
+        else:
+            obj = self._remap(obj)
+
+        if self._optimize and obj is not None and number is None:
+            buffer = BytesIO()
+            obj.write_to_stream(buffer)
+            digest = hashlib.sha1(buffer.getvalue()).digest()
+            existing = self._digests.get(digest)
+            if existing is not None:
+                self._digests.move_to_end(digest)
+                self.deduplicated += 1
+                return existing
+            number = self._allocate()
+            self._digests[digest] = number
+            if len(self._digests) > DIGEST_CACHE_SIZE:
+                self._digests.popitem(last=False)
+
+        if number is None:
+            number = self._allocate()
+        self._write_object(number, obj)
+        return number
+
+    def _write_object(self, number, obj):
+        if self._optimize and not isinstance(obj, StreamObject):
+            # Objetos pequenos vão para o próximo object stream
+            buffer = BytesIO()
+            if obj is None:
+                buffer.write(b"null")
+            else:
+                obj.write_to_stream(buffer)
+            self._object_batch.append((number, buffer.getvalue()))
+            if len(self._object_batch) >= OBJECT_STREAM_SIZE:
+                self._flush_object_stream()
+            return
+
+        self._offsets[number] = self._stream.tell()
+        self._stream.write(b"%d 0 obj\n" % number)
+        if obj is None:
+            self._stream.write(b"null")
+        else:
+            obj.write_to_stream(self._stream)
+        self._stream.write(b"\nendobj\n")
+
+    def _flush_object_stream(self):
+        """Grava os objetos acumulados em um object stream comprimido."""
+        if not self._object_batch:
+            return
+        stream_number = self._allocate()
+        header = []
+        body = BytesIO()
+        for index, (number, data) in enumerate(self._object_batch):
+            header.append(b"%d %d" % (number, body.tell()))
+            body.write(data)
+            body.write(b"\n")
+            self._offsets[number] = index
+            self._containers[number] = stream_number
+        header = b" ".join(header) + b"\n"
+        data = zlib.compress(header + body.getvalue())
+        self._object_batch = []
+
+        self._offsets[stream_number] = self._stream.tell()
+        self._stream.write(b"%d 0 obj\n<< /Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d >>\nstream\n"
+                           % (stream_number, len(header.split(b" ")) // 2, len(header), len(data)))
+        self._stream.write(data)
+        self._stream.write(b"\nendstream\nendobj\n")
+
+    def add_pages(self, pages):
+        """
+        Acrescenta uma cópia das páginas informadas (todas do mesmo documento de origem).
+        Objetos já copiados deste documento (fontes, imagens, conteúdo) são reaproveitados;
+        apenas os dicionários das páginas e suas anotações são gravados novamente.
+        """
+        if not pages:
+            return
+        self._shared_map = self._source_maps.setdefault(id(pages[0].pdf), {})
+        self._copy_map = {}
+        numbers = []
+        # As páginas da cópia são numeradas antes, para que links entre elas funcionem
+        for page in pages:
+            number = self._allocate()
+            numbers.append(number)
+            if page.indirect_reference is not None:
+                self._copy_map[(page.indirect_reference.idnum, page.indirect_reference.generation)] = number
+
+        for page, number in zip(pages, numbers):
+            annotations = page.get("/Annots")
+            new_page = self._remap(page, skip_keys=("/Parent", "/Annots"))
+            new_page[NameObject("/Parent")] = IndirectObject(PAGES_NUMBER, 0, None)
+            if annotations:
+                # Cada anotação pertence a uma única página, então é copiada a cada cópia
+                new_annotations = ArrayObject()
+                for annotation in annotations.get_object():
+                    annotation_number = self._allocate()
+                    annotation_copy = self._remap(annotation.get_object())
+                    if "/P" in annotation_copy:
+                        annotation_copy[NameObject("/P")] = IndirectObject(number, 0, None)
+                    self._write_object(annotation_number, annotation_copy)
+                    new_annotations.append(IndirectObject(annotation_number, 0, None))
+                new_page[NameObject("/Annots")] = new_annotations
+            self._write_object(number, new_page)
+            self._kids.append(number)
+        self._copy_map = {}
+
+    def end_document(self, source):
+        """Libera o mapeamento de objetos do documento de origem 'source' (um PdfReader)."""
+        self._source_maps.pop(id(source), None)
+        self._shared_map = {}
+        self._copy_map = {}
+        self._reserved = {}
+
+    def close(self):
+        """Grava a árvore de páginas, o catálogo, a tabela de referências cruzadas e o trailer."""
+        self._flush_object_stream()
+
+        self._offsets[PAGES_NUMBER] = self._stream.tell()
+        self._stream.write(b"%d 0 obj\n<< /Type /Pages /Count %d /Kids [" % (PAGES_NUMBER, len(self._kids)))
+        for i, number in enumerate(self._kids):
+            self._stream.write(b"%s%d 0 R" % (b"\n" if i % 10 == 0 else b" ", number))
+        self._stream.write(b" ] >>\nendobj\n")
+
+        self._offsets[CATALOG_NUMBER] = self._stream.tell()
+        self._stream.write(b"%d 0 obj\n<< /Type /Catalog /Pages %d 0 R >>\nendobj\n" % (CATALOG_NUMBER, PAGES_NUMBER))
+
+        if self._optimize:
+            self._write_xref_stream()
+            return
+
+        xref_offset = self._stream.tell()
+        self._stream.write(b"xref\n0 %d\n0000000000 65535 f \n" % len(self._offsets))
+        for offset in self._offsets[1:]:
+            self._stream.write(b"%010d 00000 n \n" % offset)
+        self._stream.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n"
+                           % (len(self._offsets), CATALOG_NUMBER, xref_offset))
+
+    def _write_xref_stream(self):
+        """
+        Grava a tabela de referências cruzadas como um xref stream comprimido. A largura
+        do campo de posição (/W) é calculada a partir da maior posição, então arquivos
+        acima de 4 GB também são suportados.
+        """
+        xref_number = self._allocate()
+        xref_offset = self._stream.tell()
+        self._offsets[xref_number] = xref_offset
+
+        # Campo 2: posição no arquivo ou número do object stream; campo 3: índice no
+        # object stream (menor que OBJECT_STREAM_SIZE) ou a geração 65535 da entrada 0
+        offset_width = max((max(max(self._offsets), len(self._offsets)).bit_length() + 7) // 8, 1)
+
+        def entry(kind, field2, field3):
+            return bytes((kind,)) + field2.to_bytes(offset_width, 'big') + field3.to_bytes(2, 'big')
+
+        compressor = zlib.compressobj()
+        data = [compressor.compress(entry(0, 0, 65535))]
+        for number in range(1, len(self._offsets)):
+            container = self._containers[number]
+            if container:
+                data.append(compressor.compress(entry(2, container, self._offsets[number])))
+            else:
+                data.append(compressor.compress(entry(1, self._offsets[number], 0)))
+        data.append(compressor.flush())
+        data = b"".join(data)
+
+        self._stream.write(b"%d 0 obj\n<< /Type /XRef /Size %d /W [1 %d 2] /Root %d 0 R /Filter /FlateDecode /Length %d >>\nstream\n"
+                           % (xref_number, len(self._offsets), offset_width, CATALOG_NUMBER, len(data)))
+        self._stream.write(data)
+        self._stream.write(b"\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n" % xref_offset)
@@ -3,9 +3,23 @@ import subprocess
 import argparse
 import sys
 
+import encode_settings
+import instrumentation
+import job_journal
+import proxy_video
+from ffmpeg_runner import run_command
+from instrumentation import metrics
+
 # Lista de extensões de vídeo a serem processadas.
 VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv')
 
+# Bitrate do vídeo final (teto da busca de bitrate)
+DEFAULT_BITRATE = '35M'
+
+def build_speed_filter(speed):
+    """Monta o filtro de vídeo que desacelera (ou acelera) o vídeo pelo multiplicador 'speed'."""
+    return f'setpts={speed}*PTS'
+
 def get_atempo_filter(speed):
     """
     Cria a string de filtro 'atempo' para o ffmpeg, lidando com a limitação de 0.5.
@@ -24,23 +38,20 @@ def get_atempo_filter(speed):
     filters.append(f"atempo={tempo}")
     return ",".join(filters)
 
-def process_video_file(input_path, output_path, speed, fps, audio_mode):
+def build_command(input_path, output_path, speed, fps, audio_mode, bitrate=DEFAULT_BITRATE, encoder=None):
     """
-    Executa o comando ffmpeg para aplicar o efeito de slow motion em um único arquivo de vídeo.
+    Monta o comando ffmpeg que aplica o slow motion em um arquivo de vídeo. Sem 'encoder'
+    o ffmpeg escolhe o padrão do contêiner de saída (ex: mpeg4 em .avi).
     """
-    if os.path.exists(output_path):
-        print(f"Arquivo de saída já existe, pulando: {os.path.basename(output_path)}")
-        return
-
-    print(f"Processando: {os.path.basename(input_path)}")
-
     command = [
         'ffmpeg',
         '-i', input_path,
-        '-filter:v', f'setpts={speed}*PTS',
+        '-filter:v', build_speed_filter(speed),
         '-r', str(fps),
-        '-b:v', '35M',
     ]
+    if encoder:
+        command.extend(['-c:v', encoder])
+    command.extend(['-b:v', bitrate])
 
     if audio_mode == 'remove':
         command.append('-an')
@@ -49,24 +60,57 @@ def process_video_file(input_path, output_path, speed, fps, audio_mode):
         command.extend(['-af', atempo_filter])
 
     command.append(output_path)
+    return command
 
+def process_video_file(input_path, output_path, speed, fps, audio_mode, journal, bitrates=None):
+    """
+    Executa o comando ffmpeg para aplicar o efeito de slow motion em um único arquivo de vídeo.
+    Arquivos já concluídos em uma execução anterior (segundo o journal) são pulados.
+    Com 'bitrates' (encode_settings.BitrateSearch) o bitrate é escolhido por vídeo.
+    """
+    params = {'speed': speed, 'fps': fps, 'audio': audio_mode}
+    if bitrates:
+        params.update(bitrates.job_params())
     try:
-        # Usamos DEVNULL para não poluir a saída do script com o output do ffmpeg
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        with journal.job(input_path, output_path, params) as job:
+            if job is None:
+                return
+            print(f"Processando: {os.path.basename(input_path)}")
+            command = build_command(input_path, job.partial_path, speed, fps, audio_mode)
+            if bitrates:
+                # A busca mede o libx264, então o encode final também usa o libx264
+                command = build_command(input_path, job.partial_path, speed, fps, audio_mode, encoder='libx264')
+                _, bitrate, job.meta = encode_settings.tune(input_path, command, bitrates=bitrates)
+                command = build_command(input_path, job.partial_path, speed, fps, audio_mode, bitrate, 'libx264')
+            # A saída do ffmpeg fica no log do job e só é mostrada em caso de erro
+            run_command(command)
         print(f"Concluído: {os.path.basename(output_path)}")
     except subprocess.CalledProcessError as e:
         print(f"ERRO ao processar {os.path.basename(input_path)}.", file=sys.stderr)
         print(f"Comando: {' '.join(command)}", file=sys.stderr)
-        print(f"Erro do ffmpeg: {e}", file=sys.stderr)
+        print(f"Erro do ffmpeg: {e.stderr[-500:]}", file=sys.stderr)
     except FileNotFoundError:
         print("ERRO: O comando 'ffmpeg' não foi encontrado.", file=sys.stderr)
         print("Por favor, instale o ffmpeg e garanta que ele esteja no PATH do seu sistema.", file=sys.stderr)
         sys.exit(1)
 
-
-def process_folder(folder_path, speed, fps, audio_mode):
+def preview_video_file(input_path, output_path, speed, fps, audio_mode, preview):
+    """Aplica o mesmo efeito a uma janela curta da proxy do vídeo (modo --preview)."""
+    output_path = proxy_video.get_preview_path(output_path)
+    try:
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        command = build_command(preview.clip(input_path), output_path, speed, fps, audio_mode)
+        run_command(command)
+        print(f"Prévia: {output_path}")
+    except (subprocess.CalledProcessError, RuntimeError) as e:
+        print(f"ERRO na prévia de {os.path.basename(input_path)}: {getattr(e, 'stderr', None) or e}", file=sys.stderr)
+
+def process_folder(folder_path, speed, fps, audio_mode, journal, preview=None, bitrates=None):
     """
     Varre uma pasta em busca de arquivos de vídeo e os processa, salvando em uma subpasta.
+    Com 'preview' (PreviewSettings), processa só uma janela da proxy de cada vídeo;
+    'bitrates' é repassado a process_video_file.
     """
     # Montar o nome da subpasta de saída
     audio_str = "no-audio" if audio_mode == 'remove' else "slow-audio"
@@ -79,8 +123,14 @@ def process_folder(folder_path, speed, fps, audio_mode):
     print(f"--- Iniciando processamento da pasta: {folder_path} ---")
     print(f"--- Saída será salva em: {output_dir} ---")
     
+    if preview:
+        proxy_video.ensure_proxies([os.path.join(folder_path, filename) for filename in os.listdir(folder_path)
+                                    if filename.lower().endswith(VIDEO_EXTENSIONS) and f'_slow_{speed}x' not in filename
+                                    and not os.path.splitext(filename)[0].endswith('_preview')],
+                                   preview.height)
+
     found_videos = False
-    for filename in os.listdir(folder_path):
+    for filename in metrics.timed_iter(os.listdir(folder_path), 'scan'):
         # Ignorar a própria pasta de saída para não processar o que já foi processado
         if os.path.isdir(os.path.join(folder_path, filename)) and filename == output_folder_name:
             continue
@@ -93,17 +143,25 @@ def process_folder(folder_path, speed, fps, audio_mode):
             if f'_slow_{speed}x' in base:
                 print(f"Arquivo já parece processado, pulando: {filename}")
                 continue
+            if base.endswith('_preview'):
+                # Prévias geradas pelo modo --preview das ferramentas
+                continue
 
             input_file_path = os.path.join(folder_path, filename)
             # Usar o novo diretório para o arquivo de saída
             output_file_path = os.path.join(output_dir, f"{base}_slow_{speed}x{ext}")
             
-            process_video_file(input_file_path, output_file_path, speed, fps, audio_mode)
+            with metrics.item(input_file_path):
+                if preview:
+                    preview_video_file(input_file_path, output_file_path, speed, fps, audio_mode, preview)
+                else:
+                    process_video_file(input_file_path, output_file_path, speed, fps, audio_mode, journal, bitrates)
 
     if not found_videos:
         print("Nenhum arquivo de vídeo encontrado na pasta.")
     print(f"--- Processamento da pasta finalizado: {folder_path} ---")
     print()
+    metrics.report(f"Velocidade/FPS em {folder_path}")
 
 
 def main():
@@ -146,14 +204,22 @@ def main():
         default='remove',
         help="Modo de áudio: 'remove' para tirar o áudio, 'slow' para desacelerar. Padrão: remove."
     )
+    encode_settings.add_arguments(parser, presets=False)
+    job_journal.add_arguments(parser)
+    proxy_video.add_arguments(parser)
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
+    instrumentation.configure(args)
+    journal = job_journal.open_journal('adjust_speed_fps', args)
+    preview = proxy_video.get_preview_settings(args)
+    bitrates = encode_settings.get_bitrate_search(args)
 
     if args.folder:
         if not os.path.isdir(args.folder):
             print(f"ERRO: A pasta especificada não existe: {args.folder}", file=sys.stderr)
             sys.exit(1)
-        process_folder(args.folder, args.speed, args.fps, args.audio)
+        process_folder(args.folder, args.speed, args.fps, args.audio, journal, preview, bitrates)
     elif args.file:
         if not os.path.isfile(args.file):
             print(f"ERRO: O arquivo especificado não existe: {args.file}", file=sys.stderr)
@@ -162,13 +228,14 @@ def main():
             folders = [line.strip() for line in f if line.strip()]
             for folder in folders:
                 if os.path.isdir(folder):
-                    process_folder(folder, args.speed, args.fps, args.audio)
+                    process_folder(folder, args.speed, args.fps, args.audio, journal, preview, bitrates)
                 else:
                     print(f"AVISO: A pasta listada no arquivo não foi encontrada: {folder}")
     else:
         current_directory = os.getcwd()
         print(f"Nenhum caminho fornecido. Usando o diretório de trabalho atual: {current_directory}")
-        process_folder(current_directory, args.speed, args.fps, args.audio)
+        process_folder(current_directory, args.speed, args.fps, args.audio, journal, preview, bitrates)
+    journal.print_summary()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
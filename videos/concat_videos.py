@@ -0,0 +1,288 @@
+
+"""
+Junta todos os vídeos de uma pasta em um único arquivo.
+
+Todos os clipes são analisados em paralelo e agrupados pelos parâmetros dos streams
+(codec, perfil, resolução, SAR, pixel format, framerate, time base e áudio). Somente
+os clipes diferentes do formato majoritário são re-encodados (em paralelo) para esse
+formato, com o mesmo perfil e nível; em seguida tudo é unido com uma única cópia de
+streams (demuxer concat), sem re-encodar o resto.
+
+Os clipes re-encodados têm parâmetros de codec (SPS/PPS do H.264/HEVC) diferentes dos
+demais, mas o MP4 final guarda um único conjunto no cabeçalho, o do primeiro clipe.
+Por isso, quando há clipes re-encodados, todos passam antes por arquivos MPEG-TS com
+os parâmetros repetidos dentro do stream antes de cada keyframe (repeat-headers no
+encoder e o h264/hevc_mp4toannexb do muxer nos copiados), como no smart_render. As
+junções são decodificadas no final para conferir o resultado.
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections import Counter
+
+import instrumentation
+from ffmpeg_runner import run_command, run_many
+from instrumentation import metrics
+from smart_render import build_profile_args, check_seams
+
+# Encoder usado para converter os clipes fora do padrão para cada codec de destino
+VIDEO_ENCODERS = {'h264': 'libx264', 'hevc': 'libx265', 'vp9': 'libvpx-vp9', 'mpeg4': 'mpeg4'}
+# Encoders cujos parâmetros de codec podem ser repetidos no stream (opção de cada um)
+INBAND_PARAMS_OPTIONS = {'libx264': '-x264-params', 'libx265': '-x265-params'}
+AUDIO_ENCODERS = {'aac': 'aac', 'mp3': 'libmp3lame', 'opus': 'libopus', 'vorbis': 'libvorbis', 'ac3': 'ac3'}
+
+def build_probe_command(video_path):
+    """Comando ffprobe que lista os parâmetros dos streams de um clipe em JSON."""
+    return [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'stream=codec_type,codec_name,profile,level,width,height,sample_aspect_ratio,pix_fmt,'
+                         'r_frame_rate,time_base,sample_rate,channels:format=duration',
+        '-of', 'json',
+        video_path
+    ]
+
+def parse_probe_result(video_path, result):
+    """Interpreta o resultado (ou a exceção) do ffprobe de um clipe. Retorna None em caso de erro."""
+    if isinstance(result, FileNotFoundError):
+        print("ERRO: O comando 'ffprobe' não foi encontrado.", file=sys.stderr)
+        print("Por favor, instale o ffmpeg e garanta que ele esteja no PATH do seu sistema.", file=sys.stderr)
+        sys.exit(1)
+    try:
+        if isinstance(result, Exception):
+            raise result
+        data = json.loads(result.stdout)
+        streams = data.get('streams', [])
+    except (subprocess.CalledProcessError, json.JSONDecodeError) as e:
+        print(f"AVISO: Não foi possível analisar '{video_path}': {e}", file=sys.stderr)
+        return None
+
+    video = next((s for s in streams if s.get('codec_type') == 'video'), None)
+    audio = next((s for s in streams if s.get('codec_type') == 'audio'), None)
+    if video is None:
+        print(f"AVISO: '{video_path}' não tem stream de vídeo e será ignorado.", file=sys.stderr)
+        return None
+    try:
+        duration = float(data.get('format', {}).get('duration'))
+    except (TypeError, ValueError):
+        duration = None
+    return {'video': video, 'audio': audio, 'duration': duration}
+
+def stream_signature(clip_info):
+    """Tupla com os parâmetros que precisam ser iguais para juntar clipes sem re-encodar."""
+    video = clip_info['video']
+    audio = clip_info['audio'] or {}
+    return (
+        video.get('codec_name'), video.get('profile'), video.get('width'), video.get('height'),
+        video.get('sample_aspect_ratio'), video.get('pix_fmt'), video.get('r_frame_rate'), video.get('time_base'),
+        audio.get('codec_name'), audio.get('sample_rate'), audio.get('channels'),
+    )
+
+def build_normalize_command(input_path, output_path, target, has_audio, inband_params=False):
+    """
+    Monta o comando que converte um clipe para o formato majoritário 'target'
+    (um clipe de referência analisado por parse_probe_result). Com inband_params=True
+    os parâmetros do codec são repetidos em cada keyframe (saída em MPEG-TS).
+    """
+    video = target['video']
+    audio = target['audio']
+    width, height = video['width'], video['height']
+    encoder = VIDEO_ENCODERS.get(video.get('codec_name'), 'libx264')
+    sample_aspect_ratio = video.get('sample_aspect_ratio', '')
+    if not sample_aspect_ratio or sample_aspect_ratio in ('N/A', '0:1'):
+        sample_aspect_ratio = '1:1'
+
+    command = ['ffmpeg', '-y', '-i', input_path]
+    if audio and not has_audio:
+        # Clipe sem áudio: gera silêncio para manter o mesmo layout de streams
+        layout = 'stereo' if audio.get('channels', 2) >= 2 else 'mono'
+        command.extend(['-f', 'lavfi', '-i', f"anullsrc=r={audio.get('sample_rate', 48000)}:cl={layout}"])
+
+    command.extend([
+        '-map', '0:v:0',
+        '-vf', f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+               f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar={sample_aspect_ratio.replace(':', '/')},"
+               f"fps={video['r_frame_rate']},format={video['pix_fmt']}",
+        '-c:v', encoder,
+        '-crf', '18',
+        *build_profile_args(encoder, video),
+    ])
+    if inband_params and encoder in INBAND_PARAMS_OPTIONS:
+        command.extend([INBAND_PARAMS_OPTIONS[encoder], 'repeat-headers=1'])
+    if video.get('time_base', '').startswith('1/') and output_path.lower().endswith(('.mp4', '.mov')):
+        # Mesma escala de tempo dos demais clipes, para a cópia de streams não distorcer os tempos
+        command.extend(['-video_track_timescale', video['time_base'][2:]])
+
+    if audio:
+        command.extend([
+            '-map', '1:a:0' if not has_audio else '0:a:0',
+            '-c:a', AUDIO_ENCODERS.get(audio.get('codec_name'), 'aac'),
+            '-ar', str(audio.get('sample_rate', 48000)),
+            '-ac', str(audio.get('channels', 2)),
+        ])
+        if not has_audio:
+            command.append('-shortest')
+    else:
+        command.append('-an')
+
+    command.append(output_path)
+    return command
+
+def build_remux_command(input_path, output_path):
+    """Comando que copia os streams de um clipe para MPEG-TS (com os parâmetros do codec no stream)."""
+    return ['ffmpeg', '-v', 'error', '-y', '-i', input_path,
+            '-map', '0:v:0', '-map', '0:a:0?', '-c', 'copy', output_path]
+
+def concat_videos(video_files, output_path, workers):
+    """
+    Junta os clipes em output_path, re-encodando apenas os que fogem do formato
+    majoritário. Retorna True se o resultado foi gerado e as junções decodificam sem erros.
+    """
+    print(f"Analisando {len(video_files)} clipes...")
+    results = run_many([build_probe_command(path) for path in video_files], check=True, capture_output=True,
+                       limit=workers)
+    infos = [parse_probe_result(path, result) for path, result in zip(video_files, results)]
+
+    clips = [(path, info) for path, info in zip(video_files, infos) if info is not None]
+    if not clips:
+        print("Nenhum clipe válido para juntar.")
+        return False
+
+    signatures = Counter(stream_signature(info) for _, info in clips)
+    majority, count = signatures.most_common(1)[0]
+    target = next(info for _, info in clips if stream_signature(info) == majority)
+    outliers = [(path, info) for path, info in clips if stream_signature(info) != majority]
+    print(f"Formato majoritário ({count} de {len(clips)} clipes): {majority}")
+    # Com clipes re-encodados, os parâmetros do codec precisam ir dentro do stream
+    inband_params = bool(outliers) and VIDEO_ENCODERS.get(target['video'].get('codec_name')) in INBAND_PARAMS_OPTIONS
+    part_extension = '.ts' if inband_params else os.path.splitext(output_path)[1]
+
+    temp_dir = tempfile.mkdtemp(prefix='.concat_', dir=os.path.dirname(os.path.abspath(output_path)))
+    try:
+        normalized = {}
+        if outliers:
+            print(f"Re-encodando {len(outliers)} clipe(s) fora do padrão...")
+            outputs = [os.path.join(temp_dir, f"normalized_{index:04d}{part_extension}")
+                       for index in range(len(outliers))]
+            commands = [build_normalize_command(path, output, target, info['audio'] is not None, inband_params)
+                        for (path, info), output in zip(outliers, outputs)]
+            for (path, _), output, result in zip(outliers, outputs, run_many(commands, check=True, limit=workers)):
+                if isinstance(result, Exception):
+                    print(f"  ERRO ao converter '{path}'; o clipe será ignorado.", file=sys.stderr)
+                    print(f"  Erro do ffmpeg: {str(getattr(result, 'stderr', None) or result)[-500:]}", file=sys.stderr)
+                else:
+                    print(f"  Convertido: {os.path.basename(path)}")
+                    normalized[path] = output
+
+        if inband_params:
+            majority_clips = [path for path, info in clips if stream_signature(info) == majority]
+            outputs = [os.path.join(temp_dir, f"remuxed_{index:04d}.ts") for index in range(len(majority_clips))]
+            commands = [build_remux_command(path, output) for path, output in zip(majority_clips, outputs)]
+            for path, output, result in zip(majority_clips, outputs, run_many(commands, check=True, limit=workers)):
+                if isinstance(result, Exception):
+                    print(f"ERRO ao preparar '{path}' para a junção.", file=sys.stderr)
+                    print(f"Erro do ffmpeg: {str(getattr(result, 'stderr', None) or result)[-500:]}", file=sys.stderr)
+                    return False
+                normalized[path] = output
+
+        # Início de cada clipe na saída, para conferir as junções
+        seams = []
+        position = 0.0
+        list_file = os.path.join(temp_dir, 'lista.txt')
+        with open(list_file, 'w', encoding='utf-8') as f:
+            for path, info in clips:
+                if stream_signature(info) != majority and path not in normalized:
+                    continue
+                if position > 0:
+                    seams.append(position)
+                position += info['duration'] or 0.0
+                path = normalized.get(path, path)
+                escaped = os.path.abspath(path).replace(os.sep, '/').replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        print("Juntando os vídeos com FFmpeg...")
+        command = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_file, '-map', '0', '-c', 'copy']
+        time_base = target['video'].get('time_base', '')
+        if inband_params and time_base.startswith('1/') and output_path.lower().endswith(('.mp4', '.mov')):
+            # O MPEG-TS usa 90 kHz; a saída volta à escala de tempo dos clipes originais
+            command.extend(['-video_track_timescale', time_base[2:]])
+        command.append(output_path)
+        try:
+            run_command(command)
+        except subprocess.CalledProcessError as e:
+            print("ERRO ao juntar os vídeos.", file=sys.stderr)
+            print(f"Erro do ffmpeg: {e.stderr[-500:]}", file=sys.stderr)
+            return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    errors = check_seams(output_path, seams)
+    if errors:
+        print(f"ERRO: O vídeo final tem erros de decodificação: {'; '.join(errors)}", file=sys.stderr)
+        return False
+    print(f"Processo concluído! O vídeo final está salvo como \"{output_path}\".")
+    return True
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Junta os vídeos de uma pasta, re-encodando apenas os clipes com formato diferente da maioria.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument(
+        '-f', '--folder',
+        default='.',
+        help="Pasta com os vídeos a serem unidos (em ordem alfabética). Padrão: pasta atual."
+    )
+    parser.add_argument(
+        '-p', '--pattern',
+        default='*.mp4',
+        help="Padrão dos arquivos de vídeo. Padrão: *.mp4"
+    )
+    parser.add_argument(
+        '-i', '--input',
+        help="Arquivo .txt com a lista de vídeos (um por linha), em vez de --folder/--pattern."
+    )
+    parser.add_argument(
+        '-o', '--output',
+        default='video_final.mp4',
+        help="Arquivo de saída. Padrão: video_final.mp4"
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Análises e conversões simultâneas. Padrão: número de CPUs."
+    )
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure(args)
+
+    if args.input:
+        try:
+            with open(args.input, 'r', encoding='utf-8') as f:
+                video_files = [line.strip() for line in f if line.strip()]
+        except FileNotFoundError:
+            print(f"ERRO: Arquivo de lista '{args.input}' não encontrado.", file=sys.stderr)
+            sys.exit(1)
+    else:
+        output_abs = os.path.abspath(args.output)
+        video_files = [f for f in sorted(glob.glob(os.path.join(args.folder, args.pattern)))
+                       if os.path.abspath(f) != output_abs]
+
+    if not video_files:
+        print("Nenhum arquivo de vídeo encontrado.")
+        return
+
+    ok = concat_videos(video_files, args.output, max(args.workers, 1))
+    metrics.count('clips', len(video_files))
+    metrics.report(f"Junção de vídeos ({args.output})")
+    if not ok:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
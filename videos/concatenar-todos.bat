@@ -1,12 +1,6 @@
 @echo off
-echo Criando a lista de arquivos...
-(for %%i in (*.mp4) do @echo file '%%i') > lista.txt
+echo Juntando os videos com concat_videos.py...
+rem Clipes com formato diferente da maioria sao re-encodados antes da juncao.
+python "%~dp0concat_videos.py" --folder . --pattern "*.mp4" --output video_final.mp4
 
-echo Juntando os videos com FFmpeg...
-ffmpeg -f concat -safe 0 -i lista.txt -c copy video_final.mp4
-
-echo Limpando arquivos temporarios...
-del lista.txt
-
-echo Processo concluido! O video final esta salvo como "video_final.mp4".
 pause
@@ -1,25 +1,11 @@
-import subprocess
 import os
 import glob
 import argparse
 import re
 
-def run_ffmpeg_command(command, description):
-    """Executa um comando ffmpeg e imprime o status."""
-    print(f"--- {description} ---")
-    print(f"Executando comando: {' '.join(command)}")
-    try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, encoding='utf-8', errors='replace')
-        for line in process.stdout:
-            print(line, end='')
-        process.wait()
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(process.returncode, command)
-        print(f"Sucesso: {description} concluído.")
-    except subprocess.CalledProcessError as e:
-        print(f"ERRO ao executar o comando: {' '.join(command)}")
-        raise
-    print("-" * (len(description) + 6) + "\n")
+import instrumentation
+from ffmpeg_runner import run_ffmpeg_command
+from instrumentation import metrics
 
 def create_base_video(bitrate, folder, output_filename):
     """Cria o vídeo base a partir da sequência de imagens."""
@@ -31,7 +17,9 @@ def create_base_video(bitrate, folder, output_filename):
 
     image_pattern = os.path.join(folder, '*.JPG')
     print(f"Procurando por arquivos de imagem com o padrão: {image_pattern}")
-    image_files = sorted(glob.glob(image_pattern))
+    with metrics.phase('scan'):
+        image_files = sorted(glob.glob(image_pattern))
+    metrics.count('images', len(image_files))
 
     if not image_files:
         print(f"ERRO: Nenhum arquivo de imagem encontrado com o padrão '{image_pattern}'")
@@ -42,7 +30,7 @@ def create_base_video(bitrate, folder, output_filename):
     list_filename = "filelist.txt"
     with open(list_filename, "w") as f:
         for image_file in image_files:
-            f.write(f"file '{os.path.abspath(image_file).replace(\",'/')}'\n")
+            f.write(f"file '{os.path.abspath(image_file).replace(os.sep, '/')}'\n")
 
     command = [
         'ffmpeg', '-r', '30', '-f', 'concat', '-safe', '0', '-i', list_filename,
@@ -66,7 +54,9 @@ def main():
     parser = argparse.ArgumentParser(description="Cria um timelapse a partir de uma pasta de imagens.")
     parser.add_argument('--bitrate', type=str, default='20M', help='Bitrate do vídeo (ex: 20M, 50M). Padrão: 20M')
     parser.add_argument('--folder', type=str, default='.', help='Pasta contendo as imagens. Padrão: pasta atual')
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    instrumentation.configure(args)
 
     folder_name = os.path.basename(os.path.abspath(args.folder))
     output_filename = simplify_filename(folder_name) + ".mp4"
@@ -77,6 +67,7 @@ def main():
         print(f"Seu vídeo de timelapse está pronto: '{output_filename}'")
     except Exception as e:
         print(f"\nOcorreu um erro durante o processo: {e}")
+    metrics.report(f"Timelapse ({output_filename})")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
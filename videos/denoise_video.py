@@ -3,6 +3,13 @@ import os
 import argparse
 import json
 
+import encode_settings
+import instrumentation
+import job_journal
+import proxy_video
+from ffmpeg_runner import run_command, run_ffmpeg_command
+from instrumentation import metrics
+
 def get_video_bitrate(video_path):
     """Obtém o bitrate de um vídeo usando ffprobe."""
     command = [
@@ -14,7 +21,7 @@ def get_video_bitrate(video_path):
         video_path
     ]
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        result = run_command(command, capture_output=True, text=True)
         data = json.loads(result.stdout)
         # Prioriza o bitrate do stream de vídeo, se disponível
         for stream in data.get('streams', []):
@@ -28,40 +35,8 @@ def get_video_bitrate(video_path):
         print(f"Erro ao obter bitrate de {video_path}: {e}")
         return None
 
-def run_ffmpeg_command(command, description):
-    """Executa um comando ffmpeg e imprime o status."""
-    print(f"--- {description} ---")
-    print(f"Executando comando: {' '.join(command)}")
-    try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, encoding='utf-8', errors='replace')
-        for line in process.stdout:
-            print(line, end='')
-        process.wait()
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(process.returncode, command)
-        print(f"Sucesso: {description} concluído.")
-    except subprocess.CalledProcessError as e:
-        print(f"ERRO ao executar o comando: {' '.join(command)}")
-        raise
-    print("-" * (len(description) + 6) + "\n")
-
-def denoise_video(input_video, strength, bitrate=None):
-    """Aplica a redução de ruído."""
-    output_video = os.path.splitext(input_video)[0] + '_denoised.mp4'
-
-    if os.path.exists(output_video):
-        if input(f"O vídeo com denoise '{output_video}' já existe. Deseja recriá-lo? (s/n): ").lower() != 's':
-            print("Usando o vídeo com denoise existente.")
-            return
-        os.remove(output_video)
-
-    # Mapeia a força para os parâmetros do hqdn3d
-    luma_spatial = strength * 0.8
-    chroma_spatial = strength * 0.6
-    luma_tmp = strength * 1.2
-    chroma_tmp = strength * 0.8
-
-    # Define o bitrate
+def resolve_bitrate(input_video, bitrate):
+    """Bitrate da saída: o pedido ou, se None, o do vídeo original (padrão: 20M)."""
     if bitrate is None:
         print("Bitrate não especificado, tentando obter do vídeo original.")
         bitrate = get_video_bitrate(input_video)
@@ -70,21 +45,67 @@ def denoise_video(input_video, strength, bitrate=None):
         else:
             print("Não foi possível obter o bitrate original. Usando padrão de 20M.")
             bitrate = '20M'
+    return bitrate
 
+def build_denoise_filter(strength):
+    """Monta o filtro hqdn3d correspondente à força de redução de ruído."""
+    # Mapeia a força para os parâmetros do hqdn3d
+    luma_spatial = strength * 0.8
+    chroma_spatial = strength * 0.6
+    luma_tmp = strength * 1.2
+    chroma_tmp = strength * 0.8
+    return f'hqdn3d=luma_spatial={luma_spatial}:chroma_spatial={chroma_spatial}:luma_tmp={luma_tmp}:chroma_tmp={chroma_tmp}'
+
+def get_output_path(input_video):
+    """Caminho do vídeo com denoise gerado a partir de input_video."""
+    return os.path.splitext(input_video)[0] + '_denoised.mp4'
+
+def build_denoise_command(input_video, output_video, strength, bitrate, preset=None):
+    """Monta o comando ffmpeg da redução de ruído (sem preset: o padrão do libx264)."""
     command = [
         'ffmpeg', '-i', input_video,
-        '-vf', f'hqdn3d=luma_spatial={luma_spatial}:chroma_spatial={chroma_spatial}:luma_tmp={luma_tmp}:chroma_tmp={chroma_tmp}',
+        '-vf', build_denoise_filter(strength),
         '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-b:v', bitrate,
-        output_video
     ]
+    if preset:
+        command.extend(['-preset', preset])
+    command.append(output_video)
+    return command
+
+def denoise_video(input_video, strength, bitrate=None, output_video=None, preset=None):
+    """Aplica a redução de ruído, gravando em output_video (padrão: video_denoised.mp4)."""
+    output_video = output_video or get_output_path(input_video)
+
+    command = build_denoise_command(input_video, output_video, strength, resolve_bitrate(input_video, bitrate), preset)
     run_ffmpeg_command(command, f"Removendo ruído do vídeo ({output_video})")
 
+def preview_videos(videos, strength, bitrate, preview):
+    """Aplica a redução de ruído a uma janela curta da proxy de cada vídeo (modo --preview)."""
+    proxy_video.ensure_proxies(videos, preview.height)
+    for video in videos:
+        with metrics.item(video) as item:
+            output_video = proxy_video.get_preview_path(get_output_path(video))
+            try:
+                if os.path.exists(output_video):
+                    os.remove(output_video)
+                denoise_video(preview.clip(video), strength, bitrate, output_video)
+                print(f"\n--- Prévia salva em {output_video} ---")
+            except Exception as e:
+                item['status'] = 'error'
+                print(f"\nOcorreu um erro durante a prévia de {video}: {e}")
+
 def main():
     parser = argparse.ArgumentParser(description="Aplica redução de ruído em um vídeo.")
     parser.add_argument('--input', required=True, help='Caminho para o vídeo de entrada ou para um arquivo .txt com uma lista de vídeos.')
     parser.add_argument('--strength', type=int, default=4, help='Força da redução de ruído (1-10). Padrão: 4')
     parser.add_argument('--bitrate', help='Bitrate para o vídeo de saída (ex: 50M, 5000k). Se não especificado, usa o bitrate do vídeo original.')
+    encode_settings.add_arguments(parser)
+    job_journal.add_arguments(parser)
+    proxy_video.add_arguments(parser)
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    instrumentation.configure(args)
+    journal = job_journal.open_journal('denoise', args)
 
     if args.input.endswith('.txt'):
         with open(args.input, 'r') as f:
@@ -92,12 +113,35 @@ def main():
     else:
         videos = [args.input]
 
+    preview = proxy_video.get_preview_settings(args)
+    if preview:
+        preview_videos(videos, args.strength, args.bitrate, preview)
+        metrics.report("Prévia da redução de ruído")
+        return
+
+    presets = encode_settings.get_preset_selector(args)
+    presets.start_batch(videos)
+    bitrates = encode_settings.get_bitrate_search(args)
+    params = {'strength': args.strength, 'bitrate': args.bitrate, **presets.job_params(),
+              **(bitrates.job_params() if bitrates else {})}
     for video in videos:
-        try:
-            denoise_video(video, args.strength, args.bitrate)
-            print(f"\n--- Processo Finalizado para {video}! ---")
-        except Exception as e:
-            print(f"\nOcorreu um erro durante o processo de {video}: {e}")
+        with metrics.item(video) as item:
+            try:
+                with journal.job(video, get_output_path(video), params) as job:
+                    if job is None:
+                        item['status'] = 'skipped'
+                        presets.skip(video)
+                        continue
+                    command = build_denoise_command(video, job.partial_path, args.strength,
+                                                    resolve_bitrate(video, args.bitrate))
+                    preset, bitrate, job.meta = encode_settings.tune(video, command, presets, bitrates)
+                    denoise_video(video, args.strength, bitrate, job.partial_path, preset)
+                print(f"\n--- Processo Finalizado para {video}! ---")
+            except Exception as e:
+                item['status'] = 'error'
+                print(f"\nOcorreu um erro durante o processo de {video}: {e}")
+    journal.print_summary()
+    metrics.report("Redução de ruído")
 
 if __name__ == '__main__':
     main()
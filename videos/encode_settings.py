@@ -0,0 +1,394 @@
+
+"""
+Escolha do preset do libx264 conforme um orçamento de tempo.
+
+Com --preset auto, antes de cada vídeo alguns segundos do próprio vídeo são encodados
+(com os mesmos filtros e o mesmo bitrate da operação, mas sem gravar nada) em alguns
+presets candidatos, medindo a velocidade nesta máquina. O preset escolhido é o mais
+lento (melhor compressão) que ainda cumpre a meta:
+  - --time-budget HORAS: o lote inteiro deve terminar dentro do prazo. A velocidade
+    necessária é recalculada a cada vídeo com o tempo que sobrou e a duração dos vídeos
+    que faltam, então um vídeo que demorou mais que o previsto deixa os próximos mais
+    rápidos (e um que foi mais rápido libera presets melhores);
+  - --realtime FATOR: cada vídeo deve ser encodado a pelo menos FATOR vezes a sua
+    duração por segundo (ex: 0.5 = no máximo o dobro da duração do vídeo).
+
+A velocidade cai à medida que o preset fica mais lento, então a busca é binária sobre
+a lista de presets (3 ou 4 medições por vídeo).
+
+Busca de bitrate por vídeo (--bitrate-search, --min-ssim ou --min-psnr): em vez de usar
+sempre o bitrate fixo da ferramenta, alguns trechos curtos do vídeo são encodados em
+frações desse bitrate e comparados (filtro ssim ou psnr do ffmpeg) com os mesmos trechos
+processados sem perda. O bitrate usado é o menor que atinge a qualidade mínima em todos
+os trechos; o bitrate da ferramenta é o teto, então a busca nunca aumenta o arquivo.
+
+As escolhas e as medições ficam registradas no journal do job ('meta').
+"""
+
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+from ffmpeg_runner import run_command
+
+# Presets do libx264, do mais rápido ao mais lento ('placebo' fica de fora: o ganho não compensa)
+PRESETS = ('ultrafast', 'superfast', 'veryfast', 'faster', 'fast', 'medium', 'slow', 'slower', 'veryslow')
+
+DEFAULT_SAMPLE_SECONDS = 3.0
+
+# Folga sobre a velocidade medida: o trecho medido pode ser mais fácil que o resto do vídeo
+SAFETY_MARGIN = 1.15
+
+# Frações do bitrate da ferramenta testadas na busca de bitrate (a maior é o próprio bitrate)
+BITRATE_STEPS = (0.2, 0.3, 0.4, 0.55, 0.75, 1.0)
+DEFAULT_MIN_SSIM = 0.98
+DEFAULT_SEARCH_SAMPLES = 3
+DEFAULT_SEARCH_SECONDS = 2.0
+
+# Resumo impresso pelos filtros ssim e psnr do ffmpeg ao final da comparação
+QUALITY_PATTERNS = {
+    'ssim': re.compile(r'SSIM .*All:([\d.]+|inf)'),
+    'psnr': re.compile(r'PSNR .*average:([\d.]+|inf)'),
+}
+
+# Opções de áudio removidas dos trechos de teste (que são gerados sem áudio)
+AUDIO_OPTIONS = ('-af', '-filter:a', '-c:a', '-b:a')
+
+# Opções do encoder copiadas do comando da ferramenta para os trechos da busca de bitrate
+ENCODER_OPTIONS = ('-c:v', '-preset', '-tune', '-profile:v', '-pix_fmt')
+
+def probe_duration(video_path):
+    """Duração do vídeo em segundos usando ffprobe, ou None em caso de erro."""
+    command = [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration',
+        '-of', 'default=noprint_wrappers=1:nokey=1',
+        video_path
+    ]
+    try:
+        return float(run_command(command, capture_output=True, text=True).stdout.strip())
+    except (subprocess.CalledProcessError, FileNotFoundError, ValueError):
+        return None
+
+def parse_bitrate(value):
+    """Converte um bitrate do ffmpeg ('60M', '5000k' ou '20000000') em bits por segundo."""
+    value = str(value).strip()
+    multiplier = {'k': 1e3, 'm': 1e6, 'g': 1e9}.get(value[-1:].lower())
+    return int(float(value[:-1]) * multiplier) if multiplier else int(float(value))
+
+def format_bitrate(bits):
+    return f'{round(bits / 1000)}k'
+
+def get_option(command, option):
+    """Valor de uma opção ('-b:v', '-preset'...) de um comando ffmpeg, ou None."""
+    if option in command[:-1]:
+        return command[command.index(option) + 1]
+    return None
+
+def replace_option(command, option, value):
+    """
+    Cópia do comando com 'option' valendo 'value' (acrescentada antes da saída se não
+    existir), ou sem a opção quando value é None.
+    """
+    command = list(command)
+    if option in command[:-1]:
+        index = command.index(option)
+        if value is None:
+            del command[index:index + 2]
+        else:
+            command[index + 1] = value
+    elif value is not None:
+        command[-1:-1] = [option, value]
+    return command
+
+def build_sample_command(command, start, seconds, output='-'):
+    """
+    Transforma o comando de encode de uma ferramenta em um trecho de teste: só 'seconds'
+    segundos a partir de 'start', sem áudio, gravado em 'output' ('-': descartado).
+    """
+    index = command.index('-i')
+    sample = command[:index] + ['-ss', f'{start:.3f}', '-t', f'{seconds:.3f}'] + command[index:-1]
+    for option in AUDIO_OPTIONS:
+        while option in sample:
+            index = sample.index(option)
+            del sample[index:index + 2]
+    sample.append('-an')
+    return sample + (['-f', 'null', '-'] if output == '-' else ['-y', output])
+
+def build_benchmark_command(command, start, seconds):
+    """Medição de velocidade: o trecho é encodado e a saída descartada."""
+    return build_sample_command(command, start, seconds)
+
+def build_encode_command(command, source, output, bitrate):
+    """
+    Encoda 'source' com as opções de encoder de 'command' (sem os filtros) no bitrate
+    pedido. Sem '-c:v' no comando vale o padrão do ffmpeg para mp4/mkv, o libx264.
+    """
+    encode = ['ffmpeg', '-i', source]
+    for option in ENCODER_OPTIONS:
+        value = get_option(command, option) or ('libx264' if option == '-c:v' else None)
+        if value:
+            encode.extend([option, value])
+    return encode + ['-b:v', bitrate, '-an', '-y', output]
+
+def measure_quality(encoded, reference, metric='ssim'):
+    """Compara dois vídeos com o filtro ssim ou psnr do ffmpeg e retorna o valor médio."""
+    command = ['ffmpeg', '-i', encoded, '-i', reference, '-lavfi', f'[0:v][1:v]{metric}', '-f', 'null', '-']
+    result = run_command(command)
+    for line in reversed(result.log):
+        match = QUALITY_PATTERNS[metric].search(line)
+        if match:
+            return float(match.group(1))
+    raise RuntimeError(f"O ffmpeg não informou o {metric.upper()} de '{encoded}'.")
+
+def measure_speed(command, start, seconds):
+    """Executa a medição e retorna a velocidade (segundos de vídeo por segundo de relógio)."""
+    begin = time.monotonic()
+    run_command(build_benchmark_command(command, start, seconds))
+    return seconds / max(time.monotonic() - begin, 1e-6)
+
+class PresetSelector:
+    """
+    Escolhe o preset de cada vídeo de um lote. Com um preset fixo apenas o devolve; com
+    'auto' mede a velocidade dos candidatos em um trecho do vídeo (ver o início do módulo).
+    """
+
+    def __init__(self, preset=None, default=None, time_budget=None, realtime=None,
+                 sample_seconds=DEFAULT_SAMPLE_SECONDS):
+        self.preset = preset
+        self.default = default
+        self.time_budget = time_budget
+        self.realtime = realtime
+        self.sample_seconds = sample_seconds
+        self._deadline = None
+        self._durations = {}
+
+    @property
+    def adaptive(self):
+        return self.preset == 'auto'
+
+    def job_params(self):
+        """
+        Parâmetro do preset para o journal: vazio com o preset padrão da ferramenta, para
+        que os jobs concluídos antes desta opção existir continuem valendo.
+        """
+        return {} if self.preset == self.default else {'preset': self.preset}
+
+    def start_batch(self, videos):
+        """Marca o início do lote: o prazo de --time-budget começa a contar aqui."""
+        if not self.adaptive or not self.time_budget:
+            return
+        self._deadline = time.monotonic() + self.time_budget * 3600
+        for video in videos:
+            self._durations[video] = probe_duration(video) or 0.0
+        total = sum(self._durations.values())
+        print(f"Orçamento de tempo: {self.time_budget:g} h para {total / 3600:.2f} h de vídeo "
+              f"(velocidade mínima {total / (self.time_budget * 3600):.2f}x).")
+
+    def skip(self, video):
+        """Tira do orçamento um vídeo que não será encodado (já concluído ou vindo do cache)."""
+        self._durations.pop(video, None)
+
+    def required_speed(self, video):
+        """Velocidade mínima para o vídeo, ou None quando não há meta."""
+        if self.realtime:
+            return self.realtime
+        if self._deadline is None:
+            return None
+        remaining_media = sum(self._durations.values())
+        remaining_time = self._deadline - time.monotonic()
+        if remaining_time <= 0:
+            return float('inf')
+        return remaining_media / remaining_time
+
+    def choose(self, video, command):
+        """
+        Preset a usar no vídeo e um dicionário com os dados da escolha (para o journal;
+        None quando não houve medição). 'command' é o comando de encode da ferramenta.
+        """
+        if not self.adaptive:
+            return self.preset, None
+        required = self.required_speed(video)
+        duration = self._durations.pop(video, None) or probe_duration(video)
+        if required is None or not duration:
+            print(f"AVISO: Sem meta de tempo ou duração para '{video}'; usando o preset padrão.")
+            return self.default, None
+
+        seconds = min(self.sample_seconds, duration)
+        # O meio do vídeo costuma representar melhor o conteúdo que a abertura
+        start = max(duration / 2 - seconds / 2, 0.0)
+        speeds = {}
+        low, high, best = 0, len(PRESETS) - 1, 0
+        while low <= high:
+            middle = (low + high) // 2
+            preset = PRESETS[middle]
+            try:
+                speeds[preset] = round(measure_speed(replace_option(command, '-preset', preset), start, seconds), 3)
+            except subprocess.CalledProcessError as e:
+                print(f"AVISO: Falha ao medir o preset '{preset}' em '{video}': {str(e.stderr)[-300:]}")
+                return self.default, None
+            if speeds[preset] >= required * SAFETY_MARGIN:
+                best, low = middle, middle + 1
+            else:
+                high = middle - 1
+
+        chosen = PRESETS[best]
+        met = speeds[chosen] >= required * SAFETY_MARGIN
+        print(f"Preset escolhido para '{os.path.basename(video)}': {chosen} "
+              f"({speeds[chosen]:.2f}x; necessário {required:.2f}x)"
+              + ("" if met else " — AVISO: nem o preset mais rápido cumpre a meta"))
+        return chosen, {'preset': chosen, 'required_speed': round(required, 3), 'speeds': speeds,
+                        'sample': [round(start, 3), round(seconds, 3)], 'met': met}
+
+class BitrateSearch:
+    """
+    Busca, para cada vídeo, o menor bitrate que atinge uma qualidade mínima (SSIM ou
+    PSNR) em trechos curtos do próprio vídeo (ver o início do módulo).
+    """
+
+    def __init__(self, metric='ssim', threshold=DEFAULT_MIN_SSIM, samples=DEFAULT_SEARCH_SAMPLES,
+                 sample_seconds=DEFAULT_SEARCH_SECONDS):
+        self.metric = metric
+        self.threshold = threshold
+        self.samples = samples
+        self.sample_seconds = sample_seconds
+
+    def job_params(self):
+        """Parâmetro da busca para o journal: a saída depende da meta de qualidade."""
+        return {'bitrate_search': {self.metric: self.threshold}}
+
+    def choose(self, video, command):
+        """
+        Bitrate a usar no vídeo e um dicionário com os dados da escolha (para o journal;
+        None quando a busca não foi possível). O '-b:v' de 'command' é o teto da busca.
+        """
+        max_bitrate = get_option(command, '-b:v')
+        duration = probe_duration(video)
+        if not max_bitrate or not duration:
+            print(f"AVISO: Sem bitrate ou duração para '{video}'; mantendo o bitrate padrão.")
+            return max_bitrate, None
+
+        seconds = min(self.sample_seconds, duration / self.samples)
+        # Trechos espalhados pelo vídeo, evitando a abertura e o final
+        starts = [duration * (i + 1) / (self.samples + 1) - seconds / 2 for i in range(self.samples)]
+        starts = [max(start, 0.0) for start in starts]
+        candidates = [parse_bitrate(max_bitrate) * step for step in BITRATE_STEPS]
+        # Cada trecho passa pelos filtros da ferramenta uma única vez, sem perda; os testes
+        # de bitrate encodam essa referência. Assim só o encoder é medido, mesmo com filtros
+        # que não dão sempre o mesmo resultado em um trecho isolado (vidstabtransform)
+        reference = replace_option(replace_option(replace_option(
+            replace_option(command, '-b:v', None), '-c:v', 'libx264'), '-preset', 'ultrafast'), '-qp', '0')
+
+        temp_dir = tempfile.mkdtemp(prefix='bitrate_search_')
+        scores = {}
+        try:
+            references = [os.path.join(temp_dir, f'reference_{i}.mkv') for i in range(len(starts))]
+            for start, reference_path in zip(starts, references):
+                run_command(build_sample_command(reference, start, seconds, reference_path))
+
+            def quality(bitrate):
+                # Pior trecho: o bitrate precisa servir para o vídeo inteiro
+                worst = None
+                for i, reference_path in enumerate(references):
+                    sample_path = os.path.join(temp_dir, f'sample_{i}.mkv')
+                    run_command(build_encode_command(command, reference_path, sample_path, format_bitrate(bitrate)))
+                    value = measure_quality(sample_path, reference_path, self.metric)
+                    worst = value if worst is None else min(worst, value)
+                    if worst < self.threshold:
+                        break
+                return worst
+
+            # A qualidade cresce com o bitrate: busca binária pelo menor que atinge a meta
+            low, high, best = 0, len(candidates) - 1, len(candidates) - 1
+            while low <= high:
+                middle = (low + high) // 2
+                scores[format_bitrate(candidates[middle])] = round(quality(candidates[middle]), 4)
+                if scores[format_bitrate(candidates[middle])] >= self.threshold:
+                    best, high = middle, middle - 1
+                else:
+                    low = middle + 1
+        except (subprocess.CalledProcessError, RuntimeError) as e:
+            print(f"AVISO: Falha na busca de bitrate de '{video}': {str(getattr(e, 'stderr', None) or e)[-300:]}")
+            return max_bitrate, None
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+        chosen = format_bitrate(candidates[best]) if best < len(candidates) - 1 else max_bitrate
+        met = scores.get(format_bitrate(candidates[best]), self.threshold) >= self.threshold
+        print(f"Bitrate escolhido para '{os.path.basename(video)}': {chosen} (de {max_bitrate}; "
+              f"{self.metric.upper()} mínimo {self.threshold:g})"
+              + ("" if met else " — AVISO: nem o bitrate padrão atinge a meta"))
+        return chosen, {'bitrate': chosen, 'max_bitrate': max_bitrate, 'metric': self.metric,
+                        'threshold': self.threshold, 'scores': scores, 'met': met}
+
+def tune(video, command, presets=None, bitrates=None):
+    """
+    Aplica ao comando de encode de um vídeo a escolha de preset (PresetSelector) e a busca
+    de bitrate (BitrateSearch), nesta ordem, já que a qualidade de cada bitrate depende
+    do preset. Retorna (preset, bitrate, meta), onde 'meta' vai para o journal do job.
+    """
+    meta = {}
+    if presets:
+        preset, meta['preset'] = presets.choose(video, command)
+        if preset is not None:
+            # None: mantém o preset que a própria ferramenta colocou no comando
+            command = replace_option(command, '-preset', preset)
+    if bitrates:
+        bitrate, meta['bitrate'] = bitrates.choose(video, command)
+        command = replace_option(command, '-b:v', bitrate)
+    return get_option(command, '-preset'), get_option(command, '-b:v'), {k: v for k, v in meta.items() if v}
+
+def add_arguments(parser, default=None, presets=True):
+    """
+    Adiciona as opções da busca de bitrate (--bitrate-search, --min-ssim, --min-psnr e
+    --search-samples) e, com presets=True, as da escolha de preset (--preset,
+    --time-budget, --realtime e --benchmark-seconds). 'default' é o preset usado sem
+    --preset (None: o padrão do libx264, 'medium').
+    """
+    if presets:
+        group = parser.add_argument_group("preset do encoder")
+        group.add_argument('--preset', choices=PRESETS + ('auto',), default=default,
+                           help="Preset do libx264, ou 'auto' para escolher pelo orçamento de tempo "
+                                f"(--time-budget ou --realtime). Padrão: {default or 'medium'}.")
+        group.add_argument('--time-budget', type=float, metavar='HORAS',
+                           help="Prazo para o lote inteiro terminar (implica --preset auto).")
+        group.add_argument('--realtime', type=float, metavar='FATOR',
+                           help="Velocidade mínima de cada encode em relação à duração do vídeo "
+                                "(ex: 0.5; implica --preset auto).")
+        group.add_argument('--benchmark-seconds', type=float, default=DEFAULT_SAMPLE_SECONDS, metavar='S',
+                           help=f"Duração do trecho medido em cada preset. Padrão: {DEFAULT_SAMPLE_SECONDS:g}.")
+        parser.set_defaults(default_preset=default)
+
+    group = parser.add_argument_group("busca de bitrate")
+    group.add_argument('--bitrate-search', action='store_true',
+                       help="Usa o menor bitrate (até o bitrate normal) que atinge a qualidade mínima "
+                            f"em trechos do vídeo. Padrão da meta: SSIM {DEFAULT_MIN_SSIM:g}.")
+    metric = group.add_mutually_exclusive_group()
+    metric.add_argument('--min-ssim', type=float, metavar='SSIM',
+                        help="Qualidade mínima pelo SSIM (ex: 0.98; implica --bitrate-search).")
+    metric.add_argument('--min-psnr', type=float, metavar='DB',
+                        help="Qualidade mínima pelo PSNR em dB (ex: 42; implica --bitrate-search).")
+    group.add_argument('--search-samples', type=int, default=DEFAULT_SEARCH_SAMPLES, metavar='N',
+                       help=f"Trechos de {DEFAULT_SEARCH_SECONDS:g}s comparados em cada bitrate. "
+                            f"Padrão: {DEFAULT_SEARCH_SAMPLES}.")
+
+def get_preset_selector(args):
+    """PresetSelector conforme as opções de add_arguments."""
+    preset = args.preset
+    if args.time_budget or args.realtime:
+        preset = 'auto'
+    elif preset == 'auto':
+        print("AVISO: --preset auto precisa de --time-budget ou --realtime; usando o preset padrão.")
+        preset = args.default_preset
+    return PresetSelector(preset, args.default_preset, args.time_budget, args.realtime, args.benchmark_seconds)
+
+def get_bitrate_search(args):
+    """BitrateSearch conforme as opções de add_arguments, ou None se a busca não foi pedida."""
+    if args.min_psnr:
+        return BitrateSearch('psnr', args.min_psnr, max(args.search_samples, 1))
+    if args.min_ssim or args.bitrate_search:
+        return BitrateSearch('ssim', args.min_ssim or DEFAULT_MIN_SSIM, max(args.search_samples, 1))
+    return None
@@ -3,6 +3,32 @@ import argparse
 import os
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+from ffmpeg_runner import run_command, run_many
+from instrumentation import metrics
+from keyframe_index import load_keyframe_index
+
+try:
+    import numpy as np
+except ImportError:
+    # Sem NumPy o modo 'scene' usa o score de cena calculado pelo próprio ffmpeg
+    np = None
+
+# Resolução da passada de análise do modo 'scene' (apenas o plano de luma)
+ANALYSIS_WIDTH = 64
+ANALYSIS_HEIGHT = 36
+
+# Espaçamento em pixels entre as miniaturas da folha de contato
+CONTACT_SHEET_PADDING = 4
+
+# Opções de qualidade do ffmpeg por formato da folha de contato
+# (o -q:v do mjpeg vai de 1=melhor a 31=pior; o -quality do libwebp de 0 a 100)
+IMAGE_QUALITY_OPTIONS = {
+    'jpg': ['-q:v', '2'],
+    'webp': ['-quality', '85'],
+}
 
 def get_video_duration(filepath):
     """Usa ffprobe para obter a duração de um vídeo em segundos."""
@@ -14,7 +40,7 @@ def get_video_duration(filepath):
         filepath
     ]
     try:
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        result = run_command(command, capture_output=True, text=True)
         return float(result.stdout)
     except FileNotFoundError:
         print("Erro: 'ffprobe' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
@@ -26,39 +52,165 @@ def get_video_duration(filepath):
         print(f"Não foi possível obter a duração do vídeo: '{filepath}'. O arquivo está corrompido ou não é um vídeo?", file=sys.stderr)
         return None
 
-def extract_equally_spaced_frames(video_path, num_frames, base_output_dir):
+def get_video_resolution(filepath):
+    """Usa ffprobe para obter a largura e a altura do primeiro stream de vídeo."""
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=width,height',
+        '-of', 'csv=p=0:s=x',
+        filepath
+    ]
+    try:
+        result = run_command(command, capture_output=True, text=True)
+        width, height = result.stdout.strip().split('x')[:2]
+        return int(width), int(height)
+    except FileNotFoundError:
+        print("Erro: 'ffprobe' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
+        return None
+    except subprocess.CalledProcessError as e:
+        print(f"Erro ao executar ffprobe para o arquivo '{filepath}': {e.stderr}", file=sys.stderr)
+        return None
+    except ValueError:
+        print(f"Não foi possível obter a resolução do vídeo: '{filepath}'.", file=sys.stderr)
+        return None
+
+def compute_scene_scores_numpy(video_path, analysis_fps):
     """
-    Extrai uma quantidade de frames igualmente espaçados de um vídeo.
+    Decodifica o vídeo uma única vez em baixa resolução (apenas luma) e calcula,
+    de forma vetorizada, a diferença média absoluta entre frames consecutivos.
+    Retorna uma lista de (timestamp, score) ou None em caso de erro.
     """
-    video_basename = os.path.splitext(os.path.basename(video_path))[0]
-    print(f"\n--- Processando: {video_basename} ---")
+    command = [
+        'ffmpeg',
+        '-v', 'error',
+        '-i', video_path,
+        '-an', '-sn',
+        '-vf', f'fps={analysis_fps},scale={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT},format=gray',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'gray',
+        '-'
+    ]
+    try:
+        result = run_command(command, capture_output=True)
+    except FileNotFoundError:
+        print("Erro: 'ffmpeg' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
+        return None
+    except subprocess.CalledProcessError as e:
+        print(f"Erro na passada de análise de '{video_path}': {e.stderr}", file=sys.stderr)
+        return None
 
-    duration = get_video_duration(video_path)
-    if duration is None:
-        return
+    frame_size = ANALYSIS_WIDTH * ANALYSIS_HEIGHT
+    num_analysis_frames = len(result.stdout) // frame_size
+    if num_analysis_frames == 0:
+        return []
 
-    # Cria o diretório de saída para os frames deste vídeo
-    frame_output_dir = os.path.join(base_output_dir, f"{video_basename}_frames")
+    frames = np.frombuffer(result.stdout, dtype=np.uint8, count=num_analysis_frames * frame_size)
+    frames = frames.reshape(num_analysis_frames, frame_size).astype(np.int16)
+
+    # O primeiro frame não tem antecessor: recebe o maior score para que a cena
+    # de abertura sempre seja representada
+    scores = np.empty(num_analysis_frames, dtype=np.float64)
+    scores[0] = np.inf
+    scores[1:] = np.abs(np.diff(frames, axis=0)).mean(axis=1)
+
+    timestamps = np.arange(num_analysis_frames, dtype=np.float64) / analysis_fps
+    return list(zip(timestamps.tolist(), scores.tolist()))
+
+def compute_scene_scores_ffmpeg(video_path, analysis_fps):
+    """
+    Alternativa sem NumPy: lê o score 'scene' calculado pelo filtro select do ffmpeg.
+    Retorna uma lista de (timestamp, score) ou None em caso de erro.
+    """
+    command = [
+        'ffmpeg',
+        '-v', 'error',
+        '-i', video_path,
+        '-an', '-sn',
+        '-vf', f"fps={analysis_fps},scale={ANALYSIS_WIDTH}:{ANALYSIS_HEIGHT},select='gte(scene,0)',metadata=print:file=-",
+        '-f', 'null',
+        '-'
+    ]
     try:
-        os.makedirs(frame_output_dir, exist_ok=True)
-    except OSError as e:
-        print(f"Erro ao criar o diretório '{frame_output_dir}': {e}", file=sys.stderr)
-        return
+        result = run_command(command, capture_output=True, text=True)
+    except FileNotFoundError:
+        print("Erro: 'ffmpeg' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
+        return None
+    except subprocess.CalledProcessError as e:
+        print(f"Erro na passada de análise de '{video_path}': {e.stderr}", file=sys.stderr)
+        return None
 
-    print(f"Duração do vídeo: {duration:.2f} segundos. Extraindo {num_frames} frames.")
-    print(f"Os frames serão salvos em: {frame_output_dir}")
+    scene_scores = []
+    timestamp = None
+    for line in result.stdout.splitlines():
+        if 'pts_time:' in line:
+            timestamp = float(line.split('pts_time:')[1].split()[0])
+        elif line.startswith('lavfi.scene_score=') and timestamp is not None:
+            score = float(line.split('=', 1)[1])
+            # Mesmo critério do modo NumPy: a abertura sempre é considerada
+            scene_scores.append((timestamp, float('inf') if not scene_scores else score))
+            timestamp = None
+    return scene_scores
 
-    # Calcula o intervalo de tempo entre os frames
+def select_distinct_timestamps(scene_scores, num_frames, min_gap):
+    """
+    Escolhe os num_frames timestamps com maior score, mantendo uma distância mínima
+    entre eles para não selecionar vários frames da mesma transição.
+    Se não houver candidatos suficientes, completa com os melhores restantes.
+    """
+    ranked = sorted(scene_scores, key=lambda item: item[1], reverse=True)
+    selected = []
+    for timestamp, _ in ranked:
+        if len(selected) == num_frames:
+            break
+        if all(abs(timestamp - chosen) >= min_gap for chosen in selected):
+            selected.append(timestamp)
+
+    if len(selected) < num_frames:
+        for timestamp, _ in ranked:
+            if len(selected) == num_frames:
+                break
+            if timestamp not in selected:
+                selected.append(timestamp)
+
+    return sorted(selected)
+
+def get_equally_spaced_timestamps(duration, num_frames):
+    """Calcula os tempos de num_frames frames igualmente espaçados."""
     # Usamos num_frames + 1 para espaçar os frames dentro do vídeo, não nas pontas
     interval = duration / (num_frames + 1)
+    return [interval * i for i in range(1, num_frames + 1)]
+
+def get_scene_change_timestamps(video_path, duration, num_frames, analysis_fps):
+    """
+    Executa a passada de análise em baixa resolução e retorna os tempos dos
+    num_frames frames mais distintos do vídeo.
+    """
+    if np is not None:
+        scene_scores = compute_scene_scores_numpy(video_path, analysis_fps)
+    else:
+        print("Aviso: NumPy não está instalado. Usando o score de cena do ffmpeg.", file=sys.stderr)
+        scene_scores = compute_scene_scores_ffmpeg(video_path, analysis_fps)
+
+    if not scene_scores:
+        return None
 
-    for i in range(1, num_frames + 1):
-        timestamp = interval * i
+    min_gap = duration / (4 * num_frames)
+    return select_distinct_timestamps(scene_scores, num_frames, min_gap)
+
+def extract_frames_at(video_path, timestamps, frame_output_dir):
+    """
+    Extrai em resolução total um frame para cada tempo informado.
+    """
+    num_frames = len(timestamps)
+    commands = []
+    for i, timestamp in enumerate(timestamps, start=1):
         output_filename = os.path.join(frame_output_dir, f"frame_{i:02d}.jpg")
         
         print(f"  Extraindo frame {i}/{num_frames} no tempo {timestamp:.2f}s...")
 
-        command = [
+        commands.append([
             'ffmpeg',
             '-y', # Sobrescreve o frame se já existir
             '-ss', str(timestamp), # Busca pelo tempo exato
@@ -66,23 +218,184 @@ def extract_equally_spaced_frames(video_path, num_frames, base_output_dir):
             '-vframes', '1', # Extrai apenas 1 frame
             '-q:v', '2', # Qualidade do JPEG (1=melhor, 31=pior)
             output_filename
-        ]
+        ])
 
-        try:
-            # Escondemos a saída do ffmpeg para não poluir o terminal
-            subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
-        except FileNotFoundError:
+    # As extrações são independentes e rodam ao mesmo tempo; a saída do ffmpeg
+    # fica no log de cada job para não poluir o terminal
+    for timestamp, result in zip(timestamps, run_many(commands, check=True)):
+        if isinstance(result, FileNotFoundError):
+            print("Erro: 'ffmpeg' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
+            return False
+        if isinstance(result, Exception):
+            print(f"  Falha ao extrair frame no tempo {timestamp:.2f}s. Erro: {getattr(result, 'stderr', None) or result}", file=sys.stderr)
+    return True
+
+def snap_to_keyframes(video_path, timestamps):
+    """
+    Move cada tempo para o keyframe mais próximo, usando o índice de keyframes.
+    Assim cada extração decodifica um único frame em vez de todo o GOP anterior.
+    """
+    keyframes = load_keyframe_index(video_path)
+    if keyframes is None:
+        return timestamps
+    return sorted(set(keyframes.nearest_keyframe(t) for t in timestamps))
+
+def extract_frames(video_path, num_frames, base_output_dir, mode='uniform', analysis_fps=2.0, snap_keyframes=False):
+    """
+    Extrai uma quantidade de frames de um vídeo.
+
+    No modo 'uniform' os frames são igualmente espaçados. No modo 'scene' uma
+    passada de análise em baixa resolução escolhe os frames mais distintos e,
+    em seguida, apenas esses frames são extraídos em resolução total.
+    """
+    video_basename = os.path.splitext(os.path.basename(video_path))[0]
+    print(f"\n--- Processando: {video_basename} ---")
+
+    duration = get_video_duration(video_path)
+    if duration is None:
+        return
+
+    if mode == 'scene':
+        print(f"Analisando mudanças de cena a {analysis_fps} fps em baixa resolução...")
+        timestamps = get_scene_change_timestamps(video_path, duration, num_frames, analysis_fps)
+        if timestamps is None:
+            print(f"Não foi possível analisar as cenas de '{video_basename}'.", file=sys.stderr)
+            return
+    else:
+        timestamps = get_equally_spaced_timestamps(duration, num_frames)
+
+    if snap_keyframes:
+        timestamps = snap_to_keyframes(video_path, timestamps)
+
+    # Cria o diretório de saída para os frames deste vídeo
+    frame_output_dir = os.path.join(base_output_dir, f"{video_basename}_frames")
+    try:
+        os.makedirs(frame_output_dir, exist_ok=True)
+    except OSError as e:
+        print(f"Erro ao criar o diretório '{frame_output_dir}': {e}", file=sys.stderr)
+        return
+
+    print(f"Duração do vídeo: {duration:.2f} segundos. Extraindo {len(timestamps)} frames.")
+    print(f"Os frames serão salvos em: {frame_output_dir}")
+
+    if extract_frames_at(video_path, timestamps, frame_output_dir):
+        print(f"Extração de frames para '{video_basename}' concluída.")
+
+def build_thumbnail_command(video_path, timestamp, width, height):
+    """Comando que decodifica um único frame como RGB cru, já reduzido para width x height."""
+    return [
+        'ffmpeg',
+        '-v', 'error',
+        '-ss', str(timestamp),
+        '-i', video_path,
+        '-frames:v', '1',
+        '-vf', f'scale={width}:{height}:force_original_aspect_ratio=decrease,'
+               f'pad={width}:{height}:(ow-iw)/2:(oh-ih)/2',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        '-'
+    ]
+
+def decode_thumbnail(data, width, height):
+    """Converte a saída de build_thumbnail_command em um array (height, width, 3), ou None se incompleta."""
+    frame_size = width * height * 3
+    if len(data) < frame_size:
+        return None
+    return np.frombuffer(data, dtype=np.uint8, count=frame_size).reshape(height, width, 3)
+
+def build_contact_sheet(thumbnails, columns, padding=CONTACT_SHEET_PADDING):
+    """Organiza as miniaturas em uma grade, em memória, e retorna a imagem resultante."""
+    height, width, _ = thumbnails[0].shape
+    rows = -(-len(thumbnails) // columns)
+    sheet = np.zeros((rows * (height + padding) + padding, columns * (width + padding) + padding, 3), dtype=np.uint8)
+    for index, thumbnail in enumerate(thumbnails):
+        row, column = divmod(index, columns)
+        top = padding + row * (height + padding)
+        left = padding + column * (width + padding)
+        sheet[top:top + height, left:left + width] = thumbnail
+    return sheet
+
+def write_image(image, output_path):
+    """Codifica um array RGB como JPEG ou WebP (pela extensão de output_path) usando o ffmpeg."""
+    height, width, _ = image.shape
+    command = [
+        'ffmpeg',
+        '-v', 'error',
+        '-y',
+        '-f', 'rawvideo',
+        '-pix_fmt', 'rgb24',
+        '-s', f'{width}x{height}',
+        '-i', '-',
+        '-frames:v', '1',
+        *IMAGE_QUALITY_OPTIONS.get(os.path.splitext(output_path)[1].lower().lstrip('.'), []),
+        output_path
+    ]
+    run_command(command, input=image.tobytes())
+
+def create_contact_sheet(video_path, num_frames, base_output_dir, mode='uniform', analysis_fps=2.0,
+                         columns=5, thumb_width=320, image_format='jpg', snap_keyframes=False):
+    """
+    Gera uma única folha de contato (grade de miniaturas) por vídeo, em vez de N arquivos.
+    """
+    if np is None:
+        print("Erro: A folha de contato requer a biblioteca NumPy (pip install numpy).", file=sys.stderr)
+        return
+
+    video_basename = os.path.splitext(os.path.basename(video_path))[0]
+    print(f"\n--- Processando: {video_basename} ---")
+
+    duration = get_video_duration(video_path)
+    resolution = get_video_resolution(video_path)
+    if duration is None or resolution is None:
+        return
+
+    if mode == 'scene':
+        timestamps = get_scene_change_timestamps(video_path, duration, num_frames, analysis_fps)
+        if timestamps is None:
+            print(f"Não foi possível analisar as cenas de '{video_basename}'.", file=sys.stderr)
+            return
+    else:
+        timestamps = get_equally_spaced_timestamps(duration, num_frames)
+
+    if snap_keyframes:
+        timestamps = snap_to_keyframes(video_path, timestamps)
+
+    # Mantém a proporção do vídeo; o ffmpeg exige dimensões pares
+    video_width, video_height = resolution
+    thumb_width = max(2, thumb_width // 2 * 2)
+    thumb_height = max(2, round(thumb_width * video_height / video_width / 2) * 2)
+
+    # Todas as miniaturas são decodificadas ao mesmo tempo
+    commands = [build_thumbnail_command(video_path, timestamp, thumb_width, thumb_height) for timestamp in timestamps]
+    thumbnails = []
+    for result in run_many(commands, check=True, capture_output=True):
+        if isinstance(result, FileNotFoundError):
             print("Erro: 'ffmpeg' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
-            # Interrompe o loop se o ffmpeg não for encontrado
             return
-        except subprocess.CalledProcessError as e:
-            print(f"  Falha ao extrair frame no tempo {timestamp:.2f}s. Erro: {e.stderr}", file=sys.stderr)
-    
-    print(f"Extração de frames para '{video_basename}' concluída.")
+        if isinstance(result, Exception):
+            print(f"Falha ao decodificar miniaturas de '{video_basename}'. Erro: {getattr(result, 'stderr', None) or result}", file=sys.stderr)
+            return
+        thumbnail = decode_thumbnail(result.stdout, thumb_width, thumb_height)
+        if thumbnail is not None:
+            thumbnails.append(thumbnail)
+
+    if not thumbnails:
+        print(f"Nenhuma miniatura pôde ser extraída de '{video_basename}'.", file=sys.stderr)
+        return
+
+    output_path = os.path.join(base_output_dir, f"{video_basename}_contact.{image_format}")
+    try:
+        os.makedirs(base_output_dir, exist_ok=True)
+        write_image(build_contact_sheet(thumbnails, min(columns, len(thumbnails))), output_path)
+    except (OSError, subprocess.CalledProcessError) as e:
+        print(f"Erro ao salvar a folha de contato '{output_path}': {e}", file=sys.stderr)
+        return
+
+    print(f"Folha de contato com {len(thumbnails)} miniaturas salva em: {output_path}")
 
 def main():
     parser = argparse.ArgumentParser(
-        description="Extrai N frames igualmente espaçados de arquivos de vídeo. Requer FFmpeg e ffprobe no PATH.",
+        description="Extrai N frames de arquivos de vídeo, igualmente espaçados ou nas mudanças de cena. Requer FFmpeg e ffprobe no PATH.",
         formatter_class=argparse.RawTextHelpFormatter
     )
     parser.add_argument(
@@ -102,13 +415,69 @@ def main():
         default='.',
         help="Diretório principal onde as pastas de frames serão criadas. Padrão: diretório atual."
     )
+    parser.add_argument(
+        '-m', '--mode',
+        choices=['uniform', 'scene'],
+        default='uniform',
+        help="Modo de amostragem:\n"
+             "  uniform - frames igualmente espaçados (padrão).\n"
+             "  scene   - os N frames mais distintos, detectados numa passada em baixa resolução."
+    )
+    parser.add_argument(
+        '--analysis-fps',
+        type=float,
+        default=2.0,
+        help="Frames por segundo analisados no modo 'scene'. Padrão: 2."
+    )
+    parser.add_argument(
+        '--contact-sheet',
+        action='store_true',
+        help="Gera uma única folha de contato por vídeo em vez de N arquivos JPEG. Requer NumPy."
+    )
+    parser.add_argument(
+        '--columns',
+        type=int,
+        default=5,
+        help="Número de colunas da folha de contato. Padrão: 5."
+    )
+    parser.add_argument(
+        '--thumb-width',
+        type=int,
+        default=320,
+        help="Largura de cada miniatura da folha de contato, em pixels. Padrão: 320."
+    )
+    parser.add_argument(
+        '--format',
+        choices=['jpg', 'webp'],
+        default='jpg',
+        help="Formato da folha de contato. Padrão: jpg."
+    )
+    parser.add_argument(
+        '-w', '--workers',
+        type=int,
+        default=1,
+        help="Número de vídeos processados em paralelo. Padrão: 1."
+    )
+    parser.add_argument(
+        '--snap-keyframes',
+        action='store_true',
+        help="Usa o keyframe mais próximo de cada tempo (índice de keyframes): extração bem mais rápida."
+    )
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
+    instrumentation.configure(args)
 
     # Valida o número de frames
     if args.num_frames <= 0:
         print("Erro: O número de frames deve ser maior que zero.", file=sys.stderr)
         sys.exit(1)
+    if args.analysis_fps <= 0:
+        print("Erro: O valor de --analysis-fps deve ser maior que zero.", file=sys.stderr)
+        sys.exit(1)
+    if args.columns <= 0 or args.thumb_width <= 0 or args.workers <= 0:
+        print("Erro: --columns, --thumb-width e --workers devem ser maiores que zero.", file=sys.stderr)
+        sys.exit(1)
 
     video_files = []
     if args.input.lower().endswith('.txt'):
@@ -137,8 +506,23 @@ def main():
 
     print(f"Total de {len(video_files)} vídeo(s) para processar.")
 
-    for video_path in video_files:
-        extract_equally_spaced_frames(video_path, args.num_frames, args.output_dir)
+    def process_video(video_path):
+        with metrics.item(video_path):
+            if args.contact_sheet:
+                create_contact_sheet(video_path, args.num_frames, args.output_dir, args.mode, args.analysis_fps,
+                                     args.columns, args.thumb_width, args.format, args.snap_keyframes)
+            else:
+                extract_frames(video_path, args.num_frames, args.output_dir, args.mode, args.analysis_fps,
+                               args.snap_keyframes)
+
+    if args.workers == 1:
+        for video_path in video_files:
+            process_video(video_path)
+    else:
+        # Cada tarefa passa a maior parte do tempo esperando o ffmpeg, então threads bastam
+        with ThreadPoolExecutor(max_workers=args.workers) as executor:
+            list(executor.map(process_video, video_files))
+    metrics.report("Extração de frames")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,276 @@
+
+"""
+Executor compartilhado dos comandos ffmpeg/ffprobe das ferramentas de vídeo.
+
+Todos os processos são iniciados por um único event loop asyncio, que roda em uma
+thread própria. Com isso:
+  - o número de processos rodando ao mesmo tempo é limitado pela variável de ambiente
+    UTILITARIOS_MAX_JOBS (padrão: número de CPUs). Uma execução com o seu próprio
+    limite (--workers) passa 'limit' (um número ou um JobLimit compartilhado entre as
+    chamadas) e os seus jobs usam esse limite no lugar do global, sem afetar os das
+    outras ferramentas que rodam no mesmo processo (como no watch_folder);
+  - cada job pode ter um timeout, e um job cancelado (ou Ctrl+C) encerra o processo
+    do ffmpeg em vez de deixá-lo órfão;
+  - o log de cada job (stderr) fica em um buffer circular com as últimas linhas, que
+    só é mostrado quando pedido ou em caso de erro;
+  - o tempo de cada job entra nas métricas (instrumentation): 'spawn' para iniciar o
+    processo e 'probe'/'encode' para a execução do ffprobe/ffmpeg.
+
+As funções síncronas (run_command, run_ffmpeg_command e run_many) podem ser chamadas
+de qualquer thread; run_async pode ser usada por quem já estiver em código asyncio.
+"""
+
+import asyncio
+import codecs
+import os
+import re
+import subprocess
+import sys
+import threading
+import time
+from collections import deque
+
+from instrumentation import metrics
+
+MAX_JOBS_ENV_VAR = 'UTILITARIOS_MAX_JOBS'
+
+# Linhas de log guardadas por job e quantas delas são mostradas em caso de erro
+LOG_LINES = 200
+ERROR_TAIL_LINES = 20
+
+# Tempo (s) que um processo tem para encerrar após ser cancelado, antes de ser morto
+TERMINATE_GRACE = 5.0
+
+_LINE_BREAK = re.compile(r'[\r\n]')
+
+class JobResult:
+    """Resultado de um comando: código de saída, stdout (se capturado) e as últimas linhas do log."""
+
+    def __init__(self, command, returncode, stdout, log, elapsed, spawn_elapsed=0.0):
+        self.command = command
+        self.returncode = returncode
+        self.stdout = stdout
+        self.log = log
+        self.elapsed = elapsed
+        self.spawn_elapsed = spawn_elapsed
+
+    @property
+    def log_text(self):
+        return '\n'.join(self.log)
+
+_loop = None
+_loop_lock = threading.Lock()
+_semaphore = None
+_max_concurrency = int(os.environ.get(MAX_JOBS_ENV_VAR) or 0) or os.cpu_count() or 1
+
+def _get_loop():
+    """Event loop compartilhado, iniciado em uma thread daemon no primeiro uso."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='ffmpeg-runner', daemon=True).start()
+    return _loop
+
+class JobLimit:
+    """Limite de processos simultâneos de uma execução, usado no lugar do limite global."""
+
+    def __init__(self, jobs):
+        self.jobs = max(1, int(jobs))
+        self._semaphore = None
+
+    def semaphore(self):
+        # Criado no event loop compartilhado, onde todos os jobs rodam
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.jobs)
+        return self._semaphore
+
+def _as_limit(limit):
+    return JobLimit(limit) if isinstance(limit, int) else limit
+
+def _get_semaphore(limit):
+    """Semáforo de 'limit' (número ou JobLimit), ou o global se limit for None."""
+    global _semaphore
+    if limit is not None:
+        return _as_limit(limit).semaphore()
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(_max_concurrency)
+    return _semaphore
+
+async def _read_log(stream, log, echo):
+    """Lê o stderr do processo para o buffer circular, repassando-o ao terminal se echo=True."""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    pending = ''
+    while True:
+        chunk = await stream.read(4096)
+        text = decoder.decode(chunk, final=not chunk)
+        if echo and text:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+        pending += text
+        # O ffmpeg atualiza a linha de progresso com '\r'; cada atualização vira uma linha
+        *lines, pending = _LINE_BREAK.split(pending)
+        log.extend(line for line in lines if line.strip())
+        if not chunk:
+            break
+    if pending.strip():
+        log.append(pending)
+
+async def _read_lines(stream, callback):
+    async for line in stream:
+        callback(line.decode('utf-8', errors='replace'))
+
+async def _feed(stream, data):
+    try:
+        stream.write(data)
+        await stream.drain()
+        stream.close()
+    except (BrokenPipeError, ConnectionResetError):
+        # O processo terminou sem ler tudo; o código de saída dirá se foi um erro
+        pass
+
+async def _terminate(process):
+    if process.returncode is not None:
+        return
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), TERMINATE_GRACE)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+async def run_async(command, capture_output=False, input=None, timeout=None, echo=False,
+                    on_stdout_line=None, log_lines=LOG_LINES, limit=None):
+    """
+    Executa um comando respeitando o limite de processos simultâneos e retorna um JobResult.
+    - capture_output: guarda o stdout (bytes) em JobResult.stdout;
+    - input: bytes enviados ao stdin do processo;
+    - timeout: segundos até o processo ser encerrado (lança subprocess.TimeoutExpired);
+    - echo: repassa o stderr ao terminal enquanto o comando roda;
+    - on_stdout_line: função chamada com cada linha do stdout, à medida que é gerada;
+    - limit: JobLimit da execução, no lugar do limite global.
+    """
+    log = deque(maxlen=log_lines)
+
+    async with _get_semaphore(limit):
+        start = time.monotonic()
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            stdin=subprocess.PIPE if input is not None else subprocess.DEVNULL,
+            stdout=subprocess.PIPE if capture_output or on_stdout_line else subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+        spawn_elapsed = time.monotonic() - start
+        readers = [_read_log(process.stderr, log, echo)]
+        if capture_output:
+            readers.append(process.stdout.read())
+        elif on_stdout_line:
+            readers.append(_read_lines(process.stdout, on_stdout_line))
+        if input is not None:
+            readers.append(_feed(process.stdin, input))
+        try:
+            results = await asyncio.wait_for(asyncio.gather(*readers, process.wait()), timeout)
+        except asyncio.TimeoutError:
+            await _terminate(process)
+            raise subprocess.TimeoutExpired(command, timeout, stderr='\n'.join(log))
+        except BaseException:
+            # Cancelamento (ou erro na leitura): não deixa o processo rodando sozinho
+            await asyncio.shield(_terminate(process))
+            raise
+
+    stdout = results[1] if capture_output else None
+    return JobResult(command, process.returncode, stdout, list(log), time.monotonic() - start, spawn_elapsed)
+
+def _submit(coroutine):
+    """Roda a corrotina no event loop compartilhado e espera o resultado."""
+    finished = threading.Event()
+
+    async def guarded():
+        try:
+            return await coroutine
+        finally:
+            finished.set()
+
+    future = asyncio.run_coroutine_threadsafe(guarded(), _get_loop())
+    try:
+        return future.result()
+    except KeyboardInterrupt:
+        # Espera o processo ser encerrado antes de devolver o controle
+        future.cancel()
+        finished.wait(TERMINATE_GRACE + 1)
+        raise
+
+def _record(result, item):
+    """Soma os tempos de um job às métricas, atribuindo-os ao item de quem pediu o comando."""
+    if not isinstance(result, JobResult):
+        return
+    phase = 'probe' if os.path.basename(result.command[0]).startswith('ffprobe') else 'encode'
+    metrics.add_time('spawn', result.spawn_elapsed, item)
+    metrics.add_time(phase, result.elapsed - result.spawn_elapsed, item)
+
+def _check(result):
+    if result.returncode != 0:
+        raise subprocess.CalledProcessError(result.returncode, result.command,
+                                            output=result.stdout, stderr=result.log_text)
+
+def run_command(command, capture_output=False, text=False, input=None, timeout=None, check=True,
+                echo=False, on_stdout_line=None, limit=None):
+    """
+    Versão síncrona de run_async, no estilo do subprocess.run: com check=True lança
+    subprocess.CalledProcessError (com as últimas linhas do log em 'stderr') se o
+    comando falhar; com text=True o stdout capturado é devolvido como str.
+    """
+    item = metrics.current_item()
+    result = _submit(run_async(command, capture_output, input, timeout, echo, on_stdout_line, limit=limit))
+    _record(result, item)
+    if text and result.stdout is not None:
+        result.stdout = result.stdout.decode('utf-8', errors='replace')
+    if check:
+        _check(result)
+    return result
+
+def run_many(commands, timeout=None, check=False, capture_output=False, limit=None):
+    """
+    Executa vários comandos de uma vez (respeitando o limite de processos simultâneos,
+    ou 'limit' se informado). Retorna, na mesma ordem, um JobResult ou a exceção de cada
+    comando; com check=True, comandos que falharam aparecem como subprocess.CalledProcessError.
+    """
+    limit = _as_limit(limit)
+
+    async def run_all():
+        jobs = (run_async(command, capture_output=capture_output, timeout=timeout, limit=limit)
+                for command in commands)
+        return await asyncio.gather(*jobs, return_exceptions=True)
+
+    item = metrics.current_item()
+    results = _submit(run_all())
+    for result in results:
+        _record(result, item)
+    if check:
+        for i, result in enumerate(results):
+            if isinstance(result, JobResult) and result.returncode != 0:
+                try:
+                    _check(result)
+                except subprocess.CalledProcessError as e:
+                    results[i] = e
+    return results
+
+def run_ffmpeg_command(command, description, quiet=False, timeout=None, limit=None):
+    """
+    Executa um comando ffmpeg e imprime o status.
+    Com quiet=True a saída do ffmpeg só é mostrada em caso de erro, para que
+    execuções em paralelo não se misturem no terminal.
+    """
+    print(f"--- {description} ---")
+    if not quiet:
+        print(f"Executando comando: {' '.join(command)}")
+    result = run_command(command, check=False, echo=not quiet, timeout=timeout, limit=limit)
+    if result.returncode != 0:
+        if quiet:
+            print('\n'.join(result.log[-ERROR_TAIL_LINES:]))
+        print(f"ERRO ao executar o comando: {' '.join(command)}")
+        _check(result)
+    print(f"Sucesso: {description} concluído.")
+    if not quiet:
+        print("-" * (len(description) + 6) + "\n")
+    return result
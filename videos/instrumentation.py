@@ -0,0 +1,263 @@
+
+"""
+Instrumentação compartilhada pelas ferramentas: tempos por fase, contadores, tempos
+por arquivo e captura opcional de perfil (cProfile/tracemalloc).
+
+As fases são medidas sempre (o custo é de uma leitura de relógio), mas só aparecem
+quando pedido na linha de comando:
+  --metrics            imprime uma tabela com o tempo de cada fase ao final;
+  --metrics-json FILE  grava uma linha JSON por arquivo processado e um resumo;
+  --profile MODE       'cpu' (cProfile), 'memory' (tracemalloc) ou 'all'.
+
+Uso típico:
+    with metrics.item(path):
+        with metrics.phase('metadata'):
+            ...
+    metrics.report('Renomeação')
+
+As fases podem rodar em várias threads ao mesmo tempo; nesse caso o tempo somado de
+uma fase pode passar do tempo total da execução.
+"""
+
+import atexit
+import cProfile
+import gc
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+PROFILE_TOP_ENTRIES = 25
+
+class Metrics:
+    """Acumula tempos por fase, contadores e registros por item de uma execução."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.show_table = False
+        self._json_file = None
+        self._profiler = None
+        self._profile_output = None
+        self._trace_memory = False
+        self._memory_peak = 0
+        self.reset()
+
+    @property
+    def enabled(self):
+        return self.show_table or self._json_file is not None
+
+    def reset(self):
+        """Zera os tempos e contadores (o perfil, se ativo, continua)."""
+        with self._lock:
+            self._start = time.perf_counter()
+            self._phases = {}
+            self._counters = {}
+            self._items = 0
+
+    def add_time(self, name, seconds, item=None):
+        """Soma 'seconds' à fase 'name' e, se houver, ao item em andamento."""
+        with self._lock:
+            entry = self._phases.setdefault(name, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+        item = item if item is not None else self.current_item()
+        if item is not None:
+            item['phases'][name] = item['phases'].get(name, 0.0) + seconds
+
+    @contextmanager
+    def phase(self, name):
+        """Mede o bloco como uma chamada da fase 'name'."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def timed_iter(self, iterable, name):
+        """Percorre 'iterable' medindo o tempo gasto em cada next() como a fase 'name'."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                self.add_time(name, time.perf_counter() - start)
+                return
+            self.add_time(name, time.perf_counter() - start)
+            yield value
+
+    def count(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def current_item(self):
+        """Item em andamento nesta thread (o dicionário criado por item()), ou None."""
+        return getattr(self._local, 'item', None)
+
+    @contextmanager
+    def item(self, name):
+        """
+        Mede o processamento de um arquivo. As fases medidas dentro do bloco (na mesma
+        thread) são atribuídas a ele; campos extras podem ser adicionados ao dicionário
+        retornado e vão para a linha JSON.
+        """
+        record = {'name': name, 'phases': {}}
+        previous = self.current_item()
+        self._local.item = record
+        start = time.perf_counter()
+        try:
+            yield record
+        except BaseException:
+            record.setdefault('status', 'error')
+            raise
+        finally:
+            self._local.item = previous
+            record['seconds'] = time.perf_counter() - start
+            with self._lock:
+                self._items += 1
+            self._write_json('item', record)
+
+    def _write_json(self, record_type, data):
+        if self._json_file is None:
+            return
+        line = {'type': record_type, 'tool': os.path.basename(sys.argv[0]), 'time': time.time()}
+        line.update(_rounded(data))
+        with self._lock:
+            self._json_file.write(json.dumps(line, ensure_ascii=False) + '\n')
+            self._json_file.flush()
+
+    def summary(self):
+        """Dicionário com o tempo total, os itens, as fases e os contadores desde o último reset."""
+        with self._lock:
+            summary = {
+                'elapsed': time.perf_counter() - self._start,
+                'items': self._items,
+                'phases': {name: {'calls': calls, 'seconds': seconds}
+                           for name, (calls, seconds) in self._phases.items()},
+                'counters': dict(self._counters),
+            }
+        if tracemalloc.is_tracing():
+            summary['memory_peak'] = tracemalloc.get_traced_memory()[1]
+        return summary
+
+    def report(self, title):
+        """
+        Emite o resumo (tabela e/ou linha JSON) do que foi medido desde o último
+        reset e zera os acumuladores, para que o próximo bloco seja medido à parte.
+        """
+        if not self.enabled:
+            return
+        summary = self.summary()
+        summary['title'] = title
+        self._write_json('summary', summary)
+        if self.show_table:
+            print_summary_table(summary)
+        self.reset()
+        if tracemalloc.is_tracing():
+            # O pico passa a ser medido por etapa; o maior de todos é guardado para o final
+            self._memory_peak = max(self._memory_peak, summary['memory_peak'])
+            tracemalloc.reset_peak()
+
+    def start_profile(self, mode, output=None):
+        """Ativa a captura de perfil ('cpu', 'memory' ou 'all') até o fim do processo."""
+        if mode in ('memory', 'all'):
+            tracemalloc.start()
+            self._trace_memory = True
+        if mode in ('cpu', 'all'):
+            self._profiler = cProfile.Profile()
+            self._profile_output = output
+            self._profiler.enable()
+        atexit.register(self.finish_profile)
+
+    def finish_profile(self):
+        """Interrompe a captura de perfil e mostra os resultados em stderr."""
+        if self._trace_memory:
+            # Antes do relatório de CPU, para não contar as alocações do próprio pstats; o
+            # gc.collect() libera os ciclos pendentes, que o snapshot mostraria como vivos
+            gc.collect()
+            snapshot = tracemalloc.take_snapshot().filter_traces([
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, '<frozen importlib._bootstrap*>'),
+            ])
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, self._memory_peak)
+            tracemalloc.stop()
+            self._trace_memory = False
+            print("\n--- Perfil de memória (tracemalloc) ---", file=sys.stderr)
+            print(f"Em uso: {current / 1024 / 1024:.1f} MB | Pico: {peak / 1024 / 1024:.1f} MB", file=sys.stderr)
+            print("Maiores alocações ainda vivas ao final:", file=sys.stderr)
+            for stat in snapshot.statistics('lineno')[:PROFILE_TOP_ENTRIES // 2]:
+                print(f"  {stat}", file=sys.stderr)
+        if self._profiler is not None:
+            self._profiler.disable()
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profiler, stream=stream)
+            stats.sort_stats('cumulative').print_stats(PROFILE_TOP_ENTRIES)
+            print("\n--- Perfil de CPU (thread principal, por tempo acumulado) ---", file=sys.stderr)
+            print(stream.getvalue(), file=sys.stderr)
+            if self._profile_output:
+                stats.dump_stats(self._profile_output)
+                print(f"Perfil completo salvo em '{self._profile_output}'.", file=sys.stderr)
+            self._profiler = None
+
+    def configure(self, show_table=False, json_path=None, profile=None, profile_output=None):
+        self.show_table = show_table
+        if json_path:
+            self._json_file = open(json_path, 'a', encoding='utf-8')
+            atexit.register(self._json_file.close)
+        if profile:
+            self.start_profile(profile, profile_output)
+        self.reset()
+
+def _rounded(data):
+    """Cópia de 'data' com os floats arredondados em microssegundos, para o JSON ficar legível."""
+    if isinstance(data, dict):
+        return {key: _rounded(value) for key, value in data.items()}
+    if isinstance(data, float):
+        return round(data, 6)
+    return data
+
+def print_summary_table(summary):
+    elapsed = summary['elapsed']
+    items = summary['items']
+    print(f"\n--- Métricas: {summary['title']} ---")
+    line = f"Tempo total: {elapsed:.2f}s"
+    if items:
+        line += f" | {items} item(ns) ({items / elapsed:.1f}/s)" if elapsed > 0 else f" | {items} item(ns)"
+    print(line)
+    phases = sorted(summary['phases'].items(), key=lambda entry: entry[1]['seconds'], reverse=True)
+    if phases:
+        print(f"  {'Fase':<16} {'Chamadas':>9} {'Tempo (s)':>11} {'% do total':>11} {'Média (ms)':>11}")
+        for name, phase in phases:
+            share = 100 * phase['seconds'] / elapsed if elapsed > 0 else 0.0
+            average = 1000 * phase['seconds'] / phase['calls']
+            print(f"  {name:<16} {phase['calls']:>9} {phase['seconds']:>11.3f} {share:>10.1f}% {average:>11.2f}")
+    if 'memory_peak' in summary:
+        print(f"  Pico de memória (tracemalloc): {summary['memory_peak'] / 1024 / 1024:.1f} MB")
+    if summary['counters']:
+        print("  Contadores: " + ', '.join(f"{name}={value}" for name, value in sorted(summary['counters'].items())))
+
+# Instância usada por todas as ferramentas do processo
+metrics = Metrics()
+
+def add_arguments(parser):
+    """Adiciona as opções --metrics, --metrics-json, --profile e --profile-output ao parser."""
+    group = parser.add_argument_group("instrumentação")
+    group.add_argument('--metrics', action='store_true',
+                       help="Mostra ao final o tempo gasto em cada fase (leitura, análise, encode...).")
+    group.add_argument('--metrics-json', metavar='ARQUIVO',
+                       help="Acrescenta a ARQUIVO uma linha JSON por arquivo processado e um resumo por etapa.")
+    group.add_argument('--profile', choices=['cpu', 'memory', 'all'],
+                       help="Captura um perfil da execução: cpu (cProfile), memory (tracemalloc) ou all.")
+    group.add_argument('--profile-output', metavar='ARQUIVO',
+                       help="Salva o perfil de CPU completo (formato pstats) em ARQUIVO.")
+
+def configure(args):
+    """Ativa a instrumentação conforme as opções adicionadas por add_arguments."""
+    metrics.configure(args.metrics, args.metrics_json, args.profile, args.profile_output)
@@ -0,0 +1,265 @@
+
+"""
+Journal de checkpoints para execuções longas em lote.
+
+Cada job (um arquivo de saída) é registrado em um arquivo JSON lines com os
+parâmetros, a assinatura da entrada, o status ('running', 'done' ou 'failed') e o
+checksum da saída. A saída é gravada com um nome temporário ('video.partial.mp4') e
+só é renomeada para o nome final quando o ffmpeg termina com sucesso, então um
+arquivo com o nome final nunca está pela metade.
+
+Ao rodar de novo o mesmo lote, os jobs concluídos (mesmos parâmetros, mesma entrada
+e saída intacta) são pulados sem perguntas, e só os jobs interrompidos, com erro ou
+com parâmetros diferentes são refeitos.
+
+O journal de cada ferramenta fica no cache (UTILITARIOS_CACHE/journal/<ferramenta>.jsonl),
+a menos que outro arquivo seja indicado com --journal.
+
+Uma saída que já existe sem registro no journal (gerada antes do journal existir, ou
+cortada por uma interrupção de uma versão antiga) é refeita. Com --adopt-existing ela é
+mantida e registrada como concluída, desde que o ffprobe consiga ler a duração dela e
+essa duração bata com a da entrada (multiplicada pelo 'speed' do job, quando houver).
+
+Os jobs também consultam o cache de resultados (result_cache): se a mesma operação já
+foi feita sobre uma cópia do mesmo vídeo, a saída é reaproveitada sem encodar.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import result_cache
+from encode_settings import probe_duration
+from media_cache import file_fingerprint, file_signature, get_cache_dir
+from result_cache import ResultCache
+
+# O arquivo é reescrito só com o último registro de cada job quando tiver mais
+# linhas obsoletas do que isto
+COMPACT_MIN_STALE_LINES = 1000
+
+# Diferença máxima entre a duração de uma saída adotada e a esperada (segundos e fração)
+ADOPT_DURATION_TOLERANCE = 1.0
+ADOPT_DURATION_RATIO = 0.02
+
+def get_partial_path(output_path):
+    """Nome temporário da saída, mantendo a extensão para o ffmpeg escolher o formato."""
+    base, ext = os.path.splitext(output_path)
+    return f"{base}.partial{ext}"
+
+class Job:
+    """Um job em andamento: a saída final, o arquivo temporário e o registro no journal."""
+
+    def __init__(self, key, input_path, output_path, params, cache_key=None):
+        self.key = key
+        self.cache_key = cache_key
+        self.input_path = input_path
+        self.output_path = output_path
+        self.partial_path = get_partial_path(output_path)
+        self.params = params
+        # Dados da execução registrados no journal ao concluir (ex: o preset escolhido)
+        self.meta = {}
+        self.start = time.time()
+
+class JobJournal:
+    """Registro persistente dos jobs de uma ferramenta (seguro para uso em várias threads)."""
+
+    def __init__(self, tool, path=None, overwrite=False, cache=None, adopt_existing=False):
+        self.tool = tool
+        self.path = path or os.path.join(get_cache_dir('journal'), f'{tool}.jsonl')
+        self.overwrite = overwrite
+        self.adopt_existing = adopt_existing
+        self.cache = cache or ResultCache(0)
+        self.counts = {'done': 0, 'skipped': 0, 'cached': 0, 'failed': 0}
+        self._lock = threading.Lock()
+        self._entries = self._load()
+
+    def _load(self):
+        entries = {}
+        lines = 0
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        entry = json.loads(line)
+                        entries[entry['key']] = entry
+                    except (json.JSONDecodeError, KeyError, TypeError):
+                        # Última linha cortada por uma interrupção durante a gravação
+                        continue
+        except FileNotFoundError:
+            return entries
+        if lines - len(entries) > COMPACT_MIN_STALE_LINES:
+            self._compact(entries)
+        return entries
+
+    def _compact(self, entries):
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            for entry in entries.values():
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        os.replace(temp_path, self.path)
+
+    def _write(self, entry):
+        with self._lock:
+            self._entries[entry['key']] = entry
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _is_done(self, entry, input_path, output_path, params):
+        """Confere se o registro corresponde a um job concluído cuja saída continua intacta."""
+        if entry is None or entry.get('status') != 'done':
+            return False
+        if entry.get('params') != params or entry.get('input_signature') != file_signature(input_path):
+            return False
+        if not os.path.exists(output_path):
+            return False
+        if file_fingerprint(output_path) != entry.get('checksum'):
+            print(f"AVISO: '{output_path}' foi alterado depois de gerado e será refeito.")
+            return False
+        return True
+
+    def _can_adopt(self, input_path, output_path, params):
+        """
+        Confere se uma saída sem registro no journal está completa: a duração lida pelo
+        ffprobe deve bater com a da entrada (vezes o 'speed' do job, quando houver).
+        """
+        output_duration = probe_duration(output_path)
+        input_duration = probe_duration(input_path)
+        if not output_duration or not input_duration:
+            return False
+        expected = input_duration * float(params.get('speed') or 1)
+        tolerance = max(ADOPT_DURATION_TOLERANCE, expected * ADOPT_DURATION_RATIO)
+        return abs(output_duration - expected) <= tolerance
+
+    def start(self, input_path, output_path, params):
+        """
+        Inicia um job. Retorna None se ele já foi concluído ou se o resultado veio do
+        cache de resultados (e deve ser pulado), ou um Job cuja saída deve ser gravada
+        em job.partial_path.
+        """
+        output_path = os.path.abspath(output_path)
+        params = json.loads(json.dumps(params))
+        key = output_path
+        entry = self._entries.get(key)
+
+        if not self.overwrite:
+            if entry is None and os.path.exists(output_path):
+                # Sem registro não dá para saber se a saída terminou: por padrão é refeita
+                if not self.adopt_existing:
+                    print(f"Saída já existe sem registro no journal e será refeita: {output_path}. "
+                          f"Use --adopt-existing para mantê-la.")
+                elif not self._can_adopt(input_path, output_path, params):
+                    print(f"AVISO: '{output_path}' existe sem registro no journal, mas parece "
+                          f"incompleto (duração diferente da esperada) e será refeito.")
+                else:
+                    print(f"Saída já existe (sem registro no journal), verificada e mantida: {output_path}")
+                    self._write({'key': key, 'tool': self.tool, 'input': os.path.abspath(input_path),
+                                 'output': output_path, 'params': params,
+                                 'input_signature': file_signature(input_path), 'status': 'done',
+                                 'checksum': file_fingerprint(output_path), 'adopted': True,
+                                 'finished': time.time()})
+                    self.counts['skipped'] += 1
+                    return None
+            if self._is_done(entry, input_path, output_path, params):
+                print(f"Já concluído, pulando: {output_path}")
+                self.counts['skipped'] += 1
+                return None
+
+        cache_key = None
+        if self.cache.enabled:
+            cache_key = self.cache.make_key(self.tool, input_path, params, os.path.splitext(output_path)[1])
+        job = Job(key, input_path, output_path, params, cache_key)
+        if os.path.exists(job.partial_path):
+            # Restos de uma execução interrompida
+            os.remove(job.partial_path)
+
+        if not self.overwrite:
+            if cache_key is not None and self.cache.fetch(cache_key, job.partial_path):
+                os.replace(job.partial_path, output_path)
+                print(f"Resultado reaproveitado do cache: {output_path}")
+                self._write({'key': key, 'tool': self.tool, 'input': os.path.abspath(input_path),
+                             'output': output_path, 'params': params,
+                             'input_signature': file_signature(input_path), 'status': 'done',
+                             'checksum': file_fingerprint(output_path), 'cached': True,
+                             'finished': time.time()})
+                self.counts['cached'] += 1
+                return None
+            if entry is not None and entry.get('status') == 'running':
+                print(f"Retomando job interrompido: {output_path}")
+
+        self._write({'key': key, 'tool': self.tool, 'input': os.path.abspath(input_path),
+                     'output': output_path, 'params': params,
+                     'input_signature': file_signature(input_path), 'status': 'running',
+                     'started': job.start})
+        return job
+
+    def finish(self, job):
+        """Move a saída temporária para o nome final e registra o job como concluído."""
+        if not os.path.exists(job.partial_path) or os.path.getsize(job.partial_path) == 0:
+            self.fail(job, "A saída não foi gerada.")
+            raise RuntimeError(f"A saída '{job.partial_path}' não foi gerada.")
+        checksum = file_fingerprint(job.partial_path)
+        if job.cache_key is not None:
+            self.cache.store(job.cache_key, job.partial_path, self.tool)
+        os.replace(job.partial_path, job.output_path)
+        entry = {'key': job.key, 'tool': self.tool, 'input': os.path.abspath(job.input_path),
+                 'output': job.output_path, 'params': job.params,
+                 'input_signature': file_signature(job.input_path), 'status': 'done',
+                 'checksum': checksum, 'started': job.start, 'finished': time.time()}
+        if job.meta:
+            entry['meta'] = job.meta
+        self._write(entry)
+        self.counts['done'] += 1
+
+    def fail(self, job, error):
+        """Descarta a saída temporária e registra o erro; o job será refeito na próxima execução."""
+        if os.path.exists(job.partial_path):
+            os.remove(job.partial_path)
+        self._write({'key': job.key, 'tool': self.tool, 'input': os.path.abspath(job.input_path),
+                     'output': job.output_path, 'params': job.params, 'status': 'failed',
+                     'error': str(error)[-500:], 'started': job.start, 'finished': time.time()})
+        self.counts['failed'] += 1
+
+    @contextmanager
+    def job(self, input_path, output_path, params):
+        """
+        Envolve um job com start/finish/fail. O bloco recebe None quando o job deve ser
+        pulado; caso contrário deve gravar a saída em job.partial_path.
+        """
+        job = self.start(input_path, output_path, params)
+        try:
+            yield job
+        except BaseException as e:
+            # Também cobre o Ctrl+C: o job fica como 'failed' e a saída parcial é removida
+            if job is not None:
+                self.fail(job, e.__class__.__name__ if isinstance(e, KeyboardInterrupt) else e)
+            raise
+        if job is not None:
+            self.finish(job)
+
+    def print_summary(self):
+        print(f"Journal: {self.counts['done']} concluído(s), {self.counts['skipped']} pulado(s), "
+              f"{self.counts['cached']} do cache, {self.counts['failed']} com erro ({self.path}).")
+
+def add_arguments(parser):
+    """
+    Adiciona as opções --overwrite, --adopt-existing e --journal (e as do cache de
+    resultados) ao parser.
+    """
+    parser.add_argument('--overwrite', action='store_true',
+                        help='Refaz todos os vídeos, mesmo os já concluídos em execuções anteriores.')
+    parser.add_argument('--adopt-existing', action='store_true',
+                        help='Mantém as saídas que já existem sem registro no journal, se a duração '
+                             'delas bater com a da entrada (sem esta opção elas são refeitas).')
+    parser.add_argument('--journal', metavar='ARQUIVO',
+                        help='Arquivo do journal de checkpoints. Padrão: no cache, um por ferramenta.')
+    result_cache.add_arguments(parser)
+
+def open_journal(tool, args):
+    """Abre o journal da ferramenta conforme as opções adicionadas por add_arguments."""
+    return JobJournal(tool, args.journal, args.overwrite, result_cache.open_cache(args),
+                      args.adopt_existing)
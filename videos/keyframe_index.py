@@ -0,0 +1,170 @@
+
+"""
+Índice persistente de keyframes para busca rápida e cortes previsíveis.
+
+Os tempos dos keyframes do primeiro stream de vídeo são extraídos uma única vez com
+ffprobe (sem decodificar) e guardados em um arquivo binário compacto no cache,
+indexado pelo caminho, tamanho e data do vídeo.
+
+Os tempos são relativos ao início do arquivo (format=start_time), a mesma referência
+usada pelo '-ss' do ffmpeg: em arquivos .MTS/.TS, que costumam começar em ~1,4s, e
+em MP4s com edit list, o primeiro keyframe fica em 0 e não no pts bruto.
+
+Também pode ser usado diretamente para inspecionar os keyframes de um arquivo:
+    python keyframe_index.py video.mp4
+"""
+
+import argparse
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+
+from ffmpeg_runner import run_command
+from media_cache import file_signature, get_cache_dir
+
+INDEX_MAGIC = b'KFI2'
+INDEX_HEADER = struct.Struct('<4sId')
+
+class KeyframeIndex:
+    """
+    Tempos (segundos, relativos ao início do arquivo) dos keyframes, em ordem crescente.
+    'start_time' é o início do arquivo em pts bruto, caso seja preciso voltar a ele.
+    """
+
+    def __init__(self, times, start_time=0.0):
+        self.times = times
+        self.start_time = start_time
+
+    def __len__(self):
+        return len(self.times)
+
+    def keyframe_at_or_before(self, timestamp):
+        """Tempo do último keyframe em ou antes de timestamp (o primeiro, se não houver)."""
+        i = bisect_right(self.times, timestamp + 1e-6)
+        return self.times[max(i - 1, 0)]
+
+    def keyframe_at_or_after(self, timestamp):
+        """Tempo do primeiro keyframe em ou depois de timestamp (None, se não houver)."""
+        i = bisect_left(self.times, timestamp - 1e-6)
+        return self.times[i] if i < len(self.times) else None
+
+    def nearest_keyframe(self, timestamp):
+        """Tempo do keyframe mais próximo de timestamp."""
+        before = self.keyframe_at_or_before(timestamp)
+        after = self.keyframe_at_or_after(timestamp)
+        if after is None or abs(timestamp - before) <= abs(after - timestamp):
+            return before
+        return after
+
+    def save(self, index_path):
+        """Grava o índice no formato binário: cabeçalho (com o start_time) + tempos (float64)."""
+        times = array('d', self.times)
+        if sys.byteorder == 'big':
+            times.byteswap()
+        temp_path = index_path + '.tmp'
+        with open(temp_path, 'wb') as f:
+            f.write(INDEX_HEADER.pack(INDEX_MAGIC, len(times), self.start_time))
+            times.tofile(f)
+        os.replace(temp_path, index_path)
+
+    @classmethod
+    def load(cls, index_path):
+        """Lê um índice gravado por save(). Retorna None se o arquivo for inválido."""
+        try:
+            with open(index_path, 'rb') as f:
+                magic, count, start_time = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+                if magic != INDEX_MAGIC:
+                    # Inclui os índices do formato anterior, com os tempos em pts bruto
+                    return None
+                times = array('d')
+                times.fromfile(f, count)
+        except (OSError, EOFError, struct.error):
+            return None
+        if sys.byteorder == 'big':
+            times.byteswap()
+        return cls(times, start_time)
+
+def probe_keyframes(video_path):
+    """
+    Lista os pacotes do primeiro stream de vídeo com ffprobe (sem decodificar)
+    e retorna um KeyframeIndex com os keyframes encontrados, ou None em caso de erro.
+    """
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,dts_time,flags:format=start_time',
+        '-of', 'csv',
+        video_path
+    ]
+    keyframes = []
+    start_times = []
+
+    def parse_line(line):
+        fields = line.strip().split(',')
+        if fields[0] == 'format' and len(fields) >= 2:
+            try:
+                start_times.append(float(fields[1]))
+            except ValueError:
+                pass
+            return
+        if fields[0] != 'packet' or len(fields) < 4 or not fields[3].startswith('K'):
+            return
+        pts_time, dts_time = fields[1], fields[2]
+        try:
+            keyframes.append(float(pts_time if pts_time != 'N/A' else dts_time))
+        except ValueError:
+            return
+
+    try:
+        # As linhas são processadas à medida que o ffprobe as gera, sem guardar a saída inteira
+        result = run_command(command, check=False, on_stdout_line=parse_line)
+    except FileNotFoundError:
+        print("Erro: 'ffprobe' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
+        return None
+
+    if result.returncode != 0 or not keyframes:
+        print(f"Não foi possível indexar os keyframes de '{video_path}'.", file=sys.stderr)
+        return None
+
+    start_time = start_times[0] if start_times else 0.0
+    # O '-ss' do ffmpeg é relativo ao start_time do arquivo
+    return KeyframeIndex(array('d', sorted(max(t - start_time, 0.0) for t in keyframes)), start_time)
+
+def load_keyframe_index(video_path, rebuild=False):
+    """
+    Retorna o KeyframeIndex do vídeo, lendo do cache quando possível e
+    indexando (e salvando no cache) apenas na primeira vez.
+    """
+    index_path = os.path.join(get_cache_dir('keyframes'), file_signature(video_path) + '.kfi')
+    if not rebuild and os.path.exists(index_path):
+        index = KeyframeIndex.load(index_path)
+        if index is not None:
+            return index
+
+    index = probe_keyframes(video_path)
+    if index is not None:
+        try:
+            index.save(index_path)
+        except OSError as e:
+            print(f"Aviso: Não foi possível salvar o índice de keyframes: {e}", file=sys.stderr)
+    return index
+
+def main():
+    parser = argparse.ArgumentParser(description="Indexa e lista os keyframes de um vídeo.")
+    parser.add_argument('video', help='Caminho para o arquivo de vídeo.')
+    parser.add_argument('--rebuild', action='store_true', help='Ignora o índice em cache e indexa novamente.')
+    args = parser.parse_args()
+
+    index = load_keyframe_index(args.video, args.rebuild)
+    if index is None:
+        sys.exit(1)
+
+    print(f"{len(index)} keyframes em '{args.video}' (início do arquivo em {index.start_time:.3f}s):")
+    for timestamp in index.times:
+        print(f"  {timestamp:10.3f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+
+"""
+Funções compartilhadas pelos caches em disco das ferramentas de vídeo.
+
+O diretório raiz pode ser definido pela variável de ambiente UTILITARIOS_CACHE.
+Padrão: ~/.cache/utilitarios
+"""
+
+import hashlib
+import os
+
+CACHE_ENV_VAR = 'UTILITARIOS_CACHE'
+
+# Amostragem usada por file_fingerprint: blocos de 1 MiB distribuídos pelo arquivo
+FINGERPRINT_BLOCK_SIZE = 1 << 20
+FINGERPRINT_BLOCKS = 8
+
+def get_cache_dir(name):
+    """Retorna o caminho do subdiretório de cache 'name', criando-o se necessário."""
+    root = os.environ.get(CACHE_ENV_VAR) or os.path.join(os.path.expanduser('~'), '.cache', 'utilitarios')
+    path = os.path.join(root, name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def file_signature(file_path):
+    """
+    Gera uma chave estável para um arquivo a partir do caminho absoluto, do tamanho
+    e da data de modificação. Se o arquivo mudar, a chave muda junto.
+    """
+    stat = os.stat(file_path)
+    key = f"{os.path.abspath(file_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def file_fingerprint(file_path):
+    """
+    Gera um hash rápido do conteúdo de um arquivo: o tamanho mais alguns blocos
+    amostrados ao longo dele. Cópias do mesmo arquivo têm o mesmo fingerprint,
+    independente do nome ou da pasta.
+    """
+    size = os.path.getsize(file_path)
+    digest = hashlib.sha1(str(size).encode('utf-8'))
+    with open(file_path, 'rb') as f:
+        if size <= FINGERPRINT_BLOCK_SIZE * FINGERPRINT_BLOCKS:
+            digest.update(f.read())
+        else:
+            for i in range(FINGERPRINT_BLOCKS):
+                f.seek((size - FINGERPRINT_BLOCK_SIZE) * i // (FINGERPRINT_BLOCKS - 1))
+                digest.update(f.read(FINGERPRINT_BLOCK_SIZE))
+    return digest.hexdigest()
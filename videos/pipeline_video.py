@@ -0,0 +1,180 @@
+
+"""
+Aplica redução de ruído, estabilização, upscale e mudança de velocidade em uma única
+passada: os filtros das ferramentas individuais (denoise_video, stabilize_video,
+upscale_video e adjust_speed_fps) são combinados em um só filtergraph, com uma única
+decodificação e um único encode. Apenas a análise da estabilização roda à parte.
+
+Os vídeos já processados com os mesmos parâmetros são pulados pelo journal de
+checkpoints (job_journal); use --overwrite para refazê-los.
+"""
+
+import argparse
+import os
+
+import encode_settings
+import instrumentation
+import job_journal
+from adjust_speed_fps import build_speed_filter, get_atempo_filter
+from denoise_video import build_denoise_filter, get_video_bitrate
+from ffmpeg_runner import run_ffmpeg_command
+from instrumentation import metrics
+from stabilize_video import build_transform_filter, detect_transforms
+from upscale_video import DEFAULT_PRESET as UPSCALE_PRESET, build_scale_filter
+
+def build_pipeline_command(input_video, output_video, transforms_file=None, denoise=None, smoothing=10,
+                           resolution=None, speed=None, fps=None, audio_mode='copy', bitrate='20M', preset=None):
+    """
+    Monta o comando ffmpeg com todos os filtros pedidos, na mesma ordem em que as
+    ferramentas individuais seriam encadeadas.
+    """
+    video_filters = []
+    if denoise:
+        video_filters.append(build_denoise_filter(denoise))
+    if transforms_file:
+        video_filters.append(build_transform_filter(transforms_file, smoothing))
+    if resolution:
+        video_filters.append(build_scale_filter(resolution))
+    if speed:
+        video_filters.append(build_speed_filter(speed))
+
+    command = ['ffmpeg', '-i', input_video]
+    if video_filters:
+        command.extend(['-vf', ','.join(video_filters)])
+    if fps:
+        command.extend(['-r', str(fps)])
+
+    command.extend(['-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-b:v', bitrate])
+    if preset is None and resolution:
+        # Mesmo preset usado pelo upscale_video
+        preset = UPSCALE_PRESET
+    if preset:
+        command.extend(['-preset', preset])
+
+    if audio_mode == 'remove':
+        command.append('-an')
+    elif audio_mode == 'slow' and speed:
+        command.extend(['-af', get_atempo_filter(speed)])
+    elif speed:
+        # Copiar o áudio com a velocidade alterada dessincroniza o vídeo
+        raise ValueError("O áudio não pode ser copiado ao mudar a velocidade; use 'remove' ou 'slow'.")
+    else:
+        command.extend(['-c:a', 'copy'])
+
+    command.append(output_video)
+    return command
+
+def get_pipeline_output_path(input_video, denoise=None, stabilize=False, resolution=None, speed=None):
+    """Nome do arquivo de saída, com os mesmos sufixos que as ferramentas individuais usariam."""
+    suffix = ''
+    if denoise:
+        suffix += '_denoised'
+    if stabilize:
+        suffix += '_stabilized'
+    if resolution:
+        suffix += f'_upscaled_{resolution.replace(":", "x")}'
+    if speed:
+        suffix += f'_slow_{speed}x'
+    return os.path.splitext(input_video)[0] + (suffix or '_pipeline') + '.mp4'
+
+def pipeline_video(input_video, journal, denoise=None, stabilize=False, shakiness=5, smoothing=10, detect_scale=1.0,
+                   resolution=None, speed=None, fps=None, audio_mode=None, bitrate=None, presets=None,
+                   bitrates=None):
+    """
+    Processa um vídeo com todas as etapas pedidas em um único encode. Vídeos já
+    concluídos em uma execução anterior (segundo o journal) são pulados. 'presets' e
+    'bitrates' (encode_settings.PresetSelector e BitrateSearch) ajustam o preset e o
+    bitrate do encoder; sem eles valem os padrões.
+    """
+    output_video = get_pipeline_output_path(input_video, denoise, stabilize, resolution, speed)
+
+    if audio_mode is None:
+        # Mesmo padrão do adjust_speed_fps: ao mudar a velocidade o áudio é removido
+        audio_mode = 'remove' if speed else 'copy'
+
+    if bitrate is None:
+        # Bitrate padrão da etapa mais exigente, como nas ferramentas individuais
+        if resolution:
+            bitrate = '60M'
+        elif speed:
+            bitrate = '35M'
+        elif stabilize:
+            bitrate = '20M'
+        else:
+            bitrate = get_video_bitrate(input_video) or '20M'
+
+    params = {'denoise': denoise, 'stabilize': stabilize, 'shakiness': shakiness, 'smoothing': smoothing,
+              'detect_scale': detect_scale, 'resolution': resolution, 'speed': speed, 'fps': fps,
+              'audio': audio_mode, 'bitrate': bitrate}
+    if presets:
+        params.update(presets.job_params())
+    if bitrates:
+        params.update(bitrates.job_params())
+    with journal.job(input_video, output_video, params) as job:
+        if job is None:
+            if presets:
+                presets.skip(input_video)
+            return
+
+        transforms_file = None
+        if stabilize:
+            # A análise usa o vídeo original; a transformação entra no filtergraph único
+            transforms_file = detect_transforms(input_video, shakiness, detect_scale)
+
+        command = build_pipeline_command(input_video, job.partial_path, transforms_file, denoise, smoothing,
+                                         resolution, speed, fps, audio_mode, bitrate)
+        preset, bitrate, job.meta = encode_settings.tune(input_video, command, presets, bitrates)
+        command = build_pipeline_command(input_video, job.partial_path, transforms_file, denoise, smoothing,
+                                         resolution, speed, fps, audio_mode, bitrate, preset)
+        run_ffmpeg_command(command, f"Processando em passada única ({output_video})")
+
+def main():
+    parser = argparse.ArgumentParser(description="Aplica denoise, estabilização, upscale e mudança de velocidade em uma única passada.")
+    parser.add_argument('--input', required=True, help='Caminho para o vídeo de entrada ou para um arquivo .txt com uma lista de vídeos.')
+    parser.add_argument('--denoise', type=int, help='Força da redução de ruído (1-10). Se omitido, não aplica denoise.')
+    parser.add_argument('--stabilize', action='store_true', help='Aplica a estabilização (vidstab).')
+    parser.add_argument('--shakiness', type=int, default=5, help='Nível de agressividade da estabilização (1-10). Padrão: 5')
+    parser.add_argument('--smoothing', type=int, default=10, help='Número de frames usados para suavizar o movimento. Padrão: 10')
+    parser.add_argument('--detect-scale', type=float, default=1.0, help='Escala da passada de análise da estabilização. Padrão: 1.0')
+    parser.add_argument('--upscale', dest='resolution', help='Resolução de saída (ex: 3840:2160). Se omitido, mantém a resolução.')
+    parser.add_argument('--speed', type=float, help='Multiplicador de velocidade (ex: 2.5 para 2.5x mais lento).')
+    parser.add_argument('--fps', type=int, help='Framerate de destino do vídeo final.')
+    parser.add_argument('--audio', choices=['copy', 'remove', 'slow'], help="Modo de áudio. Padrão: 'remove' com --speed, 'copy' sem.")
+    parser.add_argument('--bitrate', help='Bitrate do vídeo de saída (ex: 50M). Padrão: o da etapa mais exigente.')
+    encode_settings.add_arguments(parser)
+    job_journal.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    if args.audio == 'copy' and args.speed:
+        parser.error("--audio copy não pode ser usado com --speed: o áudio ficaria dessincronizado. "
+                     "Use --audio remove ou --audio slow.")
+    instrumentation.configure(args)
+
+    if not (args.denoise or args.stabilize or args.resolution or args.speed or args.fps):
+        print("ERRO: Nenhuma etapa pedida. Use --denoise, --stabilize, --upscale, --speed e/ou --fps.")
+        return
+    journal = job_journal.open_journal('pipeline', args)
+
+    if args.input.endswith('.txt'):
+        with open(args.input, 'r') as f:
+            videos = [line.strip() for line in f if line.strip()]
+    else:
+        videos = [args.input]
+
+    presets = encode_settings.get_preset_selector(args)
+    presets.start_batch(videos)
+    bitrates = encode_settings.get_bitrate_search(args)
+    for video in videos:
+        with metrics.item(video) as item:
+            try:
+                pipeline_video(video, journal, args.denoise, args.stabilize, args.shakiness, args.smoothing, args.detect_scale,
+                               args.resolution, args.speed, args.fps, args.audio, args.bitrate, presets, bitrates)
+                print(f"\n--- Processo Finalizado para {video}! ---")
+            except Exception as e:
+                item['status'] = 'error'
+                print(f"\nOcorreu um erro durante o processo de {video}: {e}")
+    journal.print_summary()
+    metrics.report("Pipeline de vídeo")
+
+if __name__ == '__main__':
+    main()
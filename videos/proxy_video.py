@@ -0,0 +1,235 @@
+
+"""
+Proxies de baixa resolução para prévias rápidas.
+
+A proxy de um vídeo é uma cópia pequena (540p por padrão) em que todos os frames são
+keyframes (all-intra). Ela é gerada uma vez, fica no cache ligada ao original
+(caminho, tamanho e data de modificação) e é decodificada muito mais rápido que um
+original em 4K. Como todo frame é um keyframe, qualquer trecho dela pode ser
+recortado sem re-encodar, começando exatamente no frame pedido.
+
+O modo --preview do trim_video, split_video, denoise_video e adjust_speed_fps roda a
+mesma operação sobre a proxy (ou sobre uma janela curta dela), gerando arquivos
+'..._preview.mp4' ao lado do original para decidir cortes e parâmetros antes de
+processar o vídeo completo.
+
+As proxies e as janelas recortadas delas têm um limite de tamanho, como o cache de
+resultados (variável UTILITARIOS_PROXY_CACHE_GB; padrão: 10 GB): quando passa do
+limite, os arquivos usados há mais tempo são removidos primeiro. A data de
+modificação de cada arquivo marca o seu último uso.
+
+Uso direto, para gerar as proxies de uma biblioteca com antecedência:
+    python proxy_video.py PASTA_OU_LISTA [...] [--height 540] [--workers N]
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import threading
+
+import instrumentation
+from ffmpeg_runner import run_command, run_many
+from instrumentation import metrics
+from media_cache import file_signature, get_cache_dir
+from thumbnail_cache import collect_videos
+
+DEFAULT_PROXY_HEIGHT = 540
+DEFAULT_PREVIEW_DURATION = 10.0
+
+CACHE_SIZE_ENV_VAR = 'UTILITARIOS_PROXY_CACHE_GB'
+DEFAULT_CACHE_SIZE_GB = 10.0
+
+_evict_lock = threading.Lock()
+
+def get_proxy_path(video_path, height=DEFAULT_PROXY_HEIGHT):
+    """Caminho da proxy de um vídeo no cache (existindo ou não)."""
+    key = hashlib.sha1(f"{file_signature(video_path)}|{height}".encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir('proxies'), key[:2], f"{key}.mp4")
+
+def get_preview_path(output_path):
+    """Nome da prévia de uma saída: 'video_cortado.mp4' -> 'video_cortado_preview.mp4'."""
+    return os.path.splitext(output_path)[0] + '_preview.mp4'
+
+def build_proxy_command(video_path, output_path, height):
+    """Comando que gera a proxy all-intra (sem aumentar vídeos menores que 'height')."""
+    return [
+        'ffmpeg', '-v', 'error', '-y',
+        '-i', video_path,
+        '-map', '0:v:0', '-map', '0:a:0?',
+        '-vf', f"scale=-2:'min({height},ih)'",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-tune', 'fastdecode', '-crf', '23',
+        '-g', '1', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-b:a', '128k',
+        output_path
+    ]
+
+def get_cache_size():
+    """Limite do cache de proxies, em bytes."""
+    try:
+        size_gb = float(os.environ.get(CACHE_SIZE_ENV_VAR) or DEFAULT_CACHE_SIZE_GB)
+    except ValueError:
+        size_gb = DEFAULT_CACHE_SIZE_GB
+    return int(size_gb * 1024 ** 3)
+
+def mark_used(path):
+    """Atualiza a data de modificação do arquivo, que marca o último uso para a remoção LRU."""
+    try:
+        os.utime(path)
+    except FileNotFoundError:
+        pass
+
+def evict(keep=(), max_bytes=None):
+    """
+    Remove as proxies e janelas usadas há mais tempo até o cache caber em max_bytes
+    (padrão: get_cache_size()). Os arquivos em 'keep', que o chamador vai usar, ficam.
+    Retorna (arquivos removidos, bytes restantes).
+    """
+    max_bytes = get_cache_size() if max_bytes is None else max_bytes
+    keep = {os.path.abspath(path) for path in keep if path}
+    with _evict_lock:
+        entries = []
+        for directory, _, files in os.walk(get_cache_dir('proxies')):
+            for name in files:
+                # Os temporários são de gerações em andamento
+                if name.endswith('.mp4') and not name.endswith('.tmp.mp4'):
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= max_bytes:
+                break
+            if os.path.abspath(path) in keep:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed, total
+
+def ensure_proxies(videos, height=DEFAULT_PROXY_HEIGHT, workers=None):
+    """
+    Gera em paralelo as proxies que ainda não estão no cache. Retorna um dicionário
+    vídeo -> caminho da proxy (None para os vídeos em que a geração falhou). 'workers'
+    limita as proxies geradas ao mesmo tempo (padrão: o limite global do ffmpeg_runner).
+    """
+    proxies = {video: get_proxy_path(video, height) for video in videos}
+    missing = [video for video, proxy in proxies.items() if not os.path.exists(proxy)]
+    for video, proxy in proxies.items():
+        if video not in missing:
+            mark_used(proxy)
+    if missing:
+        print(f"Gerando {len(missing)} proxy(s) de {height}p...")
+        temp_paths = [f"{proxies[video]}.{os.getpid()}.tmp.mp4" for video in missing]
+        for temp_path in temp_paths:
+            os.makedirs(os.path.dirname(temp_path), exist_ok=True)
+        with metrics.phase('proxy'):
+            results = run_many([build_proxy_command(video, temp_path, height)
+                                for video, temp_path in zip(missing, temp_paths)], check=True, limit=workers)
+        for video, temp_path, result in zip(missing, temp_paths, results):
+            if isinstance(result, Exception):
+                print(f"ERRO ao gerar a proxy de '{video}': {str(getattr(result, 'stderr', None) or result)[-300:]}",
+                      file=sys.stderr)
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                proxies[video] = None
+            else:
+                # Só aparece com o nome final quando está completa
+                os.replace(temp_path, proxies[video])
+                metrics.count('proxies')
+        evict(keep=proxies.values())
+    return proxies
+
+def get_proxy(video_path, height=DEFAULT_PROXY_HEIGHT):
+    """Caminho da proxy de um vídeo, gerando-a se necessário. Lança RuntimeError em caso de erro."""
+    proxy = ensure_proxies([video_path], height)[video_path]
+    if proxy is None:
+        raise RuntimeError(f"Não foi possível gerar a proxy de '{video_path}'.")
+    return proxy
+
+def get_preview_clip(video_path, start, duration, height=DEFAULT_PROXY_HEIGHT):
+    """
+    Trecho de 'duration' segundos da proxy a partir de 'start', recortado sem re-encodar
+    (exato, pois todos os frames da proxy são keyframes) e guardado no cache.
+    """
+    proxy = get_proxy(video_path, height)
+    clip_path = f"{os.path.splitext(proxy)[0]}_{start:g}_{duration:g}.mp4"
+    if not os.path.exists(clip_path):
+        temp_path = f"{clip_path}.{os.getpid()}.tmp.mp4"
+        command = ['ffmpeg', '-v', 'error', '-y', '-ss', str(start), '-i', proxy,
+                   '-t', str(duration), '-map', '0', '-c', 'copy', temp_path]
+        run_command(command)
+        os.replace(temp_path, clip_path)
+        evict(keep=(proxy, clip_path))
+    else:
+        mark_used(clip_path)
+    return clip_path
+
+class PreviewSettings:
+    """Opções do modo --preview: início e duração da janela e altura da proxy."""
+
+    def __init__(self, start=0.0, duration=DEFAULT_PREVIEW_DURATION, height=DEFAULT_PROXY_HEIGHT):
+        self.start = start
+        self.duration = duration
+        self.height = height
+
+    def clip(self, video_path):
+        """Janela da proxy usada como entrada da prévia."""
+        return get_preview_clip(video_path, self.start, self.duration, self.height)
+
+def add_arguments(parser, window=True):
+    """
+    Adiciona --preview e --proxy-height ao parser e, com window=True, as opções da janela
+    (--preview-start e --preview-duration).
+    """
+    group = parser.add_argument_group("prévia")
+    group.add_argument('--preview', action='store_true',
+                       help="Roda a mesma operação sobre a proxy de baixa resolução do vídeo e grava "
+                            "'..._preview.mp4' ao lado do original.")
+    if window:
+        group.add_argument('--preview-start', type=float, default=0.0, metavar='S',
+                           help="Início (s) da janela usada na prévia. Padrão: 0.")
+        group.add_argument('--preview-duration', type=float, default=DEFAULT_PREVIEW_DURATION, metavar='S',
+                           help=f"Duração (s) da janela usada na prévia. Padrão: {DEFAULT_PREVIEW_DURATION:g}.")
+    group.add_argument('--proxy-height', type=int, default=DEFAULT_PROXY_HEIGHT, metavar='ALTURA',
+                       help=f"Altura das proxies. Padrão: {DEFAULT_PROXY_HEIGHT}.")
+
+def get_preview_settings(args):
+    """PreviewSettings conforme as opções de add_arguments, ou None sem --preview."""
+    if not args.preview:
+        return None
+    return PreviewSettings(getattr(args, 'preview_start', 0.0),
+                           getattr(args, 'preview_duration', DEFAULT_PREVIEW_DURATION), args.proxy_height)
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gera no cache as proxies de baixa resolução (all-intra) usadas pelo modo --preview.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('paths', nargs='+', help="Pastas (varridas recursivamente), vídeos ou arquivos .txt com listas.")
+    parser.add_argument('--height', type=int, default=DEFAULT_PROXY_HEIGHT, help=f"Altura das proxies. Padrão: {DEFAULT_PROXY_HEIGHT}.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Proxies geradas em paralelo. Padrão: número de CPUs.")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure(args)
+
+    videos = collect_videos(args.paths)
+    if not videos:
+        print("Nenhum arquivo de vídeo encontrado.")
+        return
+
+    proxies = ensure_proxies(videos, args.height, max(args.workers, 1))
+    failed = sum(1 for proxy in proxies.values() if proxy is None)
+    print(f"Concluído: {len(videos) - failed} proxy(s) disponível(is), {failed} com erro.")
+    metrics.report("Proxies")
+
+if __name__ == '__main__':
+    main()
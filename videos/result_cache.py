@@ -0,0 +1,208 @@
+
+"""
+Cache de resultados endereçado pelo conteúdo, compartilhado pelas ferramentas de vídeo.
+
+A chave de cada resultado é o fingerprint da entrada (tamanho + blocos amostrados,
+ver media_cache.file_fingerprint) junto com a ferramenta, os parâmetros normalizados
+da operação e a extensão da saída. Assim, a mesma operação sobre uma cópia do mesmo
+vídeo (com outro nome ou em outra pasta) reaproveita a saída já gerada em vez de
+encodar tudo de novo.
+
+Os resultados ficam em UTILITARIOS_CACHE/results e são guardados e colocados no
+destino com um reflink (cópia que compartilha os blocos, em btrfs/xfs) ou, sem
+suporte, com uma cópia. Hard links não são usados: a entrada e a saída seriam o mesmo
+arquivo, então remover a entrada não liberaria espaço e reescrever a saída alteraria
+a entrada. O cache tem um limite de tamanho (--cache-size ou a variável
+UTILITARIOS_RESULT_CACHE_GB; padrão: 20 GB, 0 desativa): quando passa do limite, os
+resultados usados há mais tempo são removidos primeiro.
+
+Uso direto, para ver o tamanho do cache ou limpá-lo:
+    python result_cache.py [--clear] [--cache-size GB]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+
+from media_cache import file_fingerprint, get_cache_dir
+
+CACHE_SIZE_ENV_VAR = 'UTILITARIOS_RESULT_CACHE_GB'
+DEFAULT_CACHE_SIZE_GB = 20.0
+
+# Muda quando o formato das chaves ou das entradas mudar, invalidando o cache antigo
+CACHE_VERSION = 1
+
+# ioctl do Linux que cria uma cópia que compartilha os blocos (btrfs, xfs...)
+FICLONE = 0x40049409
+
+def clone_or_copy(source, destination):
+    """
+    Cria 'destination' com o conteúdo de 'source': reflink ou, sem suporte, cópia.
+    Retorna o método usado ('reflink' ou 'copy').
+    """
+    try:
+        import fcntl
+        with open(source, 'rb') as src, open(destination, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), FICLONE, src.fileno())
+        return 'reflink'
+    except (ImportError, OSError):
+        # Sem suporte a reflink (outro sistema de arquivos ou Windows)
+        if os.path.exists(destination):
+            os.remove(destination)
+    shutil.copyfile(source, destination)
+    return 'copy'
+
+class ResultCache:
+    """Resultados de operações guardados por chave, com remoção LRU acima de max_bytes."""
+
+    def __init__(self, max_bytes, root=None):
+        self.max_bytes = max_bytes
+        self.root = root or get_cache_dir('results')
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def make_key(self, tool, input_path, params, extension):
+        """Chave de uma operação: fingerprint da entrada + ferramenta + parâmetros + extensão."""
+        description = json.dumps({
+            'version': CACHE_VERSION,
+            'tool': tool,
+            'input': file_fingerprint(input_path),
+            'params': params,
+            'extension': extension.lower(),
+        }, sort_keys=True)
+        return hashlib.sha1(description.encode('utf-8')).hexdigest()
+
+    def _entry_paths(self, key):
+        directory = os.path.join(self.root, key[:2])
+        return os.path.join(directory, key), os.path.join(directory, f'{key}.json')
+
+    def _remove_entry(self, key):
+        for path in self._entry_paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def fetch(self, key, destination):
+        """
+        Coloca o resultado da chave em 'destination' e retorna True, ou retorna False se
+        ele não estiver no cache. Entradas alteradas desde que foram guardadas (editadas
+        à mão ou corrompidas) são descartadas.
+        """
+        if not self.enabled:
+            return False
+        data_path, meta_path = self._entry_paths(key)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if file_fingerprint(data_path) != meta['checksum']:
+                print(f"AVISO: Resultado em cache alterado, descartado: {data_path}")
+                self._remove_entry(key)
+                return False
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            return False
+        if os.path.exists(destination):
+            os.remove(destination)
+        clone_or_copy(data_path, destination)
+        # A data de modificação dos metadados marca o último uso, para a remoção LRU
+        os.utime(meta_path)
+        return True
+
+    def store(self, key, source, tool=None):
+        """Guarda 'source' como o resultado da chave e remove os mais antigos se passar do limite."""
+        if not self.enabled:
+            return
+        size = os.path.getsize(source)
+        if size > self.max_bytes:
+            return
+        data_path, meta_path = self._entry_paths(key)
+        os.makedirs(os.path.dirname(data_path), exist_ok=True)
+        temp_path = f"{data_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            clone_or_copy(source, temp_path)
+            os.replace(temp_path, data_path)
+        except OSError as e:
+            print(f"AVISO: Não foi possível guardar o resultado no cache: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return
+        meta = {'key': key, 'tool': tool, 'size': size, 'checksum': file_fingerprint(data_path),
+                'source': os.path.abspath(source), 'stored': time.time()}
+        with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(f"{meta_path}.tmp", meta_path)
+        self.evict()
+
+    def entries(self):
+        """Lista (último uso, tamanho, chave) de todas as entradas do cache."""
+        entries = []
+        for directory, _, files in os.walk(self.root):
+            for name in files:
+                if not name.endswith('.json'):
+                    continue
+                key = name[:-len('.json')]
+                data_path, meta_path = self._entry_paths(key)
+                try:
+                    entries.append((os.path.getmtime(meta_path), os.path.getsize(data_path), key))
+                except FileNotFoundError:
+                    # Metadados sem o resultado (gravação interrompida)
+                    self._remove_entry(key)
+        return entries
+
+    def evict(self, max_bytes=None):
+        """Remove os resultados usados há mais tempo até o cache caber em max_bytes."""
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        with self._lock:
+            entries = sorted(self.entries())
+            total = sum(size for _, size, _ in entries)
+            removed = 0
+            for _, size, key in entries:
+                if total <= max_bytes:
+                    break
+                self._remove_entry(key)
+                total -= size
+                removed += 1
+            return removed, total
+
+def get_default_size_gb():
+    try:
+        return float(os.environ.get(CACHE_SIZE_ENV_VAR) or DEFAULT_CACHE_SIZE_GB)
+    except ValueError:
+        return DEFAULT_CACHE_SIZE_GB
+
+def add_arguments(parser):
+    """Adiciona as opções --cache-size e --no-result-cache ao parser."""
+    parser.add_argument('--cache-size', type=float, default=get_default_size_gb(), metavar='GB',
+                        help=f"Tamanho máximo do cache de resultados, em GB. Padrão: {CACHE_SIZE_ENV_VAR} "
+                             f"ou {DEFAULT_CACHE_SIZE_GB:g}.")
+    parser.add_argument('--no-result-cache', action='store_true',
+                        help="Não reaproveita nem guarda resultados no cache.")
+
+def open_cache(args):
+    """Abre o cache conforme as opções adicionadas por add_arguments."""
+    size_gb = 0 if getattr(args, 'no_result_cache', False) else getattr(args, 'cache_size', get_default_size_gb())
+    return ResultCache(int(size_gb * 1024 ** 3))
+
+def main():
+    parser = argparse.ArgumentParser(description="Mostra o tamanho do cache de resultados das ferramentas de vídeo ou o limpa.")
+    parser.add_argument('--clear', action='store_true', help="Remove todos os resultados do cache.")
+    parser.add_argument('--cache-size', type=float, default=get_default_size_gb(), metavar='GB',
+                        help="Remove os resultados usados há mais tempo até o cache caber neste tamanho.")
+    args = parser.parse_args()
+
+    cache = ResultCache(int(args.cache_size * 1024 ** 3))
+    removed, total = cache.evict(0 if args.clear else None)
+    entries = cache.entries()
+    print(f"Cache de resultados: {cache.root}")
+    print(f"{len(entries)} resultado(s), {total / 1024 ** 3:.2f} GB de {args.cache_size:g} GB"
+          + (f" ({removed} removido(s))" if removed else ""))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+
+"""
+Cortes com precisão de frame sem re-renderizar o vídeo inteiro ("smart render").
+
+Apenas o trecho entre o ponto de corte e o keyframe seguinte (início) e entre o
+último keyframe e o ponto de corte (fim) é re-encodado, com parâmetros de encoder
+iguais aos do original detectados pelo ffprobe (codec, perfil, nível, resolução,
+SAR, cores e entrelaçamento). Todo o miolo é copiado sem perdas.
+
+Cada parte tem os seus próprios parâmetros de codec (SPS/PPS), mas o MP4 final guarda
+um único conjunto no cabeçalho. Por isso as partes são gravadas em MPEG-TS com os
+parâmetros repetidos dentro do stream, antes de cada keyframe (o encoder com
+repeat-headers e a parte copiada pelo h264/hevc_mp4toannexb do muxer), e o decoder
+troca de parâmetros em cada junção. As junções são decodificadas no final para
+conferir o resultado. As partes são unidas com o demuxer concat e o áudio é copiado
+do original.
+
+As bordas são decodificadas sem a rotação automática (-noautorotate), no mesmo
+tamanho e orientação dos frames copiados; a rotação do original (display matrix) é
+aplicada ao arquivo final. O VP9 não cabe em MPEG-TS e não usa parâmetros fora dos
+frames: as suas partes são gravadas em Matroska.
+
+Os tempos do KeyframeIndex são relativos ao início do arquivo, a mesma referência do
+'-ss' usado para recortar cada parte.
+"""
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from ffmpeg_runner import run_command, run_many
+
+# Encoder usado para re-encodar as bordas de cada codec de origem
+SMART_RENDER_ENCODERS = {
+    'h264': 'libx264',
+    'hevc': 'libx265',
+    'mpeg4': 'mpeg4',
+    'vp9': 'libvpx-vp9',
+}
+
+# Contêiner das partes intermediárias, quando não for MPEG-TS
+PART_EXTENSIONS = {'vp9': '.mkv'}
+
+# Trechos menores que isso são considerados inexistentes
+MIN_PART_SECONDS = 0.001
+
+# Opções do ffmpeg para os metadados de cor, a partir dos campos do ffprobe
+COLOR_OPTIONS = {
+    'color_range': '-color_range',
+    'color_space': '-colorspace',
+    'color_transfer': '-color_trc',
+    'color_primaries': '-color_primaries',
+}
+
+# Segundos decodificados antes e depois de cada junção na verificação final
+SEAM_CHECK_SECONDS = 1.0
+
+def probe_video_encoding(video_path):
+    """Usa ffprobe para obter os parâmetros de codificação do primeiro stream de vídeo."""
+    command = [
+        'ffprobe',
+        '-v', 'error',
+        '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_name,profile,level,pix_fmt,width,height,sample_aspect_ratio,r_frame_rate,'
+                         'bit_rate,color_range,color_space,color_transfer,color_primaries,field_order:'
+                         'stream_side_data=rotation:format=bit_rate',
+        '-of', 'json',
+        video_path
+    ]
+    try:
+        result = run_command(command, capture_output=True, text=True)
+        data = json.loads(result.stdout)
+        stream = data['streams'][0]
+    except FileNotFoundError:
+        print("Erro: 'ffprobe' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
+        return None
+    except (subprocess.CalledProcessError, json.JSONDecodeError, KeyError, IndexError) as e:
+        print(f"Erro ao obter os parâmetros de codificação de '{video_path}': {e}", file=sys.stderr)
+        return None
+
+    if 'bit_rate' not in stream and 'bit_rate' in data.get('format', {}):
+        stream['bit_rate'] = data['format']['bit_rate']
+    stream['rotation'] = next((side_data['rotation'] for side_data in stream.get('side_data_list', [])
+                               if 'rotation' in side_data), 0)
+    return stream
+
+def build_profile_args(encoder, encoding):
+    """Argumentos de perfil e nível do encoder iguais aos do stream 'encoding' (saída do ffprobe)."""
+    profile = (encoding.get('profile') or '').lower()
+    if encoder == 'libx264' and profile:
+        # Ex: 'Constrained Baseline' -> 'baseline', 'High 10' -> 'high10'
+        profile = profile.replace('constrained ', '').replace(' ', '').replace(':', '').replace('predictive', '')
+        args = ['-profile:v', profile]
+        level = encoding.get('level')
+        if isinstance(level, int) and level > 0:
+            args.extend(['-level:v', f"{level / 10:.1f}"])
+        return args
+    if encoder == 'libx265' and profile:
+        return ['-profile:v', profile.replace(' ', '')]
+    return []
+
+def build_encoder_args(encoding):
+    """
+    Monta os argumentos do encoder para reproduzir o mais fielmente possível a
+    codificação original. Retorna None se o codec não for suportado.
+    """
+    encoder = SMART_RENDER_ENCODERS.get(encoding.get('codec_name'))
+    if encoder is None:
+        return None
+
+    args = ['-c:v', encoder]
+    if encoding.get('pix_fmt'):
+        args.extend(['-pix_fmt', encoding['pix_fmt']])
+    if encoding.get('width') and encoding.get('height'):
+        args.extend(['-s', f"{encoding['width']}x{encoding['height']}"])
+    sample_aspect_ratio = encoding.get('sample_aspect_ratio', '')
+    if sample_aspect_ratio and sample_aspect_ratio not in ('N/A', '0:1'):
+        args.extend(['-vf', f"setsar={sample_aspect_ratio.replace(':', '/')}"])
+    if encoding.get('r_frame_rate') and encoding['r_frame_rate'] != '0/0':
+        args.extend(['-r', encoding['r_frame_rate']])
+    if encoding.get('bit_rate', '').isdigit():
+        args.extend(['-b:v', encoding['bit_rate']])
+    for field, option in COLOR_OPTIONS.items():
+        value = encoding.get(field)
+        if value and value not in ('unknown', 'reserved'):
+            args.extend([option, value])
+
+    # Parâmetros do codec repetidos em cada keyframe (ver o início do módulo)
+    codec_params = ['repeat-headers=1']
+    field_order = encoding.get('field_order')
+    if field_order in ('tt', 'tb', 'bb', 'bt'):
+        args.extend(['-flags', '+ildct+ilme'])
+        if encoder == 'libx264':
+            codec_params.append('tff=1' if field_order in ('tt', 'tb') else 'bff=1')
+
+    args.extend(build_profile_args(encoder, encoding))
+
+    if encoder == 'libx264':
+        args.extend(['-x264-params', ':'.join(codec_params)])
+    elif encoder == 'libx265':
+        args.extend(['-x265-params', ':'.join(codec_params)])
+    return args
+
+def check_seams(output_path, seams):
+    """
+    Decodifica o resultado em volta de cada junção (tempos relativos à saída) e retorna
+    as mensagens de erro do decoder (lista vazia se estiver tudo certo).
+    """
+    errors = []
+    for seam in seams:
+        start = max(seam - SEAM_CHECK_SECONDS, 0.0)
+        command = ['ffmpeg', '-v', 'error', '-ss', f'{start:.3f}', '-i', output_path,
+                   '-t', f'{2 * SEAM_CHECK_SECONDS:.3f}', '-map', '0:v:0', '-f', 'null', '-']
+        result = run_command(command, check=False)
+        if result.returncode != 0 or result.log:
+            errors.append(f"junção em {seam:.3f}s: " + ' | '.join(result.log[-3:]))
+    return errors
+
+def _report_part_error(command, description, error):
+    print(f"ERRO ao gerar {description}.", file=sys.stderr)
+    print(f"Comando: {' '.join(command)}", file=sys.stderr)
+    print(f"Erro do ffmpeg: {getattr(error, 'stderr', None) or error}", file=sys.stderr)
+
+def _run_part(command, description):
+    """Executa um comando ffmpeg de uma das partes, escondendo a saída."""
+    try:
+        run_command(command)
+        return True
+    except subprocess.CalledProcessError as e:
+        _report_part_error(command, description, e)
+        return False
+
+def smart_cut(input_path, start_seconds, end_seconds, output_path, keyframes):
+    """
+    Extrai [start_seconds, end_seconds] de input_path para output_path com precisão de
+    frame, re-encodando apenas os GOPs parciais das bordas. 'keyframes' é um
+    KeyframeIndex do arquivo de entrada. Retorna True em caso de sucesso.
+    """
+    encoding = probe_video_encoding(input_path)
+    if encoding is None:
+        return False
+    encoder_args = build_encoder_args(encoding)
+    if encoder_args is None:
+        print(f"ERRO: O codec '{encoding.get('codec_name')}' não é suportado pelo smart render.", file=sys.stderr)
+        return False
+
+    first_keyframe = keyframes.keyframe_at_or_after(start_seconds)
+    last_keyframe = keyframes.keyframe_at_or_before(end_seconds)
+
+    # (início, fim, re-encodar?) de cada parte, em ordem
+    parts = []
+    if first_keyframe is None or first_keyframe >= end_seconds:
+        # Nenhum keyframe dentro do trecho: ele é curto e é re-encodado por inteiro
+        parts.append((start_seconds, end_seconds, True))
+    else:
+        if first_keyframe - start_seconds > MIN_PART_SECONDS:
+            parts.append((start_seconds, first_keyframe, True))
+        if last_keyframe - first_keyframe > MIN_PART_SECONDS:
+            parts.append((first_keyframe, last_keyframe, False))
+        if end_seconds - last_keyframe > MIN_PART_SECONDS:
+            parts.append((max(last_keyframe, first_keyframe), end_seconds, True))
+
+    output_dir = os.path.dirname(os.path.abspath(output_path))
+    temp_dir = tempfile.mkdtemp(prefix='.smart_render_', dir=output_dir)
+    try:
+        part_files = []
+        part_jobs = []
+        for i, (part_start, part_end, reencode) in enumerate(parts):
+            # MPEG-TS mantém os parâmetros do codec em cada parte, o que torna a junção robusta
+            # (o VP9 vai em Matroska, ver PART_EXTENSIONS)
+            part_file = os.path.join(temp_dir, f"part_{i:02d}{PART_EXTENSIONS.get(encoding['codec_name'], '.ts')}")
+            codec_args = encoder_args if reencode else ['-c:v', 'copy']
+            command = [
+                'ffmpeg', '-v', 'error', '-y',
+                '-noautorotate',
+                '-ss', str(part_start),
+                '-i', input_path,
+                '-t', str(part_end - part_start),
+                '-map', '0:v:0', '-an', '-sn',
+                *codec_args,
+                part_file
+            ]
+            kind = "re-encodada" if reencode else "copiada"
+            part_jobs.append((command, f"parte {kind} {part_start:.3f}s-{part_end:.3f}s"))
+            part_files.append(part_file)
+
+        # As partes são independentes: as bordas são encodadas enquanto o meio é copiado
+        results = run_many([command for command, _ in part_jobs], check=True)
+        failed = False
+        for (command, description), result in zip(part_jobs, results):
+            if isinstance(result, Exception):
+                _report_part_error(command, description, result)
+                failed = True
+        if failed:
+            return False
+
+        list_file = os.path.join(temp_dir, 'parts.txt')
+        with open(list_file, 'w', encoding='utf-8') as f:
+            for part_file in part_files:
+                f.write(f"file '{part_file.replace(os.sep, '/')}'\n")
+
+        # As partes não têm a rotação do original; ela volta no arquivo final
+        rotation = ['-display_rotation', str(encoding['rotation'])] if encoding.get('rotation') else []
+        command = [
+            'ffmpeg', '-v', 'error', '-y',
+            '-f', 'concat', '-safe', '0', *rotation, '-i', list_file,
+            '-ss', str(start_seconds), '-i', input_path,
+            '-t', str(end_seconds - start_seconds),
+            '-map', '0:v', '-map', '1:a?',
+            '-c', 'copy',
+            output_path
+        ]
+        if not _run_part(command, f"arquivo final '{output_path}'"):
+            return False
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    seams = [part_start - start_seconds for part_start, _, _ in parts[1:]]
+    errors = check_seams(output_path, seams)
+    if errors:
+        print(f"ERRO: O resultado do smart render tem erros de decodificação: {'; '.join(errors)}", file=sys.stderr)
+        return False
+
+    reencoded = sum(part_end - part_start for part_start, part_end, reencode in parts if reencode)
+    print(f"Smart render: {reencoded:.2f}s re-encodados de {end_seconds - start_seconds:.2f}s.")
+    return True
@@ -3,6 +3,13 @@ import sys
 import subprocess
 import argparse
 
+import instrumentation
+import proxy_video
+from ffmpeg_runner import run_command, run_many
+from instrumentation import metrics
+from keyframe_index import load_keyframe_index
+from smart_render import smart_cut
+
 def parse_time_to_seconds(time_str):
     """
     Converte uma string de tempo no formato 'MM:SS' ou apenas segundos para um total de segundos.
@@ -39,7 +46,7 @@ def get_video_duration(file_path):
         file_path
     ]
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        result = run_command(command, capture_output=True, text=True)
         return float(result.stdout.strip())
     except FileNotFoundError:
         print("ERRO: O comando 'ffprobe' não foi encontrado.", file=sys.stderr)
@@ -50,20 +57,50 @@ def get_video_duration(file_path):
         print(f"Erro: {e}", file=sys.stderr)
         sys.exit(1)
 
-def split_video_segment(input_file, start_seconds, end_seconds):
+def snap_split_points(split_points_seconds, keyframes):
     """
-    Usa o ffmpeg para extrair um segmento de vídeo sem re-encoder.
+    Alinha ao keyframe anterior cada ponto que inicia um segmento, pois com cópia de
+    streams é nele que o corte realmente acontece. O último ponto (fim) não muda.
+    """
+    snapped = [keyframes.keyframe_at_or_before(t) for t in split_points_seconds[:-1]]
+    for requested, actual in zip(split_points_seconds[:-1], snapped):
+        if abs(requested - actual) > 0.001:
+            print(f"Corte em {requested:.3f}s ajustado para o keyframe em {actual:.3f}s.")
+    snapped.append(split_points_seconds[-1])
+    return sorted(set(snapped))
+
+def split_video_segment_smart(input_file, start_seconds, end_seconds, keyframes):
+    """
+    Extrai um segmento com precisão de frame, re-encodando apenas os GOPs das bordas.
     """
-    base, ext = os.path.splitext(input_file)
     start_str = format_seconds_to_str(start_seconds)
     end_str = format_seconds_to_str(end_seconds)
-    output_filename = f"{base}_split_{start_str}-{end_str}{ext}"
+    output_filename = build_segment_filename(input_file, start_seconds, end_seconds)
 
     if os.path.exists(output_filename):
         print(f"Arquivo de saída já existe, pulando: {output_filename}")
         return
 
-    command = [
+    print(f"Criando segmento (smart render): {output_filename} (de {start_str} a {end_str})")
+    if not smart_cut(input_file, start_seconds, end_seconds, output_filename, keyframes):
+        print(f"ERRO ao fatiar o vídeo para o segmento {start_str}-{end_str}.", file=sys.stderr)
+
+def build_segment_command(input_file, start_seconds, end_seconds, output_filename, seek_input=False):
+    """
+    Monta o comando ffmpeg que extrai um segmento de vídeo sem re-encoder.
+    Com seek_input=True (início já alinhado a um keyframe) a busca é feita na
+    entrada, indo direto ao ponto em vez de ler o arquivo desde o começo.
+    """
+    if seek_input:
+        return [
+            'ffmpeg',
+            '-ss', str(start_seconds),
+            '-i', input_file,
+            '-t', str(end_seconds - start_seconds),
+            '-c', 'copy',  # Copia os streams sem re-encoder
+            output_filename
+        ]
+    return [
         'ffmpeg',
         '-i', input_file,
         '-ss', str(start_seconds),
@@ -72,18 +109,113 @@ def split_video_segment(input_file, start_seconds, end_seconds):
         output_filename
     ]
 
-    print(f"Criando segmento: {output_filename} (de {start_str} a {end_str})")
+def report_segment_error(command, start_seconds, end_seconds, error):
+    print(f"ERRO ao fatiar o vídeo para o segmento {format_seconds_to_str(start_seconds)}-{format_seconds_to_str(end_seconds)}.", file=sys.stderr)
+    print(f"Comando: {' '.join(command)}", file=sys.stderr)
+    print(f"Erro do ffmpeg: {error}", file=sys.stderr)
+
+def split_video_segments(input_file, split_points_seconds, seek_input=False, proxy_path=None):
+    """
+    Extrai todos os segmentos sem re-encoder, rodando as cópias de streams ao mesmo
+    tempo (limitadas pelo executor compartilhado de comandos ffmpeg).
+    Com proxy_path (modo --preview), os segmentos são recortados da proxy do vídeo e
+    salvos como '..._split_00m00s-00m10s_preview.mp4'.
+    """
+    jobs = []
+    for start_seconds, end_seconds in zip(split_points_seconds[:-1], split_points_seconds[1:]):
+        output_filename = build_segment_filename(input_file, start_seconds, end_seconds)
+        if proxy_path:
+            output_filename = proxy_video.get_preview_path(output_filename)
+            if os.path.exists(output_filename):
+                # Prévias são sempre refeitas com os pontos de corte atuais
+                os.remove(output_filename)
+        if os.path.exists(output_filename):
+            print(f"Arquivo de saída já existe, pulando: {output_filename}")
+            continue
+        print(f"Criando segmento: {output_filename} (de {format_seconds_to_str(start_seconds)} a {format_seconds_to_str(end_seconds)})")
+        command = build_segment_command(proxy_path or input_file, start_seconds, end_seconds, output_filename, seek_input)
+        jobs.append((command, start_seconds, end_seconds))
+
+    results = run_many([command for command, _, _ in jobs], check=True)
+    for (command, start_seconds, end_seconds), result in zip(jobs, results):
+        if isinstance(result, FileNotFoundError):
+            print("ERRO: O comando 'ffmpeg' não foi encontrado.", file=sys.stderr)
+            print("Por favor, instale o ffmpeg e garanta que ele esteja no PATH do seu sistema.", file=sys.stderr)
+            sys.exit(1)
+        if isinstance(result, subprocess.CalledProcessError):
+            report_segment_error(command, start_seconds, end_seconds, result.stderr[-500:])
+        elif isinstance(result, Exception):
+            report_segment_error(command, start_seconds, end_seconds, result)
+
+def build_segment_filename(input_file, start_seconds, end_seconds):
+    """Monta o nome do arquivo de saída de um segmento no padrão _split_MMmSSs-MMmSSs."""
+    base, ext = os.path.splitext(input_file)
+    return f"{base}_split_{format_seconds_to_str(start_seconds)}-{format_seconds_to_str(end_seconds)}{ext}"
+
+def split_video_single_pass(input_file, split_points_seconds):
+    """
+    Usa o muxer 'segment' do ffmpeg para gerar todos os segmentos em uma única
+    leitura do arquivo, sem re-encoder, e renomeia cada um para o padrão usual.
+
+    Com cópia de streams o corte só acontece em keyframes, então os nomes usam os
+    limites reais informados pelo próprio muxer na lista de segmentos.
+    """
+    base, ext = os.path.splitext(input_file)
+    # O '%' é especial no padrão do muxer segment e precisa ser escapado no nome base
+    temp_pattern = base.replace('%', '%%') + '_split_tmp%03d' + ext
+    segment_list = f"{base}_split_tmp.csv"
+    # Uma pequena folga garante que um keyframe exatamente no ponto de corte seja usado
+    segment_times = ','.join(str(max(t - 0.001, 0)) for t in split_points_seconds[1:-1])
+
+    command = [
+        'ffmpeg',
+        '-i', input_file,
+        '-map', '0',
+        '-c', 'copy',  # Copia os streams sem re-encoder
+        '-f', 'segment',
+        '-reset_timestamps', '1',
+        '-segment_list', segment_list,
+        '-segment_list_type', 'csv',
+    ]
+    if segment_times:
+        command.extend(['-segment_times', segment_times])
+    command.append(temp_pattern)
+
+    print(f"Criando {len(split_points_seconds) - 1} segmentos em uma única passada...")
     try:
-        subprocess.run(command, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        run_command(command)
     except subprocess.CalledProcessError as e:
-        print(f"ERRO ao fatiar o vídeo para o segmento {start_str}-{end_str}.", file=sys.stderr)
+        print("ERRO ao fatiar o vídeo com o muxer segment.", file=sys.stderr)
         print(f"Comando: {' '.join(command)}", file=sys.stderr)
-        print(f"Erro do ffmpeg: {e}", file=sys.stderr)
+        print(f"Erro do ffmpeg: {e.stderr[-500:]}", file=sys.stderr)
     except FileNotFoundError:
         print("ERRO: O comando 'ffmpeg' não foi encontrado.", file=sys.stderr)
         print("Por favor, instale o ffmpeg e garanta que ele esteja no PATH do seu sistema.", file=sys.stderr)
         sys.exit(1)
 
+    if not os.path.exists(segment_list):
+        return
+
+    with open(segment_list, 'r', encoding='utf-8') as f:
+        entries = [line.strip().rsplit(',', 2) for line in f if line.strip()]
+    os.remove(segment_list)
+
+    if len(entries) < len(split_points_seconds) - 1:
+        print(f"AVISO: Apenas {len(entries)} segmentos puderam ser criados; os cortes foram alinhados aos keyframes.")
+
+    output_dir = os.path.dirname(input_file)
+    for temp_name, start_str, end_str in entries:
+        temp_filename = os.path.join(output_dir, os.path.basename(temp_name))
+        start_time = float(start_str)
+        end_time = float(end_str)
+        output_filename = build_segment_filename(input_file, start_time, end_time)
+        if os.path.exists(output_filename):
+            print(f"Arquivo de saída já existe, pulando: {output_filename}")
+            os.remove(temp_filename)
+            continue
+        os.replace(temp_filename, output_filename)
+        print(f"Segmento criado: {output_filename} (de {format_seconds_to_str(start_time)} a {format_seconds_to_str(end_time)})")
+
 def main():
     """
     Função principal que analisa os argumentos e orquestra o fatiamento.
@@ -103,8 +235,30 @@ def main():
         nargs='+',
         help="Sequência de tempos de corte. Ex: 1:15 2:30 5:00"
     )
+    parser.add_argument(
+        '--single-pass',
+        action='store_true',
+        help="Gera todos os segmentos em uma única leitura do arquivo (muxer segment do ffmpeg)."
+    )
+    parser.add_argument(
+        '--no-index',
+        action='store_true',
+        help="Não consulta o índice de keyframes (os cortes podem cair em pontos imprevisíveis)."
+    )
+    parser.add_argument(
+        '--smart',
+        action='store_true',
+        help="Cortes com precisão de frame: re-encoda só os GOPs das bordas e copia o restante."
+    )
+    proxy_video.add_arguments(parser, window=False)
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
+    instrumentation.configure(args)
+
+    if args.smart and (args.no_index or args.single_pass):
+        print("ERRO: --smart não pode ser combinado com --no-index ou --single-pass.", file=sys.stderr)
+        sys.exit(1)
 
     if not os.path.isfile(args.file):
         print(f"ERRO: Arquivo de vídeo não encontrado em: {args.file}", file=sys.stderr)
@@ -122,15 +276,32 @@ def main():
         if total_duration - last_timestamp > 1:
             split_points_seconds.append(total_duration)
 
+    keyframes = None if args.no_index else load_keyframe_index(args.file)
+    if args.smart and keyframes is None:
+        print("ERRO: O smart render precisa do índice de keyframes do vídeo.", file=sys.stderr)
+        sys.exit(1)
+    if keyframes is not None and not args.smart:
+        split_points_seconds = snap_split_points(split_points_seconds, keyframes)
+
     print(f"Fatiando o vídeo '{args.file}' (duração: {format_seconds_to_str(total_duration)}) nos tempos (s): {split_points_seconds}")
 
-    # Itera sobre os pontos de corte para criar os segmentos
-    for i in range(len(split_points_seconds) - 1):
-        start_time = split_points_seconds[i]
-        end_time = split_points_seconds[i+1]
-        split_video_segment(args.file, start_time, end_time)
+    if args.preview:
+        # Todos os frames da proxy são keyframes: cada segmento começa exatamente no ponto
+        # já alinhado acima, como no vídeo original (ou no ponto pedido, com --smart)
+        proxy_path = proxy_video.get_proxy(args.file, args.proxy_height)
+        split_video_segments(args.file, split_points_seconds, seek_input=True, proxy_path=proxy_path)
+    elif args.single_pass:
+        split_video_single_pass(args.file, split_points_seconds)
+    elif args.smart:
+        # Itera sobre os pontos de corte para criar os segmentos
+        for i in range(len(split_points_seconds) - 1):
+            split_video_segment_smart(args.file, split_points_seconds[i], split_points_seconds[i+1], keyframes)
+    else:
+        split_video_segments(args.file, split_points_seconds, seek_input=keyframes is not None)
     
     print("\nProcesso de fatiamento concluído.")
+    metrics.count('segments', len(split_points_seconds) - 1)
+    metrics.report(f"Fatiamento de {args.file}")
 
 if __name__ == '__main__':
     main()
\ No newline at end of file
@@ -1,69 +1,249 @@
 
-import subprocess
 import os
 import argparse
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def run_ffmpeg_command(command, description):
-    """Executa um comando ffmpeg e imprime o status."""
-    print(f"--- {description} ---")
-    print(f"Executando comando: {' '.join(command)}")
-    try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, encoding='utf-8', errors='replace')
-        for line in process.stdout:
-            print(line, end='')
-        process.wait()
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(process.returncode, command)
-        print(f"Sucesso: {description} concluído.")
-    except subprocess.CalledProcessError as e:
-        print(f"ERRO ao executar o comando: {' '.join(command)}")
-        raise
-    print("-" * (len(description) + 6) + "\n")
-
-def stabilize_video(input_video, shakiness):
-    """Estabiliza o vídeo."""
-    output_video = os.path.splitext(input_video)[0] + '_stabilized.mp4'
-    transforms_file = 'transforms.trf'
-
-    if os.path.exists(output_video):
-        if input(f"O vídeo estabilizado '{output_video}' já existe. Deseja recriá-lo? (s/n): ").lower() != 's':
-            print("Usando o vídeo estabilizado existente.")
-            return
-        os.remove(output_video)
+import encode_settings
+import instrumentation
+import job_journal
+from ffmpeg_runner import JobLimit, run_ffmpeg_command
+from instrumentation import metrics
+from media_cache import file_fingerprint, get_cache_dir
+
+# Vetor de movimento local no arquivo de transformações em texto ("VID.STAB 1") gerado
+# pelo vidstabdetect do ffmpeg
+TRF_TEXT_MOTION = re.compile(r'\(LM (-?\d+) (-?\d+) (-?\d+) (-?\d+) (-?\d+) ')
+
+# Bitrate do vídeo estabilizado (teto da busca de bitrate)
+DEFAULT_BITRATE = '20M'
+
+def escape_filter_path(path):
+    """Escapa um caminho para uso como valor de opção dentro de um filtro do ffmpeg."""
+    return "'" + path.replace('\\', '/').replace(':', '\\:') + "'"
+
+def rescale_transforms_file(source_path, target_path, factor):
+    """
+    Multiplica por 'factor' os vetores de movimento e as posições/tamanhos dos campos
+    de um arquivo de transformações do vid.stab, para que a detecção feita em baixa
+    resolução possa ser aplicada no vídeo em resolução total.
+    Retorna False se o formato do arquivo não for reconhecido.
+    """
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    if not data.startswith(b'VID.STAB'):
+        return False
+
+    def scale(value):
+        return int(round(value * factor))
+
+    output = TRF_TEXT_MOTION.sub(
+        lambda m: '(LM ' + ' '.join(str(scale(int(v))) for v in m.groups()) + ' ', data.decode('utf-8')
+    ).encode('utf-8')
+
+    with open(target_path, 'wb') as f:
+        f.write(output)
+    return True
+
+def get_transforms_file(input_video, shakiness, detect_scale):
+    """
+    Caminho do arquivo de transformações deste vídeo no cache. A chave é o conteúdo
+    do vídeo mais os parâmetros da detecção, então cada vídeo tem o seu próprio arquivo.
+    """
+    key = f"{file_fingerprint(input_video)}_s{shakiness}_x{detect_scale:g}"
+    return os.path.join(get_cache_dir('vidstab'), key + '.trf')
+
+def detect_transforms(input_video, shakiness, detect_scale=1.0, quiet=False, limit=None):
+    """
+    Executa a passada de análise (vidstabdetect), opcionalmente em resolução reduzida,
+    e retorna o arquivo de transformações para a resolução total. Se o vídeo já foi
+    analisado com os mesmos parâmetros, reaproveita o resultado do cache. 'limit' é o
+    JobLimit da execução.
+    """
+    transforms_file = get_transforms_file(input_video, shakiness, detect_scale)
+    if os.path.exists(transforms_file):
+        print(f"Usando análise de tremor em cache: {transforms_file}")
+        return transforms_file
+
+    # Temporários exclusivos deste processo e desta thread: cópias do mesmo vídeo na lista
+    # do stabilize_batch têm o mesmo transforms_file e podem ser analisadas ao mesmo tempo
+    detect_file = f"{transforms_file}.{os.getpid()}.{threading.get_ident()}.tmp"
+    rescaled_file = f"{detect_file}.rescaled"
+    filters = f'vidstabdetect=result={escape_filter_path(detect_file)}:shakiness={shakiness}'
+    if detect_scale != 1.0:
+        filters = f'scale=trunc(iw*{detect_scale}/2)*2:trunc(ih*{detect_scale}/2)*2,' + filters
 
     command_detect = [
         'ffmpeg', '-i', input_video,
-        '-vf', f'vidstabdetect=result={transforms_file}:shakiness={shakiness}',
+        '-vf', filters,
         '-f', 'null', '-'
     ]
-    run_ffmpeg_command(command_detect, f"Analisando tremor para estabilização em {input_video}")
+    try:
+        run_ffmpeg_command(command_detect, f"Analisando tremor para estabilização em {input_video}", quiet,
+                           limit=limit)
+        if detect_scale == 1.0:
+            os.replace(detect_file, transforms_file)
+        elif rescale_transforms_file(detect_file, rescaled_file, 1.0 / detect_scale):
+            os.replace(rescaled_file, transforms_file)
+        else:
+            raise ValueError(f"Formato desconhecido do arquivo de transformações '{detect_file}'.")
+    finally:
+        for path in (detect_file, rescaled_file):
+            if os.path.exists(path):
+                os.remove(path)
+    return transforms_file
+
+def get_output_path(input_video):
+    """Caminho do vídeo estabilizado gerado a partir de input_video."""
+    return os.path.splitext(input_video)[0] + '_stabilized.mp4'
 
-    command_transform = [
+def build_transform_filter(transforms_file, smoothing=10):
+    """Monta a cadeia de filtros da passada de transformação (vidstabtransform + unsharp)."""
+    return f'vidstabtransform=input={escape_filter_path(transforms_file)}:zoom=0:smoothing={smoothing},unsharp=5:5:0.8:3:3:0.4'
+
+def build_transform_command(input_video, transforms_file, output_video, smoothing=10, bitrate=DEFAULT_BITRATE):
+    """Monta o comando ffmpeg da passada de transformação e encode."""
+    return [
         'ffmpeg', '-i', input_video,
-        '-vf', f'vidstabtransform=input={transforms_file}:zoom=0:smoothing=10,unsharp=5:5:0.8:3:3:0.4',
-        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-b:v', '20M',
+        '-vf', build_transform_filter(transforms_file, smoothing),
+        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-b:v', bitrate,
         output_video
     ]
-    run_ffmpeg_command(command_transform, f"Aplicando estabilização ({output_video})")
+
+def apply_stabilization(input_video, transforms_file, smoothing=10, quiet=False, output_video=None, bitrates=None,
+                        limit=None):
+    """
+    Executa a passada de transformação e encode (vidstabtransform), gravando em output_video.
+    Com 'bitrates' (encode_settings.BitrateSearch) o bitrate é escolhido por vídeo; retorna
+    os dados dessa escolha para o journal.
+    """
+    output_video = output_video or get_output_path(input_video)
+    command_transform = build_transform_command(input_video, transforms_file, output_video, smoothing)
+    # Nos trechos de teste o vidstab conta os frames a partir do início do trecho: a
+    # correção aplicada não é a certa, mas o conteúdo (e a dificuldade de comprimir) é o mesmo
+    _, bitrate, meta = encode_settings.tune(input_video, command_transform, bitrates=bitrates)
+    command_transform = build_transform_command(input_video, transforms_file, output_video, smoothing, bitrate)
+    run_ffmpeg_command(command_transform, f"Aplicando estabilização ({output_video})", quiet, limit=limit)
+    return meta
+
+def get_job_params(shakiness, smoothing, detect_scale, bitrates=None):
+    """Parâmetros que definem o resultado da estabilização, registrados no journal."""
+    params = {'shakiness': shakiness, 'smoothing': smoothing, 'detect_scale': detect_scale}
+    if bitrates:
+        params.update(bitrates.job_params())
+    return params
+
+def stabilize_video(input_video, shakiness, smoothing=10, detect_scale=1.0, output_video=None, bitrates=None):
+    """Estabiliza o vídeo. Retorna os dados da busca de bitrate (ver apply_stabilization)."""
+    transforms_file = detect_transforms(input_video, shakiness, detect_scale)
+    return apply_stabilization(input_video, transforms_file, smoothing, output_video=output_video, bitrates=bitrates)
+
+def stabilize_batch(videos, journal, shakiness, smoothing=10, detect_scale=1.0, detect_workers=1, encode_workers=1,
+                    bitrates=None):
+    """
+    Estabiliza uma lista de vídeos em duas etapas encadeadas: a análise (limitada pela
+    decodificação) do vídeo k+1 roda enquanto o vídeo k é transformado e encodado.
+    Cada etapa tem o seu próprio limite de concorrência. Os vídeos já concluídos em
+    uma execução anterior (segundo o journal) são pulados.
+    """
+    params = get_job_params(shakiness, smoothing, detect_scale, bitrates)
+    jobs = {video: journal.start(video, get_output_path(video), params) for video in videos}
+    pending = [video for video, job in jobs.items() if job is not None]
+    limit = JobLimit(detect_workers + encode_workers)
+
+    def run_stage(stage, function, video, *args):
+        # Cada etapa roda em uma thread diferente, então gera o seu próprio registro
+        with metrics.item(video) as item:
+            item['stage'] = stage
+            return function(video, *args)
+
+    def encode(video, transforms_file):
+        job = jobs[video]
+        try:
+            job.meta = apply_stabilization(video, transforms_file, smoothing, True, job.partial_path, bitrates,
+                                           limit)
+        except BaseException as e:
+            journal.fail(job, e)
+            raise
+        journal.finish(job)
+
+    with ThreadPoolExecutor(max_workers=detect_workers) as detect_pool, \
+            ThreadPoolExecutor(max_workers=encode_workers) as encode_pool:
+        detect_jobs = {
+            detect_pool.submit(run_stage, 'detect', detect_transforms, video, shakiness, detect_scale, True, limit): video
+            for video in pending
+        }
+        encode_jobs = {}
+        for future in as_completed(detect_jobs):
+            video = detect_jobs[future]
+            try:
+                transforms_file = future.result()
+            except Exception as e:
+                journal.fail(jobs[video], e)
+                print(f"\nOcorreu um erro durante a análise de {video}: {e}")
+                continue
+            encode_jobs[encode_pool.submit(run_stage, 'encode', encode, video, transforms_file)] = video
+
+        for future in as_completed(encode_jobs):
+            video = encode_jobs[future]
+            try:
+                future.result()
+                print(f"\n--- Processo Finalizado para {video}! ---")
+            except Exception as e:
+                print(f"\nOcorreu um erro durante o processo de {video}: {e}")
 
 def main():
     parser = argparse.ArgumentParser(description="Estabiliza um vídeo.")
     parser.add_argument('--input', required=True, help='Caminho para o vídeo de entrada ou para um arquivo .txt com uma lista de vídeos.')
     parser.add_argument('--shakiness', type=int, default=5, help='Nível de agressividade da estabilização (1-10). Padrão: 5')
+    parser.add_argument('--smoothing', type=int, default=10, help='Número de frames usados para suavizar o movimento. Padrão: 10')
+    parser.add_argument('--detect-scale', type=float, default=1.0, help='Escala da passada de análise (ex: 0.5 analisa em metade da resolução). Padrão: 1.0')
+    parser.add_argument('--detect-workers', type=int, default=1, help='Análises simultâneas ao processar uma lista. Padrão: 1')
+    parser.add_argument('--encode-workers', type=int, default=1, help='Encodes simultâneos ao processar uma lista. Padrão: 1')
+    encode_settings.add_arguments(parser, presets=False)
+    job_journal.add_arguments(parser)
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    instrumentation.configure(args)
+
+    if not 0 < args.detect_scale <= 1:
+        print("ERRO: --detect-scale deve estar entre 0 (exclusivo) e 1.")
+        return
+    if args.detect_workers <= 0 or args.encode_workers <= 0:
+        print("ERRO: --detect-workers e --encode-workers devem ser maiores que zero.")
+        return
 
     if args.input.endswith('.txt'):
         with open(args.input, 'r') as f:
             videos = [line.strip() for line in f if line.strip()]
     else:
         videos = [args.input]
+    journal = job_journal.open_journal('stabilize', args)
+    bitrates = encode_settings.get_bitrate_search(args)
+
+    if len(videos) > 1:
+        stabilize_batch(videos, journal, args.shakiness, args.smoothing, args.detect_scale,
+                        args.detect_workers, args.encode_workers, bitrates)
+        journal.print_summary()
+        metrics.report("Estabilização")
+        return
 
+    params = get_job_params(args.shakiness, args.smoothing, args.detect_scale, bitrates)
     for video in videos:
-        try:
-            stabilize_video(video, args.shakiness)
-            print(f"\n--- Processo Finalizado para {video}! ---")
-        except Exception as e:
-            print(f"\nOcorreu um erro durante o processo de {video}: {e}")
+        with metrics.item(video) as item:
+            try:
+                with journal.job(video, get_output_path(video), params) as job:
+                    if job is None:
+                        item['status'] = 'skipped'
+                        continue
+                    job.meta = stabilize_video(video, args.shakiness, args.smoothing, args.detect_scale,
+                                               job.partial_path, bitrates)
+                print(f"\n--- Processo Finalizado para {video}! ---")
+            except Exception as e:
+                item['status'] = 'error'
+                print(f"\nOcorreu um erro durante o processo de {video}: {e}")
+    metrics.report("Estabilização")
 
 if __name__ == '__main__':
     main()
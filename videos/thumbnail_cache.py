@@ -0,0 +1,176 @@
+
+"""
+Cache de pôsteres e miniaturas para bibliotecas de vídeo.
+
+Cada vídeo é identificado pelo caminho, tamanho e data de modificação; o pôster
+(resolução total) e as miniaturas de todos os tamanhos pedidos são gerados com uma
+única decodificação e guardados no cache. Vídeos que não mudaram são pulados, então
+rodar novamente sobre a mesma biblioteca só gera o que falta.
+"""
+
+import argparse
+import hashlib
+import os
+import shutil
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+from ffmpeg_runner import JobLimit, run_command
+from instrumentation import metrics
+from media_cache import file_signature, get_cache_dir
+
+VIDEO_EXTENSIONS = ('.mp4', '.mkv', '.avi', '.mov')
+
+def get_entry_dir(video_path, offset, sizes):
+    """Diretório do cache com os pôsteres/miniaturas de um vídeo para estas opções."""
+    options = f"{offset}|{','.join(str(size) for size in sizes)}"
+    key = hashlib.sha1(f"{file_signature(video_path)}|{options}".encode('utf-8')).hexdigest()
+    return os.path.join(get_cache_dir('thumbnails'), key[:2], key)
+
+def get_thumbnail(video_path, size=None, offset=5.0, sizes=(320,)):
+    """
+    Caminho do pôster (size=None) ou da miniatura com a largura 'size' de um vídeo,
+    ou None se ainda não estiver no cache.
+    """
+    name = 'poster.jpg' if size is None else f'thumb_{size}.jpg'
+    path = os.path.join(get_entry_dir(video_path, offset, sizes), name)
+    return path if os.path.exists(path) else None
+
+def build_thumbnail_command(video_path, offset, sizes, output_dir):
+    """Monta um comando ffmpeg que gera o pôster e todas as miniaturas de uma só vez."""
+    outputs = ['[poster]'] + [f'[t{size}]' for size in sizes]
+    filter_graph = f"[0:v]split={len(outputs)}{''.join(outputs)}"
+    for size in sizes:
+        filter_graph += f";[t{size}]scale={size}:-2[t{size}out]"
+
+    command = [
+        'ffmpeg', '-v', 'error', '-y',
+        '-ss', str(offset),
+        '-i', video_path,
+        '-filter_complex', filter_graph,
+        '-map', '[poster]', '-frames:v', '1', '-q:v', '2', os.path.join(output_dir, 'poster.jpg'),
+    ]
+    for size in sizes:
+        command.extend(['-map', f'[t{size}out]', '-frames:v', '1', '-q:v', '3', os.path.join(output_dir, f'thumb_{size}.jpg')])
+    return command
+
+def generate_thumbnails(video_path, offset, sizes, limit=None):
+    """
+    Gera as imagens de um vídeo no cache, se ainda não existirem.
+    Retorna 'cached', 'generated' ou 'failed'. 'limit' é o JobLimit da execução.
+    """
+    entry_dir = get_entry_dir(video_path, offset, sizes)
+    if os.path.isdir(entry_dir):
+        return 'cached'
+
+    # Gera em um diretório temporário e só então move: o cache nunca fica pela metade
+    temp_dir = f"{entry_dir}.{os.getpid()}.tmp"
+    os.makedirs(temp_dir, exist_ok=True)
+    try:
+        # Vídeos mais curtos que o offset não geram imagem; tenta de novo no início
+        for seek in (offset, 0):
+            command = build_thumbnail_command(video_path, seek, sizes, temp_dir)
+            result = run_command(command, check=False, limit=limit)
+            if result.returncode == 0 and os.path.exists(os.path.join(temp_dir, 'poster.jpg')):
+                break
+        else:
+            print(f"  [ERRO] Falha ao gerar miniaturas de '{video_path}': "
+                  f"{result.log_text.strip()[-300:]}", file=sys.stderr)
+            return 'failed'
+        try:
+            os.replace(temp_dir, entry_dir)
+        except OSError:
+            # Outro processo gerou as mesmas imagens ao mesmo tempo
+            if not os.path.isdir(entry_dir):
+                raise
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return 'generated'
+
+def export_poster(video_path, offset, sizes):
+    """Coloca o pôster ao lado do vídeo ('video.jpg'), como o extrair-frame-5-segundos.bat."""
+    poster = get_thumbnail(video_path, None, offset, sizes)
+    if poster is None:
+        return
+    target = os.path.splitext(video_path)[0] + '.jpg'
+    if os.path.exists(target):
+        if os.path.samefile(poster, target):
+            return
+        os.remove(target)
+    try:
+        os.link(poster, target)
+    except OSError:
+        shutil.copy2(poster, target)
+
+def collect_videos(paths):
+    """Expande pastas (recursivamente) e listas .txt em uma lista de arquivos de vídeo."""
+    videos = []
+    for path in paths:
+        if path.lower().endswith('.txt') and os.path.isfile(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                videos.extend(collect_videos([line.strip() for line in f if line.strip()]))
+        elif os.path.isdir(path):
+            for dirpath, _, filenames in os.walk(path):
+                videos.extend(os.path.join(dirpath, name) for name in sorted(filenames)
+                              if name.lower().endswith(VIDEO_EXTENSIONS))
+        elif os.path.isfile(path):
+            videos.append(path)
+        else:
+            print(f"AVISO: Caminho não encontrado, pulando: {path}", file=sys.stderr)
+    return videos
+
+def update_cache(videos, offset, sizes, workers, export=False):
+    """Gera em paralelo as miniaturas que faltam e retorna a contagem por resultado."""
+    counts = {'cached': 0, 'generated': 0, 'failed': 0}
+    limit = JobLimit(workers)
+
+    def process(video_path):
+        with metrics.item(video_path) as item:
+            status = generate_thumbnails(video_path, offset, sizes, limit)
+            if status == 'generated':
+                print(f"  Gerado: {video_path}")
+            if export and status != 'failed':
+                export_poster(video_path, offset, sizes)
+            item['status'] = status
+            metrics.count(status)
+        return status
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for status in executor.map(process, videos):
+            counts[status] += 1
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Gera e mantém em cache pôsteres e miniaturas de vídeos, pulando os que não mudaram.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('paths', nargs='+', help="Pastas (varridas recursivamente), vídeos ou arquivos .txt com listas.")
+    parser.add_argument('--offset', type=float, default=5.0, help="Tempo (s) do frame usado. Padrão: 5.")
+    parser.add_argument('--sizes', default='320', help="Larguras das miniaturas, separadas por vírgula. Padrão: 320.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Vídeos processados em paralelo. Padrão: número de CPUs.")
+    parser.add_argument('--export', action='store_true', help="Também coloca o pôster ao lado de cada vídeo (video.jpg).")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure(args)
+
+    try:
+        sizes = sorted({int(size) for size in args.sizes.split(',') if size.strip()})
+    except ValueError:
+        print(f"ERRO: Tamanhos inválidos: '{args.sizes}'.", file=sys.stderr)
+        sys.exit(1)
+
+    with metrics.phase('scan'):
+        videos = collect_videos(args.paths)
+    if not videos:
+        print("Nenhum arquivo de vídeo encontrado.")
+        return
+
+    print(f"Verificando {len(videos)} vídeo(s) no cache de miniaturas...")
+    counts = update_cache(videos, args.offset, sizes, max(args.workers, 1), args.export)
+    print(f"Concluído: {counts['generated']} gerado(s), {counts['cached']} sem alteração, {counts['failed']} com erro.")
+    metrics.report("Cache de miniaturas")
+
+if __name__ == '__main__':
+    main()
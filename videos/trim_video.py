@@ -4,6 +4,13 @@ import os
 import subprocess
 import sys
 
+import instrumentation
+import proxy_video
+from ffmpeg_runner import run_command
+from instrumentation import metrics
+from keyframe_index import load_keyframe_index
+from smart_render import smart_cut
+
 def get_video_duration(filepath):
     """Usa ffprobe para obter a duração de um vídeo em segundos."""
     command = [
@@ -14,7 +21,7 @@ def get_video_duration(filepath):
         filepath
     ]
     try:
-        result = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
+        result = run_command(command, capture_output=True, text=True)
         return float(result.stdout)
     except FileNotFoundError:
         print("Erro: 'ffprobe' não foi encontrado. Verifique se o FFmpeg está instalado e no PATH do sistema.", file=sys.stderr)
@@ -26,9 +33,13 @@ def get_video_duration(filepath):
         print(f"Não foi possível obter a duração do vídeo: '{filepath}'. O arquivo está corrompido ou não é um vídeo?", file=sys.stderr)
         return None
 
-def trim_video(video_path, start_trim, end_trim, suffix):
+def trim_video(video_path, start_trim, end_trim, suffix, use_index=True, smart=False, proxy_path=None):
     """
     Corta um vídeo usando ffmpeg sem re-renderizar.
+    Com use_index=True o início é alinhado ao keyframe onde o corte realmente acontece.
+    Com smart=True o corte é exato: apenas os GOPs das bordas são re-encodados.
+    Com proxy_path (modo --preview), os mesmos pontos de corte são aplicados à proxy
+    do vídeo e o resultado é salvo como 'video_cortado_preview.mp4'.
     """
     print(f"\n--- Processando: {os.path.basename(video_path)} ---")
 
@@ -36,7 +47,22 @@ def trim_video(video_path, start_trim, end_trim, suffix):
     if original_duration is None:
         return # Pula para o próximo arquivo se a duração não puder ser obtida
 
-    new_duration = original_duration - start_trim - end_trim
+    end_time = original_duration - end_trim
+
+    if smart and proxy_path is None:
+        trim_video_smart(video_path, start_trim, end_time, suffix)
+        return
+
+    # Sem re-renderizar, o vídeo só pode começar em um keyframe (do original, também na prévia)
+    if use_index and start_trim > 0 and not smart:
+        keyframes = load_keyframe_index(video_path)
+        if keyframes is not None:
+            keyframe_start = keyframes.keyframe_at_or_before(start_trim)
+            if abs(keyframe_start - start_trim) > 0.001:
+                print(f"Início ajustado para o keyframe em {keyframe_start:.3f}s (pedido: {start_trim:.3f}s).")
+            start_trim = keyframe_start
+
+    new_duration = end_time - start_trim
 
     if new_duration <= 0:
         print(f"Erro: O tempo de corte ({start_trim + end_trim:.2f}s) é maior ou igual à duração do vídeo ({original_duration:.2f}s).")
@@ -46,13 +72,18 @@ def trim_video(video_path, start_trim, end_trim, suffix):
     # Constrói o nome do arquivo de saída
     base, ext = os.path.splitext(video_path)
     output_path = f"{base}{suffix}{ext}"
+    source_path = video_path
+    if proxy_path:
+        # Todos os frames da proxy são keyframes: o corte cai exatamente no mesmo frame
+        output_path = proxy_video.get_preview_path(output_path)
+        source_path = proxy_path
 
     # Comando ffmpeg para corte rápido
     command = [
         'ffmpeg',
         '-y',  # Sobrescreve o arquivo de saída se ele já existir
         '-ss', str(start_trim),
-        '-i', video_path,
+        '-i', source_path,
         '-t', str(new_duration),
         '-c', 'copy', # Copia os codecs de áudio e vídeo sem re-renderizar
         output_path
@@ -64,13 +95,11 @@ def trim_video(video_path, start_trim, end_trim, suffix):
     print("Executando ffmpeg...")
 
     try:
-        # Usamos Popen para poder mostrar a saída do ffmpeg em tempo real se quisermos,
-        # mas por enquanto vamos apenas esperar a conclusão.
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        stdout, stderr = process.communicate()
+        # A saída do ffmpeg fica no log do job e só é mostrada em caso de erro
+        result = run_command(command, check=False)
 
-        if process.returncode != 0:
-            print(f"Erro ao executar ffmpeg: {stderr.decode('utf-8')}", file=sys.stderr)
+        if result.returncode != 0:
+            print(f"Erro ao executar ffmpeg: {result.log_text}", file=sys.stderr)
         else:
             final_duration = get_video_duration(output_path)
             print(f"Sucesso! Vídeo salvo em: {os.path.basename(output_path)}")
@@ -82,6 +111,29 @@ def trim_video(video_path, start_trim, end_trim, suffix):
     except Exception as e:
         print(f"Ocorreu um erro inesperado: {e}", file=sys.stderr)
 
+def trim_video_smart(video_path, start_time, end_time, suffix):
+    """
+    Corta um vídeo com precisão de frame re-encodando apenas os GOPs das bordas.
+    """
+    if end_time - start_time <= 0:
+        print("Erro: O tempo de corte é maior ou igual à duração do vídeo.")
+        print("O vídeo não foi modificado.")
+        return
+
+    keyframes = load_keyframe_index(video_path)
+    if keyframes is None:
+        print("Erro: O smart render precisa do índice de keyframes do vídeo.", file=sys.stderr)
+        return
+
+    base, ext = os.path.splitext(video_path)
+    output_path = f"{base}{suffix}{ext}"
+
+    print(f"Cortando com smart render de {start_time:.3f}s a {end_time:.3f}s...")
+    if smart_cut(video_path, start_time, end_time, output_path, keyframes):
+        print(f"Sucesso! Vídeo salvo em: {os.path.basename(output_path)}")
+        final_duration = get_video_duration(output_path)
+        if final_duration:
+            print(f"Duração final confirmada: {final_duration:.2f} segundos")
 
 def main():
     parser = argparse.ArgumentParser(
@@ -111,8 +163,21 @@ def main():
         default='_cortado',
         help="Sufixo a ser adicionado ao nome do arquivo de saída. Padrão: '_cortado'"
     )
+    parser.add_argument(
+        '--no-index',
+        action='store_true',
+        help="Não consulta o índice de keyframes para alinhar o início do corte."
+    )
+    parser.add_argument(
+        '--smart',
+        action='store_true',
+        help="Corte com precisão de frame: re-encoda só os GOPs das bordas e copia o restante."
+    )
+    proxy_video.add_arguments(parser, window=False)
+    instrumentation.add_arguments(parser)
 
     args = parser.parse_args()
+    instrumentation.configure(args)
 
     video_files = []
     if args.input.lower().endswith('.txt'):
@@ -141,8 +206,17 @@ def main():
         
     print(f"Total de {len(video_files)} vídeo(s) para processar.")
 
+    proxies = {}
+    if args.preview:
+        proxies = proxy_video.ensure_proxies(video_files, args.proxy_height)
+
     for video_path in video_files:
-        trim_video(video_path, args.start, args.end, args.suffix)
+        if args.preview and proxies[video_path] is None:
+            continue
+        with metrics.item(video_path):
+            trim_video(video_path, args.start, args.end, args.suffix, use_index=not args.no_index, smart=args.smart,
+                       proxy_path=proxies.get(video_path))
+    metrics.report("Corte de vídeos")
 
 if __name__ == "__main__":
     main()
@@ -2,48 +2,169 @@
 import subprocess
 import os
 import argparse
+import shutil
+import tempfile
 
-def run_ffmpeg_command(command, description):
-    """Executa um comando ffmpeg e imprime o status."""
-    print(f"--- {description} ---")
-    print(f"Executando comando: {' '.join(command)}")
+import encode_settings
+import instrumentation
+import job_journal
+from ffmpeg_runner import ERROR_TAIL_LINES, run_command, run_ffmpeg_command, run_many
+from instrumentation import metrics
+from keyframe_index import load_keyframe_index
+
+# Preset do libx264 usado sem --preset
+DEFAULT_PRESET = 'slow'
+
+def probe_video_stream(video_path):
+    """
+    Usa ffprobe para contar os frames (pacotes) do primeiro stream de vídeo e obter
+    a duração do arquivo. Retorna (frames, duração) ou (None, None) em caso de erro.
+    """
+    command = [
+        'ffprobe', '-v', 'error',
+        '-select_streams', 'v:0',
+        '-count_packets',
+        '-show_entries', 'stream=nb_read_packets:format=duration',
+        '-of', 'default=noprint_wrappers=1',
+        video_path
+    ]
     try:
-        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, universal_newlines=True, encoding='utf-8', errors='replace')
-        for line in process.stdout:
-            print(line, end='')
-        process.wait()
-        if process.returncode != 0:
-            raise subprocess.CalledProcessError(process.returncode, command)
-        print(f"Sucesso: {description} concluído.")
-    except subprocess.CalledProcessError as e:
-        print(f"ERRO ao executar o comando: {' '.join(command)}")
-        raise
-    print("-" * (len(description) + 6) + "\n")
-
-def upscale_video(input_video, resolution, bitrate):
-    """Faz o upscale do vídeo."""
-    output_video = os.path.splitext(input_video)[0] + f'_upscaled_{resolution.replace(":", "x")}.mp4'
-
-    if os.path.exists(output_video):
-        if input(f"O vídeo final em {resolution} '{output_video}' já existe. Deseja recriá-lo? (s/n): ").lower() != 's':
-            print(f"Usando o vídeo {resolution} existente.")
-            return
-        os.remove(output_video)
+        result = run_command(command, capture_output=True, text=True)
+        values = dict(line.split('=', 1) for line in result.stdout.splitlines() if '=' in line)
+        return int(values['nb_read_packets']), float(values['duration'])
+    except (subprocess.CalledProcessError, FileNotFoundError, KeyError, ValueError) as e:
+        print(f"Erro ao analisar {video_path}: {e}")
+        return None, None
 
+def build_scale_filter(resolution):
+    """Monta o filtro de redimensionamento (lanczos) para a resolução 'L:A'."""
+    return f'scale={resolution}:flags=lanczos'
+
+def get_output_path(input_video, resolution):
+    """Caminho do vídeo na resolução 'L:A' gerado a partir de input_video."""
+    return os.path.splitext(input_video)[0] + f'_upscaled_{resolution.replace(":", "x")}.mp4'
+
+def build_upscale_command(input_video, output_video, resolution, bitrate, preset=DEFAULT_PRESET):
+    """Monta o comando ffmpeg do upscale (também usado em cada parte do modo --chunks)."""
     command = [
         'ffmpeg', '-i', input_video,
-        '-vf', f'scale={resolution}:flags=lanczos',
-        '-c:v', 'libx264', '-preset', 'slow', '-b:v', bitrate,
-        '-pix_fmt', 'yuv420p', output_video
+        '-vf', build_scale_filter(resolution),
+        '-c:v', 'libx264',
     ]
+    if preset:
+        command.extend(['-preset', preset])
+    command.extend(['-b:v', bitrate, '-pix_fmt', 'yuv420p', output_video])
+    return command
+
+def upscale_video(input_video, resolution, bitrate, output_video=None, preset=DEFAULT_PRESET):
+    """Faz o upscale do vídeo, gravando em output_video (padrão: video_upscaled_LxA.mp4)."""
+    output_video = output_video or get_output_path(input_video, resolution)
+    command = build_upscale_command(input_video, output_video, resolution, bitrate, preset)
     run_ffmpeg_command(command, f"Convertendo para {resolution} ({output_video})")
 
+def choose_chunk_boundaries(keyframes, duration, num_chunks):
+    """Escolhe os keyframes mais próximos de divisões iguais do vídeo em num_chunks partes."""
+    boundaries = set()
+    for i in range(1, num_chunks):
+        keyframe = keyframes.nearest_keyframe(duration * i / num_chunks)
+        if 0 < keyframe < duration:
+            boundaries.add(keyframe)
+    return sorted(boundaries)
+
+def upscale_video_chunked(input_video, resolution, bitrate, num_chunks, workers, output_video=None,
+                          preset=DEFAULT_PRESET):
+    """
+    Faz o upscale dividindo o vídeo em partes nos keyframes, encodando as partes em
+    paralelo com configurações idênticas e juntando o resultado sem re-encodar.
+    Como cada parte começa em um keyframe e é encodada de forma independente, as
+    junções não dependem de frames de outras partes. Ao final, confere se o número de
+    frames e a duração batem com o original.
+    """
+    output_video = output_video or get_output_path(input_video, resolution)
+
+    source_frames, source_duration = probe_video_stream(input_video)
+    keyframes = load_keyframe_index(input_video)
+    if source_frames is None or keyframes is None:
+        print("Não foi possível analisar o vídeo; usando o upscale em uma única parte.")
+        upscale_video(input_video, resolution, bitrate, output_video, preset)
+        return
+
+    boundaries = choose_chunk_boundaries(keyframes, source_duration, num_chunks)
+    temp_dir = tempfile.mkdtemp(prefix='.upscale_chunks_', dir=os.path.dirname(os.path.abspath(output_video)))
+    try:
+        # 1. Divide o vídeo nos keyframes, sem re-encodar
+        command_split = [
+            'ffmpeg', '-i', input_video,
+            '-map', '0:v:0', '-c', 'copy',
+            '-f', 'segment', '-reset_timestamps', '1',
+        ]
+        if boundaries:
+            # Uma pequena folga garante que o keyframe exatamente no ponto de corte seja usado
+            command_split.extend(['-segment_times', ','.join(str(max(t - 0.001, 0)) for t in boundaries)])
+        command_split.append(os.path.join(temp_dir, 'source_%03d.mkv'))
+        run_ffmpeg_command(command_split, f"Dividindo {input_video} em {len(boundaries) + 1} partes", quiet=True)
+
+        chunk_sources = sorted(f for f in os.listdir(temp_dir) if f.startswith('source_'))
+        chunk_outputs = [os.path.join(temp_dir, f.replace('source_', 'upscaled_')) for f in chunk_sources]
+
+        # 2. Upscale de cada parte em paralelo, com os mesmos parâmetros de encoder
+        commands = [
+            build_upscale_command(os.path.join(temp_dir, chunk_source), chunk_output, resolution, bitrate, preset)
+            for chunk_source, chunk_output in zip(chunk_sources, chunk_outputs)
+        ]
+        print(f"--- Convertendo {len(commands)} partes para {resolution} ({workers} por vez) ---")
+        results = run_many(commands, limit=workers)
+        failed = [index for index, result in enumerate(results)
+                  if isinstance(result, Exception) or result.returncode != 0]
+        for index in failed:
+            result = results[index]
+            print(f"ERRO na parte {index + 1}/{len(commands)}:")
+            print(result if isinstance(result, Exception) else '\n'.join(result.log[-ERROR_TAIL_LINES:]))
+        if failed:
+            raise RuntimeError(f"{len(failed)} parte(s) falharam no upscale.")
+        print(f"Sucesso: {len(commands)} partes convertidas.")
+
+        # 3. Junta as partes sem re-encodar e copia o áudio do original
+        list_file = os.path.join(temp_dir, 'chunks.txt')
+        with open(list_file, 'w', encoding='utf-8') as f:
+            for chunk_output in chunk_outputs:
+                f.write(f"file '{chunk_output.replace(os.sep, '/')}'\n")
+        command_concat = [
+            'ffmpeg', '-f', 'concat', '-safe', '0', '-i', list_file,
+            '-i', input_video,
+            '-map', '0:v', '-map', '1:a?',
+            '-c', 'copy', output_video
+        ]
+        run_ffmpeg_command(command_concat, f"Juntando as partes ({output_video})", quiet=True)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    # 4. Verificação: mesmo número de frames e duração equivalente ao original
+    output_frames, output_duration = probe_video_stream(output_video)
+    if output_frames is None:
+        return
+    frame_tolerance = source_duration / source_frames if source_frames else 0
+    if output_frames != source_frames or abs(output_duration - source_duration) > frame_tolerance + 0.05:
+        print(f"AVISO: O resultado tem {output_frames} frames e {output_duration:.3f}s; "
+              f"o original tem {source_frames} frames e {source_duration:.3f}s.")
+    else:
+        print(f"Verificado: {output_frames} frames e {output_duration:.3f}s, iguais ao original.")
+
 def main():
     parser = argparse.ArgumentParser(description="Faz o upscale de um vídeo ou de uma lista de vídeos contida em um arquivo .txt.")
     parser.add_argument('--input', required=True, help='Caminho para o vídeo de entrada ou para o arquivo .txt com a lista de vídeos.')
     parser.add_argument('--resolution', type=str, default='3840:2160', help='Resolução de saída (ex: 3840:2160 para 4K). Padrão: 3840:2160')
     parser.add_argument('--bitrate', type=str, default='60M', help='Bitrate do vídeo (ex: 60M). Padrão: 60M')
+    parser.add_argument('--chunks', type=int, default=0, help='Divide o vídeo em N partes (nos keyframes) encodadas em paralelo. Padrão: 0 (desativado)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Partes encodadas simultaneamente no modo --chunks. Padrão: número de CPUs')
+    encode_settings.add_arguments(parser, DEFAULT_PRESET)
+    job_journal.add_arguments(parser)
+    instrumentation.add_arguments(parser)
     args = parser.parse_args()
+    instrumentation.configure(args)
+    journal = job_journal.open_journal('upscale', args)
+    presets = encode_settings.get_preset_selector(args)
+    bitrates = encode_settings.get_bitrate_search(args)
 
     videos = []
     try:
@@ -54,18 +175,34 @@ def main():
         else:
             videos = [args.input]
 
+        presets.start_batch([video_path for video_path in videos if os.path.exists(video_path)])
         for video_path in videos:
             if os.path.exists(video_path):
                 print(f"Processando vídeo: {video_path}")
-                upscale_video(video_path, args.resolution, args.bitrate)
+                params = {'resolution': args.resolution, 'bitrate': args.bitrate, **presets.job_params(),
+                          **(bitrates.job_params() if bitrates else {})}
+                with metrics.item(video_path), \
+                        journal.job(video_path, get_output_path(video_path, args.resolution), params) as job:
+                    if job is None:
+                        presets.skip(video_path)
+                        continue
+                    preset, bitrate, job.meta = encode_settings.tune(video_path, build_upscale_command(
+                        video_path, job.partial_path, args.resolution, args.bitrate), presets, bitrates)
+                    if args.chunks > 1:
+                        upscale_video_chunked(video_path, args.resolution, bitrate, args.chunks,
+                                              max(args.workers, 1), job.partial_path, preset)
+                    else:
+                        upscale_video(video_path, args.resolution, bitrate, job.partial_path, preset)
             else:
                 print(f"AVISO: Arquivo não encontrado, pulando: {video_path}")
 
         print(f"\n--- Processo Finalizado! ---")
+        journal.print_summary()
     except FileNotFoundError:
         print(f"ERRO: O arquivo de entrada '{args.input}' não foi encontrado.")
     except Exception as e:
         print(f"\nOcorreu um erro durante o processo: {e}")
+    metrics.report("Upscale")
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,569 @@
+
+"""
+Modo daemon: vigia pastas de ingestão e processa cada arquivo novo assim que ele
+termina de ser copiado, em vez de varrer as árvores inteiras periodicamente.
+
+- As mudanças chegam pelo inotify (Linux, via ctypes). Em outros sistemas, ou com
+  --polling, as pastas são varridas a cada --poll segundos e comparadas com a
+  varredura anterior.
+- Um arquivo só entra na fila depois que o tamanho e a data de modificação ficam
+  estáveis por 'stable_seconds': cópias em andamento esperam terminar.
+- A fila é um banco SQLite no cache (UTILITARIOS_CACHE/watch/queue.sqlite). Jobs
+  interrompidos voltam para a fila quando o daemon reinicia, e arquivos já
+  processados (mesmo caminho, tamanho e data) não são processados de novo.
+- Os jobs rodam em um pool de 'workers' threads. As operações de cada arquivo rodam
+  em sequência, na ordem da configuração, e cada uma recebe o caminho deixado pela
+  anterior (rename_media e organize_directory mudam o caminho). Depois de cada
+  operação a fila guarda o caminho atual e a próxima operação, e uma nova tentativa
+  continua de onde o job parou.
+
+Configuração (JSON):
+{
+  "workers": 2,
+  "stable_seconds": 10,
+  "watch": [
+    {"path": "/ingest/cartoes", "recursive": true,
+     "operations": ["rename_media", "organize_directory",
+                    {"name": "thumbnails", "sizes": [320, 640]},
+                    {"name": "denoise", "strength": 4}]}
+  ]
+}
+
+Operações disponíveis: rename_media, organize_directory, thumbnails (offset, sizes),
+denoise (strength, bitrate) e upscale (resolution, bitrate). Os arquivos gerados ou
+movidos pelo próprio daemon são registrados na fila e não disparam novos jobs.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import json
+import os
+import select
+import signal
+import sqlite3
+import struct
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import instrumentation
+import job_journal
+from instrumentation import metrics
+from media_cache import file_signature, get_cache_dir
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'fotos')))
+from subfolder_photos_and_videos import IMAGE_EXTENSIONS, VIDEO_EXTENSIONS, organize_file
+
+DEFAULT_WORKERS = 2
+DEFAULT_STABLE_SECONDS = 10.0
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Tentativas de um job com erro antes de ele ficar como 'failed', e a espera (s) antes
+# de cada nova tentativa (multiplicada pelo número de tentativas já feitas)
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 30.0
+
+# Constantes de linux/inotify.h
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+INOTIFY_EVENT = struct.Struct('iIII')
+
+def log(message):
+    print(f"[{time.strftime('%H:%M:%S')}] {message}", flush=True)
+
+def is_candidate(path):
+    """Ignora arquivos ocultos e saídas temporárias das ferramentas ('.partial', '.tmp')."""
+    name = os.path.basename(path)
+    return not name.startswith('.') and '.partial.' not in name and not name.endswith('.tmp')
+
+def scan_tree(root, recursive):
+    """Arquivos de uma pasta (e das subpastas, se recursive), sem entrar em pastas ocultas."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')] if recursive else []
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if is_candidate(path):
+                yield path
+
+class InotifyWatcher:
+    """Recebe do inotify os arquivos criados, alterados ou movidos para as pastas vigiadas."""
+
+    def __init__(self, roots):
+        library = ctypes.util.find_library('c')
+        if library is None:
+            raise OSError("libc não encontrada.")
+        self._libc = ctypes.CDLL(library, use_errno=True)
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 falhou")
+        self.roots = roots
+        self._watches = {}
+        for root, recursive in roots:
+            self._add_tree(root, recursive)
+
+    def _add_watch(self, path, recursive):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK)
+        if wd < 0:
+            # Normalmente o limite fs.inotify.max_user_watches
+            log(f"AVISO: Não foi possível vigiar '{path}': {os.strerror(ctypes.get_errno())}")
+            return
+        self._watches[wd] = (path, recursive)
+
+    def _add_tree(self, root, recursive):
+        self._add_watch(root, recursive)
+        if recursive:
+            for dirpath, dirnames, _ in os.walk(root):
+                dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+                for name in dirnames:
+                    self._add_watch(os.path.join(dirpath, name), True)
+
+    def poll(self, timeout):
+        """Espera até 'timeout' segundos e retorna os arquivos que mudaram."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        changed = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+            name = os.fsdecode(data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b'\0'))
+            offset += INOTIFY_EVENT.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                # Eventos perdidos: varre tudo de novo
+                log("AVISO: Fila do inotify cheia; varrendo as pastas novamente.")
+                for root, recursive in self.roots:
+                    changed.extend(scan_tree(root, recursive))
+                continue
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                continue
+            if wd not in self._watches or not name:
+                continue
+            directory, recursive = self._watches[wd]
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if recursive and mask & (IN_CREATE | IN_MOVED_TO) and not name.startswith('.'):
+                    # Arquivos podem ter sido criados na pasta nova antes de ela ser vigiada
+                    self._add_tree(path, True)
+                    changed.extend(scan_tree(path, True))
+            elif is_candidate(path):
+                changed.append(path)
+        return changed
+
+class PollingWatcher:
+    """Alternativa ao inotify: varre as pastas a cada chamada e compara com a varredura anterior."""
+
+    def __init__(self, roots):
+        self.roots = roots
+        self._snapshot = self._scan()
+
+    def _scan(self):
+        snapshot = {}
+        for root, recursive in self.roots:
+            for path in scan_tree(root, recursive):
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+        return snapshot
+
+    def poll(self, timeout):
+        time.sleep(timeout)
+        snapshot = self._scan()
+        changed = [path for path, state in snapshot.items() if self._snapshot.get(path) != state]
+        self._snapshot = snapshot
+        return changed
+
+def create_watcher(roots, force_polling=False):
+    if not force_polling and sys.platform.startswith('linux'):
+        try:
+            return InotifyWatcher(roots)
+        except (OSError, AttributeError) as e:
+            log(f"AVISO: inotify indisponível ({e}); usando varredura periódica.")
+    return PollingWatcher(roots)
+
+class StabilityTracker:
+    """Segura os arquivos até que o tamanho e a data de modificação parem de mudar."""
+
+    def __init__(self, stable_seconds):
+        self.stable_seconds = stable_seconds
+        self.pending = {}
+
+    def touch(self, path):
+        """Registra uma mudança no arquivo, reiniciando a espera."""
+        self.pending[path] = (None, time.monotonic())
+
+    def ready(self):
+        """Retorna (e deixa de acompanhar) os arquivos estáveis há pelo menos stable_seconds."""
+        now = time.monotonic()
+        ready = []
+        for path, (last_state, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                del self.pending[path]
+                continue
+            state = (stat.st_size, stat.st_mtime_ns)
+            if state != last_state:
+                self.pending[path] = (state, now)
+            elif now - since >= self.stable_seconds:
+                del self.pending[path]
+                ready.append(path)
+        return ready
+
+class JobQueue:
+    """
+    Fila persistente em SQLite, com um registro por arquivo (caminho + assinatura).
+    Status: 'pending', 'running', 'done', 'failed', e 'output' para os arquivos gerados
+    ou movidos pelo daemon, que não devem ser processados.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or os.path.join(get_cache_dir('watch'), 'queue.sqlite')
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                path TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                root TEXT,
+                operations TEXT,
+                current_path TEXT,
+                next_operation INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                not_before REAL NOT NULL DEFAULT 0,
+                updated REAL NOT NULL,
+                UNIQUE (path, signature)
+            );
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, id);
+        ''')
+        # Filas criadas antes do progresso por operação
+        columns = {row[1] for row in self._db.execute('PRAGMA table_info(jobs)')}
+        if 'current_path' not in columns:
+            self._db.execute('ALTER TABLE jobs ADD COLUMN current_path TEXT')
+            self._db.execute('ALTER TABLE jobs ADD COLUMN next_operation INTEGER NOT NULL DEFAULT 0')
+        # Jobs que estavam rodando quando o daemon parou voltam para a fila
+        recovered = self._db.execute("UPDATE jobs SET status = 'pending' WHERE status = 'running'").rowcount
+        if recovered:
+            log(f"{recovered} job(s) interrompido(s) voltaram para a fila.")
+
+    def _insert(self, path, status, root=None, operations=None):
+        try:
+            signature = file_signature(path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            cursor = self._db.execute(
+                'INSERT OR IGNORE INTO jobs (path, signature, root, operations, status, updated) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                (path, signature, root, json.dumps(operations) if operations else None, status, time.time()))
+        return cursor.rowcount > 0
+
+    def add(self, path, root, operations):
+        """Coloca o arquivo na fila. Retorna False se ele já foi visto (com o mesmo conteúdo)."""
+        return self._insert(path, 'pending', root, operations)
+
+    def mark_output(self, path):
+        """Registra um arquivo gerado ou movido pelo daemon, para que ele não vire um job."""
+        if not self._insert(path, 'output'):
+            with self._lock:
+                self._db.execute("UPDATE jobs SET status = 'output', updated = ? "
+                                 "WHERE path = ? AND status = 'pending'", (time.time(), path))
+
+    def is_known(self, path):
+        try:
+            signature = file_signature(path)
+        except FileNotFoundError:
+            return True
+        with self._lock:
+            row = self._db.execute('SELECT 1 FROM jobs WHERE path = ? AND signature = ?', (path, signature)).fetchone()
+        return row is not None
+
+    def claim(self):
+        """Pega o próximo job pendente (marcando-o como 'running'), ou None."""
+        with self._lock:
+            row = self._db.execute("SELECT id, path, root, operations, current_path, next_operation FROM jobs "
+                                   "WHERE status = 'pending' AND not_before <= ? ORDER BY id LIMIT 1",
+                                   (time.time(),)).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated = ? WHERE id = ?",
+                             (time.time(), row[0]))
+        return {'id': row[0], 'path': row[1], 'root': row[2], 'operations': json.loads(row[3]),
+                'current_path': row[4] or row[1], 'next_operation': row[5]}
+
+    def advance(self, job_id, current_path, next_operation):
+        """Guarda o progresso do job: o caminho atual do arquivo e a próxima operação."""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET current_path = ?, next_operation = ?, updated = ? WHERE id = ?",
+                             (current_path, next_operation, time.time(), job_id))
+
+    def complete(self, job_id):
+        with self._lock:
+            self._db.execute("UPDATE jobs SET status = 'done', error = NULL, updated = ? WHERE id = ?",
+                             (time.time(), job_id))
+
+    def fail(self, job_id, error, retry=True):
+        """
+        Registra o erro. O job volta para a fila (depois de uma espera crescente) até
+        esgotar as MAX_ATTEMPTS tentativas.
+        """
+        now = time.time()
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET status = CASE WHEN ? AND attempts < ? THEN 'pending' ELSE 'failed' END, "
+                "not_before = ? + ? * attempts, error = ?, updated = ? WHERE id = ?",
+                (retry, MAX_ATTEMPTS, now, RETRY_DELAY, str(error)[-500:], now, job_id))
+
+    def counts(self):
+        with self._lock:
+            return dict(self._db.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+
+# --- Operações ------------------------------------------------------------------
+# Cada operação recebe o caminho atual do arquivo, os parâmetros da configuração e o
+# daemon, e retorna (novo caminho, [arquivos gerados]).
+
+def run_rename_media(path, params, root, daemon):
+    # Importado aqui porque depende de bibliotecas opcionais (Pillow, tinytag, OpenCV)
+    from rename_media import rename_media_file, sanitize_folder_name
+    event_name = (sanitize_folder_name(os.path.basename(os.path.dirname(path)))
+                  or sanitize_folder_name(os.path.basename(root)))
+    if not event_name:
+        log(f"AVISO: Sem nome de evento para '{path}'; o arquivo não será renomeado.")
+        return path, []
+    return rename_media_file(path, event_name) or path, []
+
+def run_organize_directory(path, params, root, daemon):
+    if os.path.basename(os.path.dirname(path)) in ('fotos', 'videos'):
+        # Já está organizado
+        return path, []
+    return organize_file(path) or path, []
+
+def run_thumbnails(path, params, root, daemon):
+    from thumbnail_cache import generate_thumbnails
+    status = generate_thumbnails(path, float(params.get('offset', 5.0)), tuple(params.get('sizes', [320])))
+    if status == 'failed':
+        raise RuntimeError("Falha ao gerar as miniaturas.")
+    return path, []
+
+def run_denoise(path, params, root, daemon):
+    from denoise_video import denoise_video, get_output_path
+    strength = int(params.get('strength', 4))
+    bitrate = params.get('bitrate')
+    output_path = get_output_path(path)
+    with daemon.get_journal('denoise').job(path, output_path, {'strength': strength, 'bitrate': bitrate}) as job:
+        if job is not None:
+            denoise_video(path, strength, bitrate, job.partial_path)
+    return path, [output_path]
+
+def run_upscale(path, params, root, daemon):
+    from upscale_video import get_output_path, upscale_video
+    resolution = params.get('resolution', '3840:2160')
+    bitrate = params.get('bitrate', '60M')
+    output_path = get_output_path(path, resolution)
+    with daemon.get_journal('upscale').job(path, output_path, {'resolution': resolution, 'bitrate': bitrate}) as job:
+        if job is not None:
+            upscale_video(path, resolution, bitrate, job.partial_path)
+    return path, [output_path]
+
+# Nome -> (extensões aceitas, função)
+OPERATIONS = {
+    'rename_media': (IMAGE_EXTENSIONS + VIDEO_EXTENSIONS, run_rename_media),
+    'organize_directory': (IMAGE_EXTENSIONS + VIDEO_EXTENSIONS, run_organize_directory),
+    'thumbnails': (VIDEO_EXTENSIONS, run_thumbnails),
+    'denoise': (VIDEO_EXTENSIONS, run_denoise),
+    'upscale': (VIDEO_EXTENSIONS, run_upscale),
+}
+
+def load_config(config_path):
+    """Lê e valida a configuração, normalizando as operações para dicionários {'name': ...}."""
+    with open(config_path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    watches = config.get('watch') or []
+    if not watches:
+        raise ValueError("A configuração não tem nenhuma pasta em 'watch'.")
+    for watch in watches:
+        if not os.path.isdir(watch.get('path', '')):
+            raise ValueError(f"Pasta não encontrada: '{watch.get('path')}'.")
+        watch['path'] = os.path.abspath(watch['path'])
+        watch['recursive'] = bool(watch.get('recursive', True))
+        operations = [{'name': op} if isinstance(op, str) else dict(op) for op in watch.get('operations', [])]
+        for operation in operations:
+            if operation.get('name') not in OPERATIONS:
+                raise ValueError(f"Operação desconhecida: '{operation.get('name')}'. "
+                                 f"Disponíveis: {', '.join(OPERATIONS)}.")
+        if not operations:
+            raise ValueError(f"Nenhuma operação configurada para '{watch['path']}'.")
+        watch['operations'] = operations
+    return config
+
+class WatchDaemon:
+    """Liga o watcher, a espera por arquivos estáveis, a fila persistente e o pool de workers."""
+
+    def __init__(self, config, args):
+        self.watches = config['watch']
+        self.workers = max(1, args.workers or int(config.get('workers', DEFAULT_WORKERS)))
+        stable_seconds = args.stable_seconds if args.stable_seconds is not None else \
+            float(config.get('stable_seconds', DEFAULT_STABLE_SECONDS))
+        self.poll_interval = args.poll
+        self.args = args
+        self.queue = JobQueue(args.queue)
+        self.tracker = StabilityTracker(stable_seconds)
+        self.stopping = False
+        self._journals = {}
+        self._journals_lock = threading.Lock()
+
+    def get_journal(self, tool):
+        with self._journals_lock:
+            if tool not in self._journals:
+                self._journals[tool] = job_journal.open_journal(tool, self.args)
+            return self._journals[tool]
+
+    def find_watch(self, path):
+        """Configuração da pasta vigiada que contém o arquivo (a mais específica), ou None."""
+        matches = [watch for watch in self.watches
+                   if (os.path.dirname(path) == watch['path'] or
+                       (watch['recursive'] and path.startswith(watch['path'] + os.sep)))]
+        return max(matches, key=lambda watch: len(watch['path']), default=None)
+
+    def enqueue(self, path):
+        watch = self.find_watch(path)
+        if watch is None:
+            return
+        extension = os.path.splitext(path)[1].lower()
+        if not any(extension in OPERATIONS[op['name']][0] for op in watch['operations']):
+            return
+        if self.queue.add(path, watch['path'], watch['operations']):
+            metrics.count('queued')
+            log(f"Na fila: {path}")
+
+    def process_job(self, job):
+        path = job['current_path']
+        with metrics.item(job['path']) as item:
+            if not os.path.exists(path):
+                item['status'] = 'missing'
+                self.queue.fail(job['id'], "O arquivo não existe mais.", retry=False)
+                log(f"AVISO: '{path}' não existe mais; job descartado.")
+                return
+            try:
+                # Uma nova tentativa continua da operação que falhou, com o caminho atual
+                for index in range(job['next_operation'], len(job['operations'])):
+                    operation = job['operations'][index]
+                    extensions, function = OPERATIONS[operation['name']]
+                    if os.path.splitext(path)[1].lower() in extensions:
+                        with metrics.phase(operation['name']):
+                            path, outputs = function(path, operation, job['root'], self)
+                        for output in [path] + outputs:
+                            if output != job['path'] and os.path.exists(output):
+                                self.queue.mark_output(os.path.abspath(output))
+                    self.queue.advance(job['id'], path, index + 1)
+                self.queue.complete(job['id'])
+                item['status'] = 'done'
+                log(f"Concluído: {job['path']}" + (f" -> {path}" if path != job['path'] else ''))
+            except Exception as e:
+                item['status'] = 'error'
+                self.queue.fail(job['id'], e)
+                log(f"ERRO em '{job['path']}': {e}")
+
+    def initial_scan(self, skip_existing):
+        """Procura arquivos que chegaram com o daemon parado (ou os registra, com skip_existing)."""
+        for watch in self.watches:
+            for path in scan_tree(watch['path'], watch['recursive']):
+                if self.queue.is_known(path):
+                    continue
+                if skip_existing:
+                    self.queue.mark_output(path)
+                else:
+                    self.tracker.touch(path)
+
+    def stop(self, *_):
+        self.stopping = True
+
+    def run(self, once=False, force_polling=False, skip_existing=False):
+        """
+        Vigia as pastas até receber SIGTERM/Ctrl+C (ou, com once=True, até a fila
+        esvaziar). Os jobs em andamento terminam antes de o daemon sair.
+        """
+        self.initial_scan(skip_existing)
+        watcher = create_watcher([(watch['path'], watch['recursive']) for watch in self.watches], force_polling)
+        log(f"Vigiando {len(self.watches)} pasta(s) com {watcher.__class__.__name__} "
+            f"({self.workers} worker(s), fila em {self.queue.path}).")
+        signal.signal(signal.SIGTERM, self.stop)
+
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                while not self.stopping:
+                    for path in watcher.poll(self.poll_interval):
+                        self.tracker.touch(os.path.abspath(path))
+                    for path in self.tracker.ready():
+                        self.enqueue(path)
+
+                    running = {future for future in running if not future.done()}
+                    while len(running) < self.workers:
+                        job = self.queue.claim()
+                        if job is None:
+                            break
+                        running.add(pool.submit(self.process_job, job))
+
+                    if once and not running and not self.tracker.pending and self.queue.counts().get('pending', 0) == 0:
+                        break
+            except KeyboardInterrupt:
+                log("Interrompido; aguardando os jobs em andamento...")
+        counts = self.queue.counts()
+        log("Fila: " + ', '.join(f"{status}={count}" for status, count in sorted(counts.items())))
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Vigia pastas de ingestão e aplica as operações configuradas a cada arquivo novo.",
+        formatter_class=argparse.RawTextHelpFormatter
+    )
+    parser.add_argument('config', help="Arquivo JSON com as pastas vigiadas e as operações (ver o início deste script).")
+    parser.add_argument('--workers', type=int, help=f"Jobs simultâneos. Padrão: 'workers' da configuração ou {DEFAULT_WORKERS}.")
+    parser.add_argument('--stable-seconds', type=float,
+                        help=f"Tempo sem mudanças até um arquivo ser processado. Padrão: 'stable_seconds' ou {DEFAULT_STABLE_SECONDS:g}.")
+    parser.add_argument('--poll', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help=f"Intervalo (s) entre as verificações. Padrão: {DEFAULT_POLL_INTERVAL:g}")
+    parser.add_argument('--polling', action='store_true', help="Usa varredura periódica em vez do inotify.")
+    parser.add_argument('--queue', metavar='ARQUIVO', help="Banco SQLite da fila. Padrão: no cache.")
+    parser.add_argument('--once', action='store_true', help="Processa o que houver e termina quando a fila esvaziar.")
+    parser.add_argument('--skip-existing', action='store_true',
+                        help="Registra os arquivos já existentes sem processá-los (só os novos viram jobs).")
+    job_journal.add_arguments(parser)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.configure(args)
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"ERRO na configuração '{args.config}': {e}", file=sys.stderr)
+        sys.exit(1)
+
+    daemon = WatchDaemon(config, args)
+    daemon.run(args.once, args.polling, args.skip_existing)
+    metrics.report("Daemon de ingestão")
+
+if __name__ == '__main__':
+    main()